@@ -0,0 +1,19 @@
+"""
+Gunicorn worker s uvicornem (gunicorn.conf.py).
+
+Uvicorn při vypnutí čeká na rozpracované odpovědi a až potom spustí
+lifespan shutdown, který zavře spojení živých změn (live.py). Otevřená SSE
+odpověď sama neskončí, bez limitu by worker držela celý graceful_timeout.
+Po SHUTDOWN_REQUEST_TIMEOUT sekundách se zbylé požadavky zruší; prohlížeč
+se k odběru znovu připojí s Last-Event-ID (uvicorn zrušení zaloguje jako
+chybu požadavku).
+"""
+import os
+
+from uvicorn.workers import UvicornWorker
+
+SHUTDOWN_REQUEST_TIMEOUT = int(os.getenv("SHUTDOWN_REQUEST_TIMEOUT", "5"))
+
+
+class Worker(UvicornWorker):
+    CONFIG_KWARGS = dict(UvicornWorker.CONFIG_KWARGS, timeout_graceful_shutdown=SHUTDOWN_REQUEST_TIMEOUT)
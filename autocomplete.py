@@ -0,0 +1,233 @@
+"""
+Našeptávač hodnot volně psaných polí (výrobce, typ, kabel, způsob uložení…).
+
+Každý worker drží pro každé pole v paměti prefixový index: seřazené pole
+normalizovaných klíčů (malá písmena bez diakritiky), ve kterém bisect najde
+rozsah hodnot začínajících prefixem; výsledky se řadí podle počtu použití.
+Hotové odpovědi pro prefix se pamatují do další změny pole, takže opakovaný
+dotaz je jen slovníkový lookup.
+
+Index se sestaví jedním GROUP BY dotazem na pole plus hodnotami
+DropdownSource (kategorie podle DropdownConfig; bez použití mají počet 0).
+Zápisy přes ORM session ho po commitu doplní inkrementálně (after_flush
+posbírá nové/změněné/smazané hodnoty, after_commit je promítne). Hromadné
+zápisy mimo ORM a zápisy jiných workerů zachytí úplné přestavění na pozadí,
+nejpozději po AUTOCOMPLETE_REBUILD_SECONDS.
+"""
+import asyncio
+import bisect
+import heapq
+import os
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import AsyncSessionLocal
+from models import Circuit, DropdownConfig, DropdownSource, SwitchboardDevice, TerminalDevice
+
+
+# pole -> sloupec modelu, ze kterého se berou hodnoty
+AUTOCOMPLETE_FIELDS = {
+    column.key: column
+    for column in (
+        SwitchboardDevice.switchboard_device_manufacturer,
+        SwitchboardDevice.switchboard_device_model,
+        SwitchboardDevice.switchboard_device_type,
+        Circuit.circuit_cable,
+        Circuit.circuit_cable_installation_method,
+        TerminalDevice.terminal_device_type,
+        TerminalDevice.terminal_device_manufacturer,
+        TerminalDevice.terminal_device_cable,
+        TerminalDevice.terminal_device_cable_installation_method,
+    )
+}
+
+AUTOCOMPLETE_REBUILD_SECONDS = float(os.getenv("AUTOCOMPLETE_REBUILD_SECONDS", "300"))
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Od kolika hodnot v rozsahu prefixu se místo výběru z rozsahu prochází `ranked`.
+WIDE_RANGE = 200
+
+# model -> sledovaná pole modelu (pro zápisy přes session)
+_TRACKED = {
+    model: [name for name, column in AUTOCOMPLETE_FIELDS.items() if column.class_ is model]
+    for model in {column.class_ for column in AUTOCOMPLETE_FIELDS.values()}
+}
+
+
+def normalize(value: str) -> str:
+    """Klíč pro porovnání prefixu: bez diakritiky, casefold."""
+    decomposed = unicodedata.normalize("NFKD", value.strip())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+class PrefixIndex:
+    """
+    Hodnoty jednoho pole s počty použití. `entries` je seřazené podle
+    normalizovaného klíče (bisect najde rozsah prefixu), `ranked` podle
+    četnosti – u širokého rozsahu (krátký prefix) je rychlejší projít
+    nejčastější hodnoty a vzít prvních pár, které prefixu odpovídají.
+    """
+
+    def __init__(self, counts: dict, fixed=()):
+        self.counts = dict(counts)
+        self.fixed = set(fixed)  # hodnoty z DropdownSource – zůstávají i s počtem 0
+        for value in self.fixed:
+            self.counts.setdefault(value, 0)
+        self.entries = sorted((normalize(value), value) for value in self.counts)
+        self.keys = [key for key, _ in self.entries]
+        self.ranked = sorted((-self.counts[value], key, value) for key, value in self.entries)
+        self._answers = {}
+
+    def add(self, value: str, delta: int):
+        count = self.counts.get(value)
+        key = normalize(value)
+        if count is None:
+            if delta <= 0:
+                return
+            position = bisect.bisect_left(self.entries, (key, value))
+            self.entries.insert(position, (key, value))
+            self.keys.insert(position, key)
+            self.counts[value] = delta
+            bisect.insort(self.ranked, (-delta, key, value))
+        else:
+            del self.ranked[bisect.bisect_left(self.ranked, (-count, key, value))]
+            if count + delta <= 0 and value not in self.fixed:
+                position = bisect.bisect_left(self.entries, (key, value))
+                del self.entries[position]
+                del self.keys[position]
+                del self.counts[value]
+            else:
+                self.counts[value] = max(count + delta, 0)
+                bisect.insort(self.ranked, (-self.counts[value], key, value))
+        self._answers.clear()
+
+    def complete(self, prefix: str, limit: int) -> list:
+        key = normalize(prefix)
+        answer = self._answers.get((key, limit))
+        if answer is None:
+            lo = bisect.bisect_left(self.keys, key)
+            hi = bisect.bisect_left(self.keys, key + "\U0010ffff", lo)
+            if hi - lo > WIDE_RANGE:
+                answer = []
+                for _, candidate, value in self.ranked:
+                    if candidate.startswith(key):
+                        answer.append(value)
+                        if len(answer) == limit:
+                            break
+            else:
+                counts = self.counts
+                top = heapq.nsmallest(limit, ((-counts[value], k, value) for k, value in self.entries[lo:hi]))
+                answer = [value for _, _, value in top]
+            self._answers[(key, limit)] = answer
+        return answer
+
+
+_indexes = {}  # pole -> PrefixIndex
+_built_at = None
+_rebuilding = None  # běžící asyncio úloha přestavby
+_lock = threading.Lock()  # zápisy z vláken synchronních session vs. event loop
+
+
+async def _build(db: AsyncSession) -> dict:
+    indexes = {}
+    fixed = {name: [] for name in AUTOCOMPLETE_FIELDS}
+    sources = await db.execute(
+        select(DropdownConfig.field_name, DropdownSource.value)
+        .join(DropdownSource, DropdownSource.category == DropdownConfig.dropdown_category)
+        .where(DropdownConfig.dropdown_enabled.is_(True), DropdownConfig.field_name.in_(list(AUTOCOMPLETE_FIELDS)))
+    )
+    for field, value in sources:
+        fixed[field].append(value)
+    for name, column in AUTOCOMPLETE_FIELDS.items():
+        rows = await db.execute(
+            select(column, func.count()).where(column.isnot(None), column != "").group_by(column)
+        )
+        indexes[name] = PrefixIndex(dict(rows.all()), fixed[name])
+    return indexes
+
+
+async def rebuild(db: AsyncSession):
+    """Úplné přestavění indexů (první dotaz, periodicky na pozadí)."""
+    global _indexes, _built_at
+    started = time.monotonic()
+    indexes = await _build(db)
+    with _lock:
+        _indexes = indexes
+        _built_at = started
+
+
+async def _rebuild_in_background(session_factory):
+    global _rebuilding
+    try:
+        async with session_factory() as db:
+            await rebuild(db)
+    finally:
+        _rebuilding = None
+
+
+async def complete(db: AsyncSession, field: str, prefix: str, limit: int = AUTOCOMPLETE_LIMIT) -> list:
+    """Nejpoužívanější hodnoty pole začínající prefixem. KeyError pro neznámé pole."""
+    global _rebuilding
+    if field not in AUTOCOMPLETE_FIELDS:
+        raise KeyError(field)
+    if _built_at is None:
+        await rebuild(db)
+    elif time.monotonic() - _built_at > AUTOCOMPLETE_REBUILD_SECONDS and _rebuilding is None:
+        # odpověď dá stávající index, přestavba doběhne mimo požadavek
+        _rebuilding = asyncio.create_task(_rebuild_in_background(AsyncSessionLocal))
+    limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+    with _lock:
+        return list(_indexes[field].complete(prefix, limit))
+
+
+def _clean(value):
+    if isinstance(value, str) and value.strip():
+        return value
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    if not _indexes:
+        return
+    changes = session.info.setdefault("autocomplete_changes", [])
+    for obj, sign in [(o, 1) for o in session.new] + [(o, -1) for o in session.deleted]:
+        for name in _TRACKED.get(type(obj), ()):
+            # jen už načtená hodnota – žádný dotaz uvnitř flushe
+            value = _clean(inspect(obj).dict.get(name))
+            if value is not None:
+                changes.append((name, value, sign))
+    for obj in session.dirty:
+        names = _TRACKED.get(type(obj))
+        if not names:
+            continue
+        state = inspect(obj)
+        for name in names:
+            history = state.attrs[name].history
+            if not history.has_changes():
+                continue
+            changes.extend((name, v, -1) for v in history.deleted if _clean(v) is not None)
+            changes.extend((name, v, 1) for v in history.added if _clean(v) is not None)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changes = session.info.pop("autocomplete_changes", None)
+    if not changes:
+        return
+    with _lock:
+        for name, value, delta in changes:
+            index = _indexes.get(name)
+            if index is not None:
+                index.add(value, delta)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("autocomplete_changes", None)
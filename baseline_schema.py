@@ -0,0 +1,230 @@
+"""
+Schéma databáze před zavedením verzovaných migrací – stav, který zakládá
+migrace 1 (migrations.py).
+
+Snímek se nemění: nové tabulky, sloupce a indexy patří do vlastní migrace,
+i když je models.py už obsahuje. Jen DDL – bez vztahů a výchozích hodnot
+na straně Pythonu.
+"""
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, Text, UniqueConstraint,
+)
+from sqlalchemy.sql import func
+
+
+metadata = MetaData()
+
+Table(
+    "users",
+    metadata,
+    Column("user_id", Integer, primary_key=True, index=True),
+    Column("username", String(100), unique=True, nullable=False),
+    Column("email", String(255), unique=True, nullable=False),
+    Column("password_hash", String(255), nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+Table(
+    "revisions",
+    metadata,
+    Column("revision_id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False),
+    Column("revision_code", String(100)),
+    Column("revision_name", String(255)),
+    Column("revision_owner", String(255)),
+    Column("revision_client", String(255)),
+    Column("revision_address", Text),
+    Column("revision_description", Text),
+    Column("revision_type", String(100)),
+    Column("revision_date_of_previous_revision", Date),
+    Column("revision_start_date", Date),
+    Column("revision_end_date", Date),
+    Column("revision_date_of_creation", Date),
+    Column("revision_recommended_date_for_next_revision", Date),
+    Column("revision_number_of_copies_technician", Integer),
+    Column("revision_number_of_copies_owner", Integer),
+    Column("revision_number_of_copies_contractor", Integer),
+    Column("revision_number_of_copies_client", Integer),
+    Column("revision_attachment", String(255)),
+    Column("revision_attachment_submitter", String(255)),
+    Column("revision_attachment_producer", String(255)),
+    Column("revision_attachment_date_of_creation", Date),
+    Column("revision_technician", String(255)),
+    Column("revision_certificate_number", String(100)),
+    Column("revision_authorization_number", String(100)),
+    Column("revision_project_documentation", Text),
+    Column("revision_contractor", String(255)),
+    Column("revision_short_description", Text),
+    Column("revision_measuring_instrument_manufacturer_type", String(255)),
+    Column("revision_measuring_instrument_serial_number", String(100)),
+    Column("revision_measuring_instrument_calibration", String(255)),
+    Column("revision_measuring_instrument_calibration_validity", Date),
+    Column("revision_overall_assessment", Text),
+)
+
+Table(
+    "switchboards",
+    metadata,
+    Column("switchboard_id", Integer, primary_key=True, index=True),
+    Column("revision_id", Integer, ForeignKey("revisions.revision_id"), nullable=False),
+    Column("switchboard_name", String(255)),
+    Column("switchboard_description", Text),
+    Column("switchboard_location", String(255)),
+    Column("switchboard_order", Integer),
+    Column("switchboard_type", String(100)),
+    Column("switchboard_serial_number", String(100)),
+    Column("switchboard_production_date", Date),
+    Column("switchboard_ip_rating", String(50)),
+    Column("switchboard_impact_protection", String(50)),
+    Column("switchboard_protection_class", String(50)),
+    Column("switchboard_rated_current", Float),
+    Column("switchboard_rated_voltage", Float),
+    Column("switchboard_manufacturer", String(255)),
+    Column("switchboard_manufacturer_address", Text),
+    Column("switchboard_standards", Text),
+    Column("switchboard_enclosure_type", String(100)),
+    Column("switchboard_enclosure_manufacturer", String(255)),
+    Column("switchboard_enclosure_installation_method", String(255)),
+    Column("switchboard_superior_switchboard", String(255)),
+    Column("switchboard_superior_circuit_breaker_rated_current", Float),
+    Column("switchboard_superior_circuit_breaker_trip_characteristic", String(50)),
+    Column("switchboard_superior_circuit_breaker_manufacturer", String(255)),
+    Column("switchboard_superior_circuit_breaker_model", String(100)),
+    Column("switchboard_main_switch", String(255)),
+    Column("switchboard_note", Text),
+    Column("switchboard_cable", String(255)),
+    Column("switchboard_cable_installation_method", String(255)),
+)
+
+Table(
+    "switchboard_measurements",
+    metadata,
+    Column("measurement_id", Integer, primary_key=True, index=True),
+    Column("switchboard_id", Integer, ForeignKey("switchboards.switchboard_id"), unique=True, nullable=False),
+    Column("measurements_switchboard_insulation_resistance", Float),
+    Column("measurements_switchboard_loop_impedance_min", Float),
+    Column("measurements_switchboard_loop_impedance_max", Float),
+    Column("measurements_switchboard_rcd_trip_time_ms", Float),
+    Column("measurements_switchboard_rcd_test_current_ma", Float),
+    Column("measurements_switchboard_earth_resistance", Float),
+)
+
+Table(
+    "switchboard_devices",
+    metadata,
+    Column("device_id", Integer, primary_key=True, index=True),
+    Column("switchboard_id", Integer, ForeignKey("switchboards.switchboard_id"), nullable=False),
+    Column("parent_device_id", Integer, ForeignKey("switchboard_devices.device_id"), nullable=True),
+    Column("switchboard_device_position", String(100)),
+    Column("switchboard_device_type", String(100)),
+    Column("switchboard_device_manufacturer", String(255)),
+    Column("switchboard_device_model", String(100)),
+    Column("switchboard_device_trip_characteristic", String(50)),
+    Column("switchboard_device_rated_current", Float),
+    Column("switchboard_device_residual_current_ma", Float),
+    Column("switchboard_device_sub_devices", Text),
+    Column("switchboard_device_poles", Integer),
+    Column("switchboard_device_module_width", Float),
+)
+
+Table(
+    "circuits",
+    metadata,
+    Column("circuit_id", Integer, primary_key=True, index=True),
+    Column("device_id", Integer, ForeignKey("switchboard_devices.device_id"), nullable=False),
+    Column("circuit_number", String(100)),
+    Column("circuit_room", String(255)),
+    Column("circuit_description", Text),
+    Column("circuit_description_from_switchboard", Text),
+    Column("circuit_number_of_outlets", Integer),
+    Column("circuit_cable_termination", String(255)),
+    Column("circuit_cable", String(255)),
+    Column("circuit_cable_installation_method", String(255)),
+)
+
+Table(
+    "circuit_measurements",
+    metadata,
+    Column("measurement_id", Integer, primary_key=True, index=True),
+    Column("circuit_id", Integer, ForeignKey("circuits.circuit_id"), unique=True, nullable=False),
+    Column("measurements_circuit_insulation_resistance", Float),
+    Column("measurements_circuit_loop_impedance_min", Float),
+    Column("measurements_circuit_loop_impedance_max", Float),
+    Column("measurements_circuit_rcd_trip_time_ms", Float),
+    Column("measurements_circuit_rcd_test_current_ma", Float),
+    Column("measurements_circuit_earth_resistance", Float),
+    Column("measurements_circuit_continuity", Float),
+    Column("measurements_circuit_order_of_phases", String(50)),
+)
+
+Table(
+    "terminal_devices",
+    metadata,
+    Column("terminal_device_id", Integer, primary_key=True, index=True),
+    Column("circuit_id", Integer, ForeignKey("circuits.circuit_id"), nullable=False),
+    Column("terminal_device_type", String(100)),
+    Column("terminal_device_manufacturer", String(255)),
+    Column("terminal_device_model", String(100)),
+    Column("terminal_device_marking", String(100)),
+    Column("terminal_device_quantity", Integer),
+    Column("terminal_device_power", Float),
+    Column("terminal_device_ip_rating", String(50)),
+    Column("terminal_device_protection_class", String(50)),
+    Column("terminal_device_serial_number", String(100)),
+    Column("terminal_device_supply_type", String(100)),
+    Column("terminal_device_installation_method", String(255)),
+    Column("terminal_device_cable", String(255)),
+    Column("terminal_device_cable_installation_method", String(255)),
+)
+
+Table(
+    "terminal_measurements",
+    metadata,
+    Column("measurement_id", Integer, primary_key=True, index=True),
+    Column("terminal_device_id", Integer, ForeignKey("terminal_devices.terminal_device_id"), unique=True, nullable=False),
+    Column("measurements_circuit_insulation_resistance", Float),
+    Column("measurements_circuit_loop_impedance_min", Float),
+    Column("measurements_circuit_loop_impedance_max", Float),
+    Column("measurements_circuit_rcd_trip_time_ms", Float),
+    Column("measurements_circuit_rcd_test_current_ma", Float),
+)
+
+Table(
+    "dropdown_sources",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("category", String(100), nullable=False, index=True),
+    Column("value", String(255), nullable=False),
+    Column("display_order", Integer),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+Table(
+    "dropdown_config",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("entity_type", String(100), nullable=False),
+    Column("field_name", String(255), nullable=False),
+    Column("dropdown_enabled", Boolean),
+    Column("dropdown_category", String(100), nullable=True),
+    Column("field_label", String(255), nullable=True),
+    Column("field_category", String(100), nullable=True),
+    Column("display_order", Integer),
+    Column("enabled", Boolean),
+    Column("is_required", Boolean),
+    Column("field_type", String(50)),
+    Column("custom_label", String(255), nullable=True),
+)
+
+Table(
+    "field_categories",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("entity_type", String(100), nullable=False),
+    Column("category_key", String(100), nullable=False),
+    Column("category_label", String(255), nullable=False),
+    Column("display_order", Integer),
+    Column("icon", String(50)),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    UniqueConstraint("entity_type", "category_key", name="uix_entity_category"),
+)
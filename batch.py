@@ -0,0 +1,381 @@
+"""
+Transakční dávka operací nad jednou revizí.
+
+Klient pošle seznam operací create/update/delete pro rozvaděče, přístroje,
+obvody a koncová zařízení, úpravy hlavičky revize a měření; všechny se
+provedou v jedné transakci s jediným commitem, nebo (při první chybě) žádná.
+
+    {"operations": [
+        {"op": "create", "entity": "switchboard", "ref": "rh", "data": {"switchboard_name": "RH"}},
+        {"op": "create", "entity": "device", "ref": "f1",
+         "data": {"switchboard_id": "rh", "switchboard_device_type": "MCB"}},
+        {"op": "create", "entity": "circuit", "data": {"device_id": "f1", "circuit_number": "1"}},
+        {"op": "update", "entity": "circuit", "id": 42, "data": {"circuit_room": "Kuchyň"}},
+        {"op": "update", "entity": "circuit_measurement", "id": 42,
+         "data": {"measurements_circuit_continuity": 0.12}},
+        {"op": "delete", "entity": "terminal_device", "id": 7}
+    ]}
+
+Vazební sloupce (switchboard_id, device_id, circuit_id, parent_device_id)
+berou buď ID existujícího záznamu, nebo řetězec – `ref` objektu vytvořeného
+dříve v téže dávce. Existující záznamy se načtou jedním dotazem na typ entity
+a musí patřit do dané revize. Nový rozvaděč dostane prázdné měření stejně
+jako při založení z formuláře; souhrn dotčených obvodů se přepočítá.
+
+Měření (1:1 k rozvaděči, obvodu, koncovému zařízení) se jen upravují; `id`
+je ID nebo `ref` nadřazeného záznamu a zapíší se upsertem po vložení nových
+záznamů, stejně jako z hromadného formuláře měření. Mazání jde přes ORM
+kaskády (přístroj smaže své obvody, obvod koncová zařízení a měření).
+"""
+from datetime import date, datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import live
+from measurements import recompute_circuit_measurements, save_measurement_grid, upsert_rows
+from models import (
+    Circuit,
+    CircuitMeasurement,
+    Revision,
+    Switchboard,
+    SwitchboardDevice,
+    SwitchboardMeasurement,
+    TerminalDevice,
+    TerminalMeasurement,
+)
+
+
+# Horní mez počtu operací v jedné dávce (jedna transakce nemá růst donekonečna).
+BATCH_MAX_OPERATIONS = 1000
+
+
+class BatchError(ValueError):
+    """Neplatná operace v dávce; index odkazuje na pořadí v `operations`."""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+
+
+# entita -> (model, {vazební sloupec: (vztah, cílová entita)})
+ENTITIES = {
+    "revision": (Revision, {}),
+    "switchboard": (Switchboard, {}),
+    "device": (SwitchboardDevice, {
+        "switchboard_id": ("switchboard", "switchboard"),
+        "parent_device_id": ("parent_device", "device"),
+    }),
+    "circuit": (Circuit, {"device_id": ("device", "device")}),
+    "terminal_device": (TerminalDevice, {"circuit_id": ("circuit", "circuit")}),
+}
+
+# měření -> (model, klíč nadřazeného záznamu, jeho entita)
+MEASUREMENTS = {
+    "switchboard_measurement": (SwitchboardMeasurement, "switchboard_id", "switchboard"),
+    "circuit_measurement": (CircuitMeasurement, "circuit_id", "circuit"),
+    "terminal_measurement": (TerminalMeasurement, "terminal_device_id", "terminal_device"),
+}
+
+# Povinná vazba nově vytvářeného záznamu na nadřazenou entitu.
+REQUIRED_PARENT = {
+    "device": "switchboard_id",
+    "circuit": "device_id",
+    "terminal_device": "circuit_id",
+}
+
+# Pole, která dávka nesmí přepsat (klíče a dopočítávané hodnoty).
+READ_ONLY = {"revision_id", "user_id", "circuit_number_of_outlets"}
+
+
+def _pk(model):
+    return model.__mapper__.primary_key[0]
+
+
+def _id(obj):
+    return getattr(obj, _pk(type(obj)).key)
+
+
+def _owned_query(entity, revision_id, ids):
+    """Existující záznamy entity podle ID, omezené na danou revizi."""
+    model = ENTITIES[entity][0]
+    return select(model).where(_pk(model).in_(ids), model.revision_id == revision_id)
+
+
+async def _check_device_links(db: AsyncSession, revision_id: int, links, moved_from, removed_ids):
+    """
+    Stejná pravidla jako device_set_parent (main.py) pro stav po dávce:
+    nadřazený přístroj je ze stejného rozvaděče a vazba nevytvoří cyklus.
+    `links` jsou přístroje z dávky – klíč je ID, nebo objekt vytvořený
+    v dávce, hodnota (index operace, rozvaděč, nadřazený přístroj) se stejně
+    kódovanými odkazy. Ostatní přístroje dotčených rozvaděčů (i těch, ze
+    kterých se přístroj přesunul) se načtou jedním dotazem.
+    """
+    switchboards = {sb for _i, sb, _parent in links.values() if isinstance(sb, int)} | moved_from
+    state = {}
+    if switchboards:
+        rows = await db.execute(
+            select(SwitchboardDevice.device_id, SwitchboardDevice.switchboard_id, SwitchboardDevice.parent_device_id)
+            .where(SwitchboardDevice.revision_id == revision_id, SwitchboardDevice.switchboard_id.in_(switchboards))
+        )
+        state = {device: (sb, parent) for device, sb, parent in rows}
+    state.update({device: (sb, parent) for device, (_i, sb, parent) in links.items()})
+    for device in removed_ids:
+        state.pop(device, None)
+
+    for device, (sb, parent) in state.items():
+        if parent is None or parent in removed_ids or (device not in links and parent not in links):
+            continue
+        index = links[device][0] if device in links else links[parent][0]
+        if parent not in state or state[parent][0] != sb:
+            raise BatchError(index, "parent_device_id: nadřazený přístroj musí být ze stejného rozvaděče")
+    # cyklus nahlásí poslední operace, která ho uzavřela
+    for device, (index, _sb, parent) in sorted(links.items(), key=lambda item: item[1][0], reverse=True):
+        if device in removed_ids:
+            continue
+        ancestor, seen = parent, set()
+        while ancestor is not None and ancestor != device and ancestor not in seen:
+            seen.add(ancestor)
+            ancestor = state.get(ancestor, (None, None))[1]
+        if ancestor == device:
+            raise BatchError(index, "parent_device_id: vazba by vytvořila cyklus")
+
+
+def _coerce(index, column, value):
+    if value is None or value == "":
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    try:
+        if python_type is date and isinstance(value, str):
+            return date.fromisoformat(value)
+        if python_type is datetime and isinstance(value, str):
+            return datetime.fromisoformat(value)
+        if python_type in (int, float) and not isinstance(value, bool):
+            return python_type(value)
+    except (TypeError, ValueError):
+        raise BatchError(index, f"neplatná hodnota pro {column.name}: {value!r}")
+    return value
+
+
+def _validate(index, operation):
+    if not isinstance(operation, dict):
+        raise BatchError(index, "operace musí být objekt")
+    op = operation.get("op")
+    entity = operation.get("entity")
+    if op not in ("create", "update", "delete"):
+        raise BatchError(index, f"neznámá operace {op!r}")
+    if entity not in ENTITIES and entity not in MEASUREMENTS:
+        raise BatchError(index, f"neznámá entita {entity!r}")
+    data = operation.get("data") or {}
+    if not isinstance(data, dict):
+        raise BatchError(index, "data musí být objekt")
+    if entity in MEASUREMENTS:
+        model, key, _parent = MEASUREMENTS[entity]
+        read_only = READ_ONLY | {key}
+        if op != "update":
+            raise BatchError(index, f"{entity} lze jen upravit")
+        if not isinstance(operation.get("id"), (int, str)):
+            raise BatchError(index, f"update {entity} vyžaduje id nebo ref nadřazeného záznamu")
+    else:
+        model, read_only = ENTITIES[entity][0], READ_ONLY
+        if entity == "revision" and op != "update":
+            raise BatchError(index, "revizi lze jen upravit")
+        if op != "create" and not isinstance(operation.get("id"), int):
+            raise BatchError(index, f"{op} vyžaduje číselné id")
+    columns = model.__table__.columns
+    for key in data:
+        if key not in columns or key in read_only or columns[key].primary_key:
+            raise BatchError(index, f"{entity} nemá zapisovatelné pole {key!r}")
+    if op == "create" and entity in REQUIRED_PARENT and data.get(REQUIRED_PARENT[entity]) is None:
+        raise BatchError(index, f"create {entity} vyžaduje {REQUIRED_PARENT[entity]}")
+    return op, entity, data
+
+
+async def run_batch(db: AsyncSession, revision_id: int, operations) -> dict:
+    """
+    Provede dávku v otevřené transakci session bez commitu (ten je na
+    volajícím). Vrací {"created": {ref: id}, "created_count": počet,
+    "updated": počet, "deleted": počet}.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise BatchError(None, "operations musí být neprázdný seznam")
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        raise BatchError(None, f"nejvýše {BATCH_MAX_OPERATIONS} operací v dávce")
+
+    parsed = [_validate(i, operation) for i, operation in enumerate(operations)]
+
+    # Všechna ID existujících záznamů (cíle update/delete, vazby i rodiče
+    # měření) načteme předem, jedním dotazem na typ entity.
+    wanted = {entity: set() for entity in ENTITIES}
+    for i, (op, entity, data) in enumerate(parsed):
+        if entity in MEASUREMENTS:
+            if isinstance(operations[i]["id"], int):
+                wanted[MEASUREMENTS[entity][2]].add(operations[i]["id"])
+            continue
+        if op != "create":
+            wanted[entity].add(operations[i]["id"])
+        for fk, (_rel, target) in ENTITIES[entity][1].items():
+            if isinstance(data.get(fk), int):
+                wanted[target].add(data[fk])
+    existing = {entity: {} for entity in ENTITIES}
+    for entity, ids in wanted.items():
+        if ids:
+            rows = (await db.scalars(_owned_query(entity, revision_id, ids))).all()
+            existing[entity] = {_id(row): row for row in rows}
+
+    created = {}  # ref -> (entity, objekt)
+    created_all = []
+    removed = ()  # smazané objekty včetně kaskád (session.deleted)
+    measurement_rows = {entity: [] for entity in MEASUREMENTS}  # (rodič, hodnoty)
+    touched_circuits = set()
+    touched_terminals = []
+    device_links = {}  # přístroj -> (index, rozvaděč, nadřazený), viz _check_device_links
+    moved_from = set()
+    next_order = None
+
+    def lookup(i, entity, entity_id):
+        obj = existing[entity].get(entity_id)
+        if obj is None or obj in removed:
+            raise BatchError(i, f"{entity} {entity_id} v revizi neexistuje")
+        return obj
+
+    for i, (op, entity, data) in enumerate(parsed):
+        if entity in MEASUREMENTS:
+            model, _key, parent = MEASUREMENTS[entity]
+            target = operations[i]["id"]
+            if isinstance(target, str):
+                ref = created.get(target)
+                if ref is None or ref[0] != parent:
+                    raise BatchError(i, f"id: neznámý ref {target!r}")
+                owner = ref[1]
+            else:
+                owner = lookup(i, parent, target)
+            columns = model.__table__.columns
+            values = {key: _coerce(i, columns[key], value) for key, value in data.items()}
+            measurement_rows[entity].append((owner, values))
+            continue
+
+        model, fks = ENTITIES[entity]
+        columns = model.__table__.columns
+
+        if op == "delete":
+            obj = lookup(i, entity, operations[i]["id"])
+            if entity == "terminal_device":
+                touched_circuits.add(obj.circuit_id)
+            # kaskády načtou a označí i podřízené záznamy
+            await db.delete(obj)
+            removed = db.deleted
+            continue
+
+        if op == "update":
+            obj = lookup(i, entity, operations[i]["id"])
+        else:
+            obj = model(revision_id=revision_id)
+            if entity == "switchboard":
+                obj.measurements = SwitchboardMeasurement()
+                if data.get("switchboard_order") is None:
+                    if next_order is None:
+                        max_order = await db.scalar(
+                            select(func.max(Switchboard.switchboard_order))
+                            .where(Switchboard.revision_id == revision_id)
+                        )
+                        next_order = (max_order or 0) + 1
+                    obj.switchboard_order = next_order
+                    next_order += 1
+            db.add(obj)
+            created_all.append(obj)
+
+        if entity == "terminal_device" and op == "update":
+            touched_circuits.add(obj.circuit_id)
+        tracked = entity == "device" and (op == "create" or "switchboard_id" in data or "parent_device_id" in data)
+        if tracked:
+            # ID existujícího přístroje / rozvaděče, nebo objekt z dávky (ref)
+            device = obj if op == "create" else _id(obj)
+            _index, switchboard, parent = device_links.get(device, (i, obj.switchboard_id, obj.parent_device_id))
+            if "switchboard_id" in data:
+                if op == "update":
+                    moved_from.add(switchboard)
+                value = data["switchboard_id"]
+                switchboard = created[value][1] if isinstance(value, str) and value in created else value
+            if "parent_device_id" in data:
+                value = data["parent_device_id"]
+                parent = created[value][1] if isinstance(value, str) and value in created else value
+
+        for key, value in data.items():
+            if key in fks:
+                rel, target = fks[key]
+                if isinstance(value, str):
+                    ref = created.get(value)
+                    if ref is None or ref[0] != target:
+                        raise BatchError(i, f"{key}: neznámý ref {value!r}")
+                    # Vazba na objekt z téže dávky – ID dostane až při flushi.
+                    setattr(obj, rel, ref[1])
+                elif value is None:
+                    setattr(obj, key, None)
+                elif value in existing[target] and existing[target][value] not in removed:
+                    setattr(obj, key, value)
+                else:
+                    raise BatchError(i, f"{key}: {target} {value} v revizi neexistuje")
+            else:
+                setattr(obj, key, _coerce(i, columns[key], value))
+
+        if entity == "terminal_device":
+            touched_terminals.append(obj)
+        if tracked:
+            device_links[device] = (i, switchboard, parent)
+
+        ref = operations[i].get("ref")
+        if op == "create" and ref is not None:
+            if not isinstance(ref, str) or ref in created:
+                raise BatchError(i, f"ref musí být jedinečný řetězec: {ref!r}")
+            created[ref] = (entity, obj)
+
+    moved_from.discard(None)
+    if moved_from or any(parent is not None for _i, _sb, parent in device_links.values()):
+        removed_ids = {_id(obj) for obj in removed if isinstance(obj, SwitchboardDevice)}
+        await _check_device_links(db, revision_id, device_links, moved_from, removed_ids)
+    await db.flush()
+    touched_circuits.update(td.circuit_id for td in touched_terminals if td not in removed)
+    if removed and touched_circuits:
+        # souhrn jen obvodů, které po dávce existují
+        touched_circuits = set(await db.scalars(
+            select(Circuit.circuit_id).where(Circuit.circuit_id.in_(touched_circuits))
+        ))
+
+    # ID rodičů měření jsou po flushi známá (i u záznamů z téže dávky)
+    rows = {
+        entity: [{MEASUREMENTS[entity][1]: _id(owner), **values} for owner, values in items]
+        for entity, items in measurement_rows.items()
+    }
+    terminal_circuits = {
+        owner.terminal_device_id: owner.circuit_id for owner, _values in measurement_rows["terminal_measurement"]
+    }
+    # souhrn obvodů s měřeními koncových zařízení přepočte save_measurement_grid;
+    # ruční hodnoty obvodu zapíše až po něm, aby měly přednost
+    await recompute_circuit_measurements(db, touched_circuits - set(terminal_circuits.values()))
+    if rows["terminal_measurement"] or rows["circuit_measurement"]:
+        await save_measurement_grid(db, rows["circuit_measurement"], rows["terminal_measurement"], terminal_circuits)
+    if rows["switchboard_measurement"]:
+        await upsert_rows(db, SwitchboardMeasurement, rows["switchboard_measurement"], key="switchboard_id")
+        live.record(db, "switchboard_measurement", rows["switchboard_measurement"], key="switchboard_id")
+
+    return {
+        "created": {ref: _id(obj) for ref, (_entity, obj) in created.items()},
+        "created_count": len(created_all),
+        "updated": sum(1 for op, _e, _d in parsed if op == "update"),
+        "deleted": sum(1 for op, _e, _d in parsed if op == "delete"),
+    }
+
+
+async def apply_batch(db: AsyncSession, revision_id: int, operations) -> dict:
+    """
+    Provede dávku a commitne ji. Při BatchError se nic necommitne (session
+    se zahodí s rollbackem). Vrací totéž co run_batch.
+    """
+    result = await run_batch(db, revision_id, operations)
+    await db.commit()
+    return result
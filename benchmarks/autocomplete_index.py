@@ -0,0 +1,157 @@
+"""
+Benchmark našeptávače (autocomplete.py): prefixový index v paměti proti
+dotazu LIKE 'prefix%' GROUP BY … ORDER BY count(*) DESC.
+
+Vloží --terminals koncových zařízení s výrobci a kabely rozdělenými
+zhruba podle Zipfa (--distinct různých hodnot na pole), změří latenci
+odpovědi indexu (první a opakovaný dotaz na prefix) a SQL dotazu, ověří
+shodu pořadí s SQL a inkrementální doplnění indexu po zápisu přes
+formulář (nová hodnota, přejmenování, smazání). Při chybě kód 1.
+
+    python benchmarks/autocomplete_index.py --terminals 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import seed  # noqa: E402
+
+PREFIXES = ["a", "ab", "sch", "cyky", "cyky-j 3", "h", "le", "x9", "no"]
+
+
+def vocabulary(distinct, rng):
+    stems = ["ABB", "Schneider", "Hager", "Eaton", "Legrand", "OEZ", "Noark", "Siemens", "Ensto", "Elektro"]
+    cables = ["CYKY-J 3x1,5", "CYKY-J 3x2,5", "CYKY-J 5x2,5", "CYKY-O 2x1,5", "CGSG 3x1,5", "H07RN-F 3G2,5"]
+    manufacturers = [f"{rng.choice(stems)} {n}" if n >= len(stems) else stems[n] for n in range(distinct)]
+    cables = cables + [f"CYKY-J {rng.randint(3, 5)}x{n / 10:.1f}" for n in range(distinct - len(cables))]
+    return manufacturers, cables
+
+
+def zipf_pick(values, rng):
+    # P(k) ~ 1/k: pár hodnot velmi častých, dlouhý chvost vzácných
+    k = int(len(values) ** rng.random()) - 1
+    return values[min(k, len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminals", type=int, default=50000)
+    parser.add_argument("--distinct", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, insert, select
+    import autocomplete
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    _, _, circ_ids = seed(database.SessionLocal, models, switchboards=1, devices=5, circuits=2, terminals=0)
+    rng = random.Random(1)
+    manufacturers, cables = vocabulary(args.distinct, rng)
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.TerminalDevice), [
+            {"circuit_id": rng.choice(circ_ids), "terminal_device_manufacturer": zipf_pick(manufacturers, rng),
+             "terminal_device_cable": zipf_pick(cables, rng)}
+            for _ in range(args.terminals)
+        ])
+
+    loop = asyncio.new_event_loop()
+
+    def run(coro_fn):
+        async def wrapper():
+            async with database.AsyncSessionLocal() as db:
+                return await coro_fn(db)
+        return loop.run_until_complete(wrapper())
+
+    def sql_complete(db, column, prefix, limit=10):
+        return db.execute(
+            select(column).where(func.lower(column).like(prefix.lower() + "%"))
+            .group_by(column).order_by(func.count().desc(), func.lower(column)).limit(limit)
+        ).scalars().all()
+
+    started = time.perf_counter()
+    run(autocomplete.rebuild)
+    build_ms = (time.perf_counter() - started) * 1000
+    sizes = {name: len(index.counts) for name, index in autocomplete._indexes.items() if index.counts}
+    print(f"{args.terminals} terminal devices, index built in {build_ms:.0f} ms, values per field: {sizes}")
+
+    failed = False
+    print(f"{'field':<30} {'prefix':<10} {'cold us':>8} {'warm us':>8} {'sql ms':>7}  same")
+    for field, column in (("terminal_device_manufacturer", models.TerminalDevice.terminal_device_manufacturer),
+                          ("terminal_device_cable", models.TerminalDevice.terminal_device_cable)):
+        index = autocomplete._indexes[field]
+        for prefix in PREFIXES:
+            index._answers.clear()
+            started = time.perf_counter()
+            got = index.complete(prefix, 10)
+            cold = (time.perf_counter() - started) * 1e6
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                run_answer = index.complete(prefix, 10)
+                samples.append((time.perf_counter() - started) * 1e6)
+            warm = statistics.median(samples)
+            with database.SessionLocal() as db:
+                started = time.perf_counter()
+                expected = sql_complete(db, column, prefix)
+                sql_ms = (time.perf_counter() - started) * 1000
+            # při shodném počtu rozhoduje abecední pořadí; SQL lower() nezná diakritiku,
+            # testovací hodnoty jsou ASCII
+            same = got == expected and run_answer == got
+            failed = failed or not same or cold > 1000
+            print(f"{field:<30} {prefix!r:<10} {cold:>8.0f} {warm:>8.1f} {sql_ms:>7.2f}  {same}")
+
+    with TestClient(app_module.app) as client:
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            resp = client.get("/api/autocomplete/terminal_device_manufacturer", params={"q": "sch"})
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"HTTP /api/autocomplete median {statistics.median(samples):.2f} ms")
+        checks = {"unknown field 404": client.get("/api/autocomplete/revision_name").status_code == 404}
+
+        def values(q, field="terminal_device_manufacturer"):
+            return client.get(f"/api/autocomplete/{field}", params={"q": q}).json()["values"]
+
+        circuit_id = circ_ids[0]
+        for _ in range(3):
+            client.post(f"/circuits/{circuit_id}/terminal-devices/create",
+                        data={"terminal_device_manufacturer": "Žluťoučký výrobce"}, follow_redirects=False)
+        checks["new value after form write"] = values("zlut") == ["Žluťoučký výrobce"]
+        with database.SessionLocal() as db:
+            td = db.scalar(select(models.TerminalDevice)
+                           .where(models.TerminalDevice.terminal_device_manufacturer == "Žluťoučký výrobce"))
+            td.terminal_device_manufacturer = "Zelený výrobce"
+            db.commit()
+            td_id = td.terminal_device_id
+        checks["rename via sync session"] = values("z") [:2] == ["Žluťoučký výrobce", "Zelený výrobce"] and \
+            autocomplete._indexes["terminal_device_manufacturer"].counts["Žluťoučký výrobce"] == 2
+        client.post(f"/terminal-devices/{td_id}/delete", follow_redirects=False)
+        checks["delete removes unused value"] = "Zelený výrobce" not in values("ze")
+    loop.close()
+
+    for name, ok in checks.items():
+        print(f"{name:<28} {'ok' if ok else 'FAILED'}")
+        failed = failed or not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark zadání měření celého rozvaděče: jednotlivé POSTy vs. hromadný endpoint.
+
+Naplní dva stejné rozvaděče (--devices přístrojů × --circuits obvodů ×
+--terminals koncových zařízení). Na první zapíše měření po jednom přes
+formulářové routy (obvod i každé koncové zařízení zvlášť), na druhý jedním
+POST /switchboards/{id}/measurements/bulk. Porovná čas, počet SQL příkazů
+a commitů a ověří, že výsledné souhrny obvodů jsou stejné (jinak kód 1).
+
+    python benchmarks/bulk_measurements.py --devices 30 --circuits 2 --terminals 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import seed  # noqa: E402
+
+
+def terminal_values(n):
+    return {
+        "measurements_circuit_loop_impedance_min": round(0.2 + n % 7 * 0.05, 2),
+        "measurements_circuit_loop_impedance_max": round(0.6 + n % 5 * 0.1, 2),
+        "measurements_circuit_rcd_trip_time_ms": 15.0 + n % 9,
+    }
+
+
+def circuit_values(n):
+    return {"measurements_circuit_continuity": round(0.1 + n % 4 * 0.05, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=30)
+    parser.add_argument("--circuits", type=int, default=2)
+    parser.add_argument("--terminals", type=int, default=3)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, select
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    _, sb_ids, _ = seed(database.SessionLocal, models, switchboards=2, devices=args.devices,
+                        circuits=args.circuits, terminals=args.terminals)
+
+    def board(sb_id):
+        """Obvody rozvaděče v pořadí a jejich koncová zařízení."""
+        with database.SessionLocal() as db:
+            circuits = db.scalars(
+                select(models.Circuit)
+                .join(models.SwitchboardDevice)
+                .where(models.SwitchboardDevice.switchboard_id == sb_id)
+                .order_by(models.Circuit.circuit_id)
+            ).all()
+            return [
+                (c.circuit_id, [t.terminal_device_id for t in sorted(c.terminal_devices, key=lambda t: t.terminal_device_id)])
+                for c in circuits
+            ]
+
+    def summaries(sb_id):
+        with database.SessionLocal() as db:
+            result = []
+            for circuit_id, _ in board(sb_id):
+                cm = db.scalar(select(models.CircuitMeasurement).where(models.CircuitMeasurement.circuit_id == circuit_id))
+                result.append(tuple(
+                    getattr(cm, c.name) for c in models.CircuitMeasurement.__table__.columns
+                    if c.name.startswith("measurements_")
+                ) if cm else None)
+            return result
+
+    single, bulk = board(sb_ids[0]), board(sb_ids[1])
+
+    counts = []
+    for eng in (database.engine, database.async_engine.sync_engine):
+        event.listen(eng, "before_cursor_execute", lambda *_: counts.append("SQL"))
+        event.listen(eng, "commit", lambda *_: counts.append("COMMIT"))
+
+    results = {}
+    with TestClient(app_module.app) as client:
+        client.get("/revisions")
+
+        counts.clear()
+        started = time.perf_counter()
+        requests = 0
+        for n, (circuit_id, terminal_ids) in enumerate(single):
+            # Formulář obvodu přepisuje všechna pole, proto jde před koncovými
+            # zařízeními (jejich souhrn se pak dopočítá do prázdných polí).
+            resp = client.post(f"/circuits/{circuit_id}/measurements/save",
+                               data=circuit_values(n), follow_redirects=False)
+            assert resp.status_code == 303, resp.status_code
+            requests += 1
+            for m, td_id in enumerate(terminal_ids):
+                resp = client.post(f"/terminal-devices/{td_id}/measurements/save",
+                                   data=terminal_values(n * 100 + m), follow_redirects=False)
+                assert resp.status_code == 303, resp.status_code
+                requests += 1
+        results["per-item POSTs"] = (requests, time.perf_counter() - started, counts.count("SQL"), counts.count("COMMIT"))
+
+        grid = {"circuits": [], "terminal_devices": []}
+        for n, (circuit_id, terminal_ids) in enumerate(bulk):
+            for m, td_id in enumerate(terminal_ids):
+                grid["terminal_devices"].append({"terminal_device_id": td_id, **terminal_values(n * 100 + m)})
+            grid["circuits"].append({"circuit_id": circuit_id, **circuit_values(n)})
+        counts.clear()
+        started = time.perf_counter()
+        resp = client.post(f"/switchboards/{sb_ids[1]}/measurements/bulk", json=grid)
+        assert resp.status_code == 200, (resp.status_code, resp.text)
+        results["bulk endpoint"] = (1, time.perf_counter() - started, counts.count("SQL"), counts.count("COMMIT"))
+
+    print(f"{len(single)} circuits, {sum(len(t) for _, t in single)} terminal devices")
+    print(f"{'mode':<16} {'requests':>8} {'ms':>9} {'sql':>6} {'commits':>8}")
+    for name, (requests, elapsed, sql, commits) in results.items():
+        print(f"{name:<16} {requests:>8} {elapsed * 1000:>9.1f} {sql:>6} {commits:>8}")
+
+    # Hromadný endpoint ukládá jen zadaná pole obvodu, souhrn z koncových
+    # zařízení zůstane – výsledek se musí shodovat s postupem přes formuláře.
+    same = summaries(sb_ids[0]) == summaries(sb_ids[1])
+    print("circuit summaries identical:", same)
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Měření studeného startu aplikace – import modulu main a průchod lifespan
+startupem v čerstvém procesu, proti již existující (zmigrované) databázi.
+
+    python benchmarks/cold_start.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import asyncio, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+
+async def startup():
+    lifespan = getattr(main.app.router, "lifespan_context", None)
+    if lifespan is not None:
+        async with lifespan(main.app):
+            pass
+
+asyncio.run(startup())
+t2 = time.perf_counter()
+print(f"{(t1 - t0) * 1000:.1f} {(t2 - t1) * 1000:.1f}")
+"""
+
+
+def run_child(env):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    imp, startup = (float(v) for v in out.split())
+    return imp, startup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    env.setdefault("SECRET_KEY", "benchmark")
+
+    first = run_child(env)  # první start databázi založí / zmigruje
+    imports, startups = [], []
+    for _ in range(args.runs):
+        imp, startup = run_child(env)
+        imports.append(imp)
+        startups.append(startup)
+
+    print(f"first start (empty db): import={first[0]:.1f} ms startup={first[1]:.1f} ms")
+    print("warm db, median of {}: import={:.1f} ms startup={:.1f} ms total={:.1f} ms".format(
+        args.runs, statistics.median(imports), statistics.median(startups),
+        statistics.median([a + b for a, b in zip(imports, startups)]),
+    ))
+
+
+if __name__ == "__main__":
+    main()
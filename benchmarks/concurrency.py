@@ -0,0 +1,176 @@
+"""
+Benchmark souběžných požadavků na detailové stránky.
+
+Spustí aplikaci v procesu (ASGI transport), naplní dočasnou SQLite databázi
+a pošle paralelní GET požadavky. Volitelně přidá umělé zpoždění ke každému
+SQL dotazu (--db-latency-ms), aby bylo vidět, zda pomalá databáze blokuje
+event loop – při blokujícím přístupu p99 roste s počtem souběžných klientů.
+
+    python benchmarks/concurrency.py --concurrency 20 --requests 400 --db-latency-ms 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def seed(SessionLocal, models, switchboards=2, devices=10, circuits=2, terminals=3):
+    db = SessionLocal()
+    try:
+        if not db.get(models.User, 1):
+            db.add(models.User(user_id=1, username="demo", email="demo@example.com", password_hash="x"))
+            db.flush()
+        rev = models.Revision(user_id=1, revision_name="Benchmark")
+        db.add(rev)
+        db.flush()
+        sb_ids, circ_ids = [], []
+        for s in range(switchboards):
+            sb = models.Switchboard(revision_id=rev.revision_id, switchboard_name=f"R{s + 1}", switchboard_order=s + 1)
+            db.add(sb)
+            db.flush()
+            sb_ids.append(sb.switchboard_id)
+            for d in range(devices):
+                dev = models.SwitchboardDevice(
+                    switchboard_id=sb.switchboard_id,
+                    switchboard_device_position=f"F{d + 1}",
+                    switchboard_device_type="MCB",
+                    switchboard_device_rated_current=16,
+                )
+                db.add(dev)
+                db.flush()
+                for c in range(circuits):
+                    circ = models.Circuit(device_id=dev.device_id, circuit_number=f"{d + 1}.{c + 1}")
+                    db.add(circ)
+                    db.flush()
+                    circ_ids.append(circ.circuit_id)
+                    for t in range(terminals):
+                        db.add(models.TerminalDevice(
+                            circuit_id=circ.circuit_id,
+                            terminal_device_type="Zásuvka",
+                            terminal_device_quantity=1,
+                        ))
+        db.commit()
+        return rev.revision_id, sb_ids, circ_ids
+    finally:
+        db.close()
+
+
+def install_db_latency(database, delay):
+    """
+    Zpoždění se přidává přes trace callback sqlite3 spojení, tedy ve vlákně,
+    které příkaz skutečně vykonává (u aiosqlite jeho pracovní vlákno, u
+    synchronního engine vlákno požadavku) – stejně jako skutečná síťová latence.
+    """
+    from sqlalchemy import event
+
+    def slow(_statement):
+        time.sleep(delay)
+
+    def on_connect(dbapi_conn, _record):
+        raw = getattr(dbapi_conn, "driver_connection", dbapi_conn)
+        raw = getattr(raw, "_conn", raw)  # aiosqlite.Connection -> sqlite3.Connection
+        raw.set_trace_callback(slow)
+
+    engines = [database.engine]
+    async_engine = getattr(database, "async_engine", None)
+    if async_engine is not None:
+        engines.append(async_engine.sync_engine)
+    for eng in engines:
+        event.listen(eng, "connect", on_connect)
+        eng.dispose()
+
+
+async def run(app, paths, concurrency, total):
+    import httpx
+
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(paths[i % len(paths)])
+
+    async def warmup(client):
+        # první spojení každého engine se navazuje sekvenčně (inicializace dialektu)
+        for path in paths:
+            await client.get(path)
+
+    async def worker(client):
+        while True:
+            try:
+                path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            resp = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code >= 400:
+                raise RuntimeError(f"{path} -> {resp.status_code}")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        lifespan = getattr(app.router, "lifespan_context", None)
+        if lifespan is not None:
+            async with lifespan(app):
+                await warmup(client)
+                started = time.perf_counter()
+                await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+                elapsed = time.perf_counter() - started
+        else:
+            await warmup(client)
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0,
+                        help="umělé zpoždění přidané ke každému SQL příkazu")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import database
+    import models
+    import main as app_module
+
+    database.Base.metadata.create_all(bind=database.engine)
+    rev_id, sb_ids, circ_ids = seed(database.SessionLocal, models)
+
+    if args.db_latency_ms:
+        install_db_latency(database, args.db_latency_ms / 1000.0)
+
+    paths = ["/revisions", f"/revisions/{rev_id}"]
+    paths += [f"/switchboards/{sb_id}" for sb_id in sb_ids]
+    paths += [f"/circuits/{c_id}" for c_id in circ_ids[:4]]
+
+    latencies, elapsed = asyncio.run(run(app_module.app, paths, args.concurrency, args.requests))
+    ms = [v * 1000 for v in latencies]
+    print(f"requests={len(ms)} concurrency={args.concurrency} db_latency_ms={args.db_latency_ms}")
+    print(f"throughput={len(ms) / elapsed:.1f} req/s")
+    print(
+        "latency ms: p50={:.1f} p95={:.1f} p99={:.1f} max={:.1f} mean={:.1f}".format(
+            percentile(ms, 50), percentile(ms, 95), percentile(ms, 99), max(ms), statistics.mean(ms)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+ETag / 304 detailních stránek: propustnost teplé revalidace a správnost
+zneplatnění verzí revize (http_cache.py).
+
+Vygeneruje --revisions revizí (benchmarks/generate.py) a pro detail revize,
+rozvaděče a obvodu změří přes TestClient požadavky/s a SQL příkazy na
+požadavek při plném vykreslení a při revalidaci s If-None-Match (304);
+totéž přes skutečné HTTP proti gunicornu (--workers, --concurrency
+souběžných klientů, bez --no-server). Pak ověří, že zápisy
+v revizi (uložení měření obvodu i koncového zařízení, úprava revize,
+dávka, přímý SQL zápis mimo aplikaci) změní ETag všech tří stránek,
+a že ETag jiné revize zůstane stejný. Jinak skončí s kódem 1.
+
+    python benchmarks/etag_revalidation.py --requests 500 --workers 1 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from generate import generate  # noqa: E402
+from workers import run_server  # noqa: E402
+
+
+async def load(url, headers, expected, concurrency, total):
+    """(požadavky/s, ms na požadavek) pro `total` GETů z `concurrency` klientů."""
+    import httpx
+
+    remaining = iter(range(total))
+
+    async def worker(client):
+        for _ in remaining:
+            resp = await client.get(url, headers=headers)
+            if resp.status_code != expected:
+                raise RuntimeError(f"{url} -> {resp.status_code}")
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return total / elapsed, elapsed / total * 1000
+
+
+def measure_server(base, pages, concurrency, total):
+    import httpx
+
+    print(f"{'page':<20} {'mode':<12} {'req/s':>8} {'ms/req':>8}   (gunicorn, {concurrency} clients)")
+    for name, path in pages.items():
+        tag = httpx.get(base + path).headers["etag"]
+        for mode, headers, expected in (("full render", {}, 200), ("revalidate", {"If-None-Match": tag}, 304)):
+            asyncio.run(load(base + path, headers, expected, concurrency, concurrency * 5))
+            rate, ms = asyncio.run(load(base + path, headers, expected, concurrency, total))
+            print(f"{name:<20} {mode:<12} {rate:>8.0f} {ms:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--no-server", action="store_true", help="bez měření přes gunicorn")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, text
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    data = generate(database.engine, models, revisions=args.revisions)
+    rev_id, other_rev_id = data["revisions"][0], data["revisions"][1]
+    sb_id, circuit_id, td_id = data["switchboards"][0], data["circuits"][0], data["terminal_devices"][0]
+    pages = {
+        "revision_detail": f"/revisions/{rev_id}",
+        "switchboard_detail": f"/switchboards/{sb_id}",
+        "circuit_detail": f"/circuits/{circuit_id}",
+    }
+
+    statements = []
+    for eng in (database.engine, database.async_engine.sync_engine):
+        event.listen(eng, "before_cursor_execute", lambda *_: statements.append(1))
+
+    failed = False
+
+    def check(label, ok):
+        nonlocal failed
+        failed = failed or not ok
+        print(f"{label:<48} {'ok' if ok else 'FAIL'}")
+
+    with TestClient(app_module.app) as client:
+        def etags():
+            return {name: client.get(url).headers.get("etag") for name, url in pages.items()}
+
+        print(f"{'page':<20} {'mode':<12} {'req/s':>8} {'ms/req':>8} {'SQL/req':>8} {'bytes':>8}")
+        for name, url in pages.items():
+            first = client.get(url)
+            tag = first.headers.get("etag")
+            check(f"{name}: 200 with ETag", first.status_code == 200 and bool(tag))
+            for mode, headers, expected in (("full render", {}, 200), ("revalidate", {"If-None-Match": tag}, 304)):
+                client.get(url, headers=headers)
+                statements.clear()
+                started = time.perf_counter()
+                statuses = {client.get(url, headers=headers).status_code for _ in range(args.requests)}
+                elapsed = time.perf_counter() - started
+                body = len(client.get(url, headers=headers).content)
+                print(f"{name:<20} {mode:<12} {args.requests / elapsed:>8.0f} {elapsed / args.requests * 1000:>8.2f} "
+                      f"{len(statements) / args.requests:>8.1f} {body:>8}")
+                failed = failed or statuses != {expected}
+
+        check("weak and list If-None-Match also match",
+              client.get(pages["circuit_detail"], headers={
+                  "If-None-Match": f'"x", W/{etags()["circuit_detail"]}'}).status_code == 304)
+
+        other = f"/revisions/{other_rev_id}"
+        other_tag = client.get(other).headers["etag"]
+        writes = {
+            "circuit measurement save": lambda: client.post(
+                f"/circuits/{circuit_id}/measurements/save",
+                data={"measurements_circuit_continuity": "0.42"}, follow_redirects=False),
+            "terminal measurement save": lambda: client.post(
+                f"/terminal-devices/{td_id}/measurements/save",
+                data={"measurements_circuit_loop_impedance_min": "0.33"}, follow_redirects=False),
+            "revision edit": lambda: client.post(
+                f"/revisions/{rev_id}/edit", data={"revision_name": "Přejmenovaná revize"}, follow_redirects=False),
+            "batch update": lambda: client.post(f"/revisions/{rev_id}/batch", json={"operations": [
+                {"op": "update", "entity": "circuit", "id": circuit_id, "data": {"circuit_room": "Sklep"}}]}),
+        }
+        for label, write in writes.items():
+            before = etags()
+            response = write()
+            after = etags()
+            changed = all(before[name] != after[name] for name in pages)
+            check(f"{label} changes all ETags", response.status_code < 400 and changed)
+
+        before = etags()
+        with database.engine.begin() as conn:
+            conn.execute(text("UPDATE terminal_measurements SET measurements_circuit_rcd_trip_time_ms = 21 "
+                              "WHERE terminal_device_id = :id"), {"id": td_id})
+        after = etags()
+        check("direct SQL write changes all ETags", all(before[name] != after[name] for name in pages))
+        check("other revision keeps its ETag", client.get(other).headers["etag"] == other_tag)
+
+    if not args.no_server:
+        env = dict(os.environ, APP_BOOTSTRAPPED="1", GUNICORN_ACCESS_LOG="")
+        run_server(args.workers, env, pages["revision_detail"],
+                   lambda url: measure_server(url.rsplit("/revisions/", 1)[0], pages, args.concurrency,
+                                              args.requests * 4))
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
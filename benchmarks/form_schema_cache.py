@@ -0,0 +1,137 @@
+"""
+Benchmark cache metadat formulářů (form_schema.py).
+
+Založí konfiguraci formuláře revize (--fields polí ve 4 kategoriích,
+rozbalovací seznamy s --options hodnotami) a --requests krát vykreslí
+formulář nové revize. Porovná počet dotazů na metadata a čas kompilace
+schématu při každém požadavku s cache. Pak změní popisek pole přímo
+v databázi (jiným spojením, jako jiný worker nebo administrace) a ověří,
+že se změna projeví nejpozději po FORM_METADATA_POLL_SECONDS. Při chybě
+skončí s kódem 1.
+
+    python benchmarks/form_schema_cache.py --requests 200
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+POLL_SECONDS = 0.5
+METADATA = ("dropdown_sources", "dropdown_config", "field_categories", "form_metadata_version")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--fields", type=int, default=40)
+    parser.add_argument("--options", type=int, default=50)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    db_path = f"{tmpdir}/bench.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ["FORM_METADATA_POLL_SECONDS"] = str(POLL_SECONDS)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, insert
+    import database
+    import form_schema
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    categories = ["basic", "additional", "instrument", "measurements"]
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.FieldCategory), [
+            {"entity_type": "revision", "category_key": key, "category_label": key.title(), "display_order": n}
+            for n, key in enumerate(categories)
+        ])
+        conn.execute(insert(models.DropdownConfig), [
+            {"entity_type": "revision", "field_name": "revision_name" if n == 0 else f"field_{n}",
+             "field_label": "Název objektu" if n == 0 else f"Pole {n}", "field_category": categories[n % 4],
+             "display_order": n, "enabled": True, "dropdown_enabled": n % 3 == 0,
+             "dropdown_category": f"list_{n % 5}"}
+            for n in range(args.fields)
+        ])
+        conn.execute(insert(models.DropdownSource), [
+            {"category": f"list_{c}", "value": f"Hodnota {c}-{v}", "display_order": v}
+            for c in range(5) for v in range(args.options)
+        ])
+
+    statements = []
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *_: statements.append(sql))
+
+    def metadata_queries():
+        return sum(1 for sql in statements if any(table in sql for table in METADATA))
+
+    failed = False
+    with TestClient(app_module.app) as client:
+        client.get("/revisions")
+
+        # Bez cache: kompilace schématu při každém vykreslení.
+        async def compile_once():
+            async with database.AsyncSessionLocal() as db:
+                return await form_schema._compile(db, "revision", 0)
+
+        loop = asyncio.new_event_loop()
+        statements.clear()
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            loop.run_until_complete(compile_once())
+        uncached = (metadata_queries(), (time.perf_counter() - started) * 1000)
+        loop.close()
+
+        statements.clear()
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            resp = client.get("/revisions/create")
+            failed = failed or resp.status_code != 200 or "Název objektu" not in resp.text
+        elapsed = (time.perf_counter() - started) * 1000
+        cached = (metadata_queries(), elapsed)
+
+        print(f"{args.fields} fields, {args.requests} form renders in {elapsed:.0f} ms")
+        print(f"{'mode':<22} {'metadata queries':>17} {'ms':>8}")
+        print(f"{'compile per request':<22} {uncached[0]:>17} {uncached[1]:>8.0f}")
+        print(f"{'cached (renders)':<22} {cached[0]:>17} {cached[1]:>8.0f}")
+        print("stats:", form_schema.stats)
+
+        # Změna z jiného spojení (jiný worker / ruční zásah do databáze).
+        other = sqlite3.connect(db_path)
+        other.execute("UPDATE dropdown_config SET custom_label = 'Objekt revize' WHERE field_name = 'revision_name'")
+        other.commit()
+        other.close()
+        changed_at = time.monotonic()
+        seen_after = None
+        while time.monotonic() - changed_at < POLL_SECONDS * 4:
+            if "Objekt revize" in client.get("/revisions/create").text:
+                seen_after = time.monotonic() - changed_at
+                break
+            time.sleep(0.05)
+        ok = seen_after is not None and seen_after <= POLL_SECONDS + 0.2
+        print(f"external edit visible after: {seen_after if seen_after is None else round(seen_after, 2)} s "
+              f"(poll {POLL_SECONDS} s) {'ok' if ok else 'FAILED'}")
+        failed = failed or not ok
+        hot_path_ok = cached[0] <= 3 + 1 + elapsed / 1000 / POLL_SECONDS
+        failed = failed or not hot_path_ok
+
+        schema = client.get("/api/form-schema/revision").json()
+        shape_ok = [c["key"] for c in schema["categories"]] == categories and \
+            len(schema["fields"]["field_3"]["options"]) == args.options
+        print(f"schema categories and options: {'ok' if shape_ok else 'FAILED'}")
+        failed = failed or not shape_ok
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Benchmark fulltextového hledání (search.py) proti LIKE '%…%' přes čtyři tabulky.
+
+Hromadně vloží --revisions revizí (půlka patří jinému uživateli), každou se
+2 rozvaděči × 5 přístroji × 2 obvody × 2 koncovými zařízeními; index plní
+triggery. Změří latenci hledání přes index a přes LIKE, ověří, že index
+vrací tytéž záznamy, hledání bez diakritiky, prefixy, že revize v indexu
+odpovídá revision_id řádků a že index sleduje úpravy, mazání, kopii revize
+a přesun přístroje do jiné revize. Při chybě skončí s kódem 1.
+
+    python benchmarks/full_text_search.py --revisions 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+ROOMS = ["Kuchyň", "Koupelna", "Ložnice", "Chodba", "Sklep", "Půda", "Dílna", "Garáž", "Obývák", "Technická místnost"]
+MANUFACTURERS = ["ABB", "Schneider", "Hager", "Eaton", "Legrand", "OEZ"]
+STREETS = ["Nádražní", "Školní", "Husova", "Palackého", "Lipová", "Zahradní"]
+CITIES = ["Brno", "Olomouc", "Jihlava", "Zlín", "Kolín", "Tábor"]
+
+
+def populate(engine, models, revisions, rng):
+    """Hromadné INSERTy s explicitními ID (rychlé plnění; index plní triggery)."""
+    from sqlalchemy import insert
+
+    rows = {name: [] for name in ("revisions", "switchboards", "devices", "circuits", "terminals")}
+    sb_id = dev_id = circuit_id = td_id = 0
+    for r in range(1, revisions + 1):
+        rows["revisions"].append({
+            "revision_id": r, "user_id": 1 if r % 2 else 2,
+            "revision_name": f"Revize {rng.choice(['bytového domu', 'skladu', 'dílny', 'kanceláří'])} {r}",
+            "revision_address": f"{rng.choice(STREETS)} {r}, {rng.choice(CITIES)}",
+            "revision_client": f"Klient {r % 97}",
+        })
+        for s in range(2):
+            sb_id += 1
+            rows["switchboards"].append({"switchboard_id": sb_id, "revision_id": r,
+                                         "switchboard_name": f"RS{s + 1}", "switchboard_order": s + 1,
+                                         "switchboard_location": rng.choice(ROOMS)})
+            for d in range(5):
+                dev_id += 1
+                rows["devices"].append({"device_id": dev_id, "switchboard_id": sb_id,
+                                        "switchboard_device_position": f"F{d + 1}"})
+                for c in range(2):
+                    circuit_id += 1
+                    rows["circuits"].append({"circuit_id": circuit_id, "device_id": dev_id,
+                                             "circuit_number": f"{d + 1}.{c + 1}",
+                                             "circuit_room": rng.choice(ROOMS),
+                                             "circuit_description": "zásuvkový okruh" if c else "světelný okruh"})
+                    for _ in range(2):
+                        td_id += 1
+                        rows["terminals"].append({"terminal_device_id": td_id, "circuit_id": circuit_id,
+                                                  "terminal_device_type": "Zásuvka",
+                                                  "terminal_device_manufacturer": rng.choice(MANUFACTURERS),
+                                                  "terminal_device_model": f"M{rng.randint(100, 999)}"})
+    with engine.begin() as conn:
+        for name, model in (("revisions", models.Revision), ("switchboards", models.Switchboard),
+                            ("devices", models.SwitchboardDevice), ("circuits", models.Circuit),
+                            ("terminals", models.TerminalDevice)):
+            conn.execute(insert(model), rows[name])
+    # Přístroje se neindexují.
+    return sum(len(v) for v in rows.values()), sum(len(v) for k, v in rows.items() if k != "devices")
+
+
+def like_search(db, models, user_id, term):
+    """Referenční hledání podřetězce přes zdrojové tabulky (bez indexu)."""
+    from sqlalchemy import func, literal, or_, select, union_all
+
+    pattern = f"%{term.lower()}%"
+    R, S, D, C, T = (models.Revision, models.Switchboard, models.SwitchboardDevice,
+                     models.Circuit, models.TerminalDevice)
+
+    def match(*columns):
+        return or_(*(func.lower(col).like(pattern) for col in columns))
+
+    stmt = union_all(
+        select(literal("revision"), R.revision_id).where(
+            R.user_id == user_id, match(R.revision_name, R.revision_address, R.revision_client, R.revision_code)),
+        select(literal("switchboard"), S.switchboard_id).join(R).where(
+            R.user_id == user_id, match(S.switchboard_name, S.switchboard_location)),
+        select(literal("circuit"), C.circuit_id).join(D).join(S).join(R).where(
+            R.user_id == user_id, match(C.circuit_number, C.circuit_room, C.circuit_description)),
+        select(literal("terminal_device"), T.terminal_device_id).join(C).join(D).join(S).join(R).where(
+            R.user_id == user_id, match(T.terminal_device_manufacturer, T.terminal_device_model,
+                                        T.terminal_device_type, T.terminal_device_marking)),
+    )
+    return {tuple(row) for row in db.execute(stmt)}
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import delete, func, select, text, update
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+    from search import search
+
+    migrate()
+    with database.SessionLocal() as db:
+        for user_id in (1, 2):
+            db.add(models.User(user_id=user_id, username=f"u{user_id}", email=f"u{user_id}@example.com",
+                               password_hash="x"))
+        db.commit()
+    started = time.perf_counter()
+    count, searchable = populate(database.engine, models, args.revisions, random.Random(1))
+    insert_ms = (time.perf_counter() - started) * 1000
+    with database.SessionLocal() as db:
+        indexed = db.scalar(text("SELECT count(*) FROM search_index"))
+    print(f"{args.revisions} revisions, {count} rows inserted in {insert_ms:.0f} ms, {indexed} indexed")
+    failed = indexed != searchable
+
+    loop = asyncio.new_event_loop()
+
+    def fts(term, limit=100000):
+        async def run():
+            async with database.AsyncSessionLocal() as db:
+                return await search(db, 1, term, limit=limit)
+        return loop.run_until_complete(run())
+
+    print(f"{'query':<14} {'hits':>6} {'fts ms':>8} {'like ms':>8}  same")
+    for term in ("koupelna", "schneider", "nádražní", "m512", "klient"):
+        hits, fts_ms = timed(lambda: fts(term, limit=50), args.repeat)
+        all_hits = fts(term)
+        with database.SessionLocal() as db:
+            expected, like_ms = timed(lambda: like_search(db, models, 1, term), args.repeat)
+        same = {(h["entity"], h["id"]) for h in all_hits} == expected
+        failed = failed or not same
+        print(f"{term:<14} {len(all_hits):>6} {fts_ms:>8.2f} {like_ms:>8.2f}  {same}")
+
+    checks = {}
+    # Bez diakritiky a prefixem; název váží víc než popis.
+    hits = fts("kuchyn")
+    checks["diacritics-insensitive"] = bool(hits) and all("Kuchyň" in h["title"] + h["body"] for h in hits)
+    checks["prefix"] = len(fts("schn")) == len(fts("schneider"))
+    checks["other user's rows hidden"] = all(h["revision_id"] % 2 == 1 for h in fts("revize", limit=1000))
+    in_title = ["Kuchyň" in h["title"] for h in fts("kuchyn")]
+    checks["title outranks body"] = in_title == sorted(in_title, reverse=True)
+
+    with database.SessionLocal() as db:
+        circuit_id = db.scalar(select(models.Circuit.circuit_id).order_by(models.Circuit.circuit_id))
+        db.execute(update(models.Circuit).where(models.Circuit.circuit_id == circuit_id)
+                   .values(circuit_room="Sauna"))
+        td_id = db.scalar(select(func.min(models.TerminalDevice.terminal_device_id))
+                          .where(models.TerminalDevice.terminal_device_manufacturer == "OEZ"))
+        db.execute(delete(models.TerminalDevice).where(models.TerminalDevice.terminal_device_id == td_id))
+        db.commit()
+    checks["update reindexed"] = [h["id"] for h in fts("sauna")] == [circuit_id]
+    with database.SessionLocal() as db:
+        # revize v indexu = denormalizované revision_id (u populate ho dopočetly triggery)
+        stale = sum(db.scalar(text(
+            f"SELECT count(*) FROM {table} t JOIN search_index si ON si.rowid = t.{pk} * 4 + {code} "
+            f"WHERE si.revision_id IS NOT t.revision_id"
+        )) for table, pk, code in (("circuits", "circuit_id", 2), ("terminal_devices", "terminal_device_id", 3)))
+    checks["revision_id from rows"] = stale == 0
+    checks["delete removed"] = td_id not in {h["id"] for h in fts("oez") if h["entity"] == "terminal_device"}
+
+    with TestClient(app_module.app) as client:
+        before = len(fts("sauna"))
+        resp = client.post("/revisions/1/clone", follow_redirects=False)
+        checks["clone indexed"] = resp.status_code == 303 and len(fts("sauna")) == before + 1
+        resp = client.get("/search", params={"q": "sauna"})
+        checks["search page"] = resp.status_code == 200 and "Sauna" in resp.text
+        hit = next(h for h in fts("m512") if h["entity"] == "terminal_device")
+        checks["deep link"] = client.get(hit["url"]).status_code == 200
+
+    # Přesun přístroje do rozvaděče jiné revize přeindexuje jeho obvody.
+    with database.SessionLocal() as db:
+        device_id = db.scalar(select(models.Circuit.device_id).where(models.Circuit.circuit_id == circuit_id))
+        target = db.scalar(select(models.Switchboard.switchboard_id).where(models.Switchboard.revision_id == 3))
+        db.execute(update(models.SwitchboardDevice).where(models.SwitchboardDevice.device_id == device_id)
+                   .values(switchboard_id=target))
+        db.commit()
+    checks["move reindexed"] = [h["revision_id"] for h in fts("sauna") if h["id"] == circuit_id] == [3]
+    loop.run_until_complete(database.async_engine.dispose())
+    loop.close()
+
+    for name, ok in checks.items():
+        print(f"{name:<26} {'ok' if ok else 'FAILED'}")
+        failed = failed or not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
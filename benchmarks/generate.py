@@ -0,0 +1,228 @@
+"""
+Generátor syntetických dat pro celou hierarchii revize.
+
+Naplní schéma models.py realistickými revizemi: rozvaděče, v každém hlavní
+vypínač -> proudové chrániče (RCD) -> jističe (řetězec parent_device_id),
+obvody s místnostmi a kabely, koncová zařízení a měření na všech úrovních.
+Zapisuje hromadnými INSERTy s předem přidělenými ID (desítky tisíc řádků
+za sekundy), hodnoty jsou deterministické pro dané --seed.
+
+Jako modul: generate(engine, models, ...) – používá benchmarks/suite.py.
+Z příkazové řádky naplní databázi z DATABASE_URL (po migraci):
+
+    DATABASE_URL=sqlite:///./demo.db python benchmarks/generate.py --revisions 20 --switchboards 4
+"""
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROOMS = ["Kuchyň", "Koupelna", "Ložnice", "Obývací pokoj", "Chodba", "Dětský pokoj", "Pracovna",
+         "Sklep", "Garáž", "Dílna", "Technická místnost", "Půda", "WC", "Šatna", "Kotelna"]
+MANUFACTURERS = ["ABB", "Schneider Electric", "Hager", "Eaton", "OEZ", "Legrand", "Siemens", "Noark"]
+CABLES = ["CYKY-J 3x1,5", "CYKY-J 3x2,5", "CYKY-J 5x2,5", "CYKY-J 5x4", "CYKY-O 2x1,5", "CGSG 3x2,5"]
+INSTALLATION = ["pod omítkou", "v liště", "v trubce", "na povrchu", "v podhledu"]
+TERMINALS = [("Zásuvka 230 V", 2), ("Svítidlo", 1), ("Vypínač", 1), ("Sporák", 1), ("Bojler", 1),
+             ("Pračka", 1), ("Zásuvka 400 V", 1), ("Ventilátor", 1)]
+STREETS = ["Nádražní", "Školní", "Husova", "Palackého", "Lipová", "Zahradní", "Komenského", "Masarykova"]
+BUILDINGS = ["RD", "BD", "sklad", "kanceláře", "škola", "dílna"]
+CITIES = ["Brno", "Olomouc", "Jihlava", "Zlín", "Kolín", "Tábor", "Přerov", "Třebíč"]
+
+
+def _next_ids(conn, models):
+    from sqlalchemy import func, select
+
+    tables = {
+        "revision": models.Revision.revision_id,
+        "switchboard": models.Switchboard.switchboard_id,
+        "device": models.SwitchboardDevice.device_id,
+        "circuit": models.Circuit.circuit_id,
+        "terminal": models.TerminalDevice.terminal_device_id,
+    }
+    return {name: (conn.scalar(select(func.max(pk))) or 0) + 1 for name, pk in tables.items()}
+
+
+def generate(engine, models, revisions=1, switchboards=3, rcds=2, devices=12, circuits=2, terminals=3,
+             measurements=True, user_id=1, seed=1):
+    """
+    Vygeneruje `revisions` revizí uživatele user_id (uživatele založí, pokud
+    chybí). Každý rozvaděč má hlavní vypínač, `rcds` chráničů pod ním a
+    `devices` jističů rozdělených pod chrániče; každý jistič `circuits`
+    obvodů, každý obvod `terminals` koncových zařízení. Vrací
+    {"revisions": [ID], "switchboards": [ID], "devices": [ID], "circuits": [ID],
+    "terminal_devices": [ID], "rows": počet vložených řádků}.
+    """
+    from sqlalchemy import insert, select
+
+    rng = random.Random(seed)
+    rows = {name: [] for name in ("revisions", "switchboards", "sb_meas", "devices", "circuits",
+                                  "circuit_meas", "terminals", "terminal_meas")}
+    with engine.begin() as conn:
+        if conn.scalar(select(models.User.user_id).where(models.User.user_id == user_id)) is None:
+            conn.execute(insert(models.User).values(
+                user_id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", password_hash="x",
+            ))
+        ids = _next_ids(conn, models)
+
+        for _ in range(revisions):
+            rev_id = ids["revision"]
+            ids["revision"] += 1
+            city = rng.choice(CITIES)
+            rows["revisions"].append({
+                "revision_id": rev_id, "user_id": user_id,
+                "revision_name": f"Revize elektroinstalace – {rng.choice(BUILDINGS)} {city}",
+                "revision_code": f"RV-{rev_id:05d}",
+                "revision_address": f"{rng.choice(STREETS)} {rng.randint(1, 180)}, {city}",
+                "revision_client": f"Klient {rng.randint(1, 500)}",
+                "revision_type": rng.choice(["pravidelná", "výchozí"]),
+                "revision_technician": "Ing. Jan Novák",
+                "revision_short_description": "Periodická revize elektrické instalace.",
+            })
+            for s in range(switchboards):
+                sb_id = ids["switchboard"]
+                ids["switchboard"] += 1
+                rows["switchboards"].append({
+                    "switchboard_id": sb_id, "revision_id": rev_id, "switchboard_order": s + 1,
+                    "switchboard_name": "RH" if s == 0 else f"RP{s}",
+                    "switchboard_location": rng.choice(ROOMS),
+                    "switchboard_rated_current": rng.choice([25.0, 32.0, 40.0, 63.0]),
+                    "switchboard_rated_voltage": 400.0,
+                    "switchboard_manufacturer": rng.choice(MANUFACTURERS),
+                })
+                rows["sb_meas"].append({
+                    "switchboard_id": sb_id,
+                    **({
+                        "measurements_switchboard_insulation_resistance": round(rng.uniform(50, 500), 1),
+                        "measurements_switchboard_earth_resistance": round(rng.uniform(0.5, 8), 2),
+                    } if measurements else {}),
+                })
+
+                main_id = ids["device"]
+                ids["device"] += 1
+                rows["devices"].append({
+                    "device_id": main_id, "switchboard_id": sb_id, "revision_id": rev_id,
+                    "parent_device_id": None,
+                    "switchboard_device_position": "Q1", "switchboard_device_type": "Hlavní vypínač",
+                    "switchboard_device_manufacturer": rng.choice(MANUFACTURERS),
+                    "switchboard_device_rated_current": 40.0, "switchboard_device_poles": 3,
+                })
+                rcd_ids = []
+                for r in range(rcds):
+                    rcd_ids.append(ids["device"])
+                    rows["devices"].append({
+                        "device_id": ids["device"], "switchboard_id": sb_id, "revision_id": rev_id,
+                        "parent_device_id": main_id,
+                        "switchboard_device_position": f"FI{r + 1}", "switchboard_device_type": "RCD",
+                        "switchboard_device_manufacturer": rng.choice(MANUFACTURERS),
+                        "switchboard_device_rated_current": 40.0, "switchboard_device_residual_current_ma": 30.0,
+                        "switchboard_device_poles": 4,
+                    })
+                    ids["device"] += 1
+                for d in range(devices):
+                    dev_id = ids["device"]
+                    ids["device"] += 1
+                    rated = rng.choice([10.0, 16.0, 16.0, 20.0, 25.0])
+                    rows["devices"].append({
+                        "device_id": dev_id, "switchboard_id": sb_id, "revision_id": rev_id,
+                        "parent_device_id": rcd_ids[d % len(rcd_ids)] if rcd_ids else main_id,
+                        "switchboard_device_position": f"F{d + 1}", "switchboard_device_type": "MCB",
+                        "switchboard_device_manufacturer": rng.choice(MANUFACTURERS),
+                        "switchboard_device_model": f"{rng.choice('BC')}{int(rated)}",
+                        "switchboard_device_trip_characteristic": rng.choice("BC"),
+                        "switchboard_device_rated_current": rated, "switchboard_device_poles": 1,
+                    })
+                    for c in range(circuits):
+                        circuit_id = ids["circuit"]
+                        ids["circuit"] += 1
+                        loops = []
+                        circuit_terminals = []
+                        for _t in range(terminals):
+                            kind, quantity = rng.choice(TERMINALS)
+                            td_id = ids["terminal"]
+                            ids["terminal"] += 1
+                            circuit_terminals.append(quantity)
+                            rows["terminals"].append({
+                                "terminal_device_id": td_id, "circuit_id": circuit_id, "revision_id": rev_id,
+                                "terminal_device_type": kind, "terminal_device_quantity": quantity,
+                                "terminal_device_manufacturer": rng.choice(MANUFACTURERS),
+                                "terminal_device_cable": rng.choice(CABLES),
+                                "terminal_device_cable_installation_method": rng.choice(INSTALLATION),
+                            })
+                            if measurements:
+                                z_min = round(rng.uniform(0.2, 1.2), 2)
+                                loops.append(z_min)
+                                rows["terminal_meas"].append({
+                                    "terminal_device_id": td_id,
+                                    "measurements_circuit_insulation_resistance": round(rng.uniform(20, 500), 1),
+                                    "measurements_circuit_loop_impedance_min": z_min,
+                                    "measurements_circuit_loop_impedance_max": round(z_min + rng.uniform(0, 0.4), 2),
+                                    "measurements_circuit_rcd_trip_time_ms": round(rng.uniform(12, 40), 1),
+                                    "measurements_circuit_rcd_test_current_ma": 30.0,
+                                })
+                        rows["circuits"].append({
+                            "circuit_id": circuit_id, "device_id": dev_id, "revision_id": rev_id,
+                            "circuit_number": f"{d + 1}.{c + 1}", "circuit_room": rng.choice(ROOMS),
+                            "circuit_description": rng.choice(["zásuvky", "osvětlení", "spotřebič"]),
+                            "circuit_cable": rng.choice(CABLES),
+                            "circuit_cable_installation_method": rng.choice(INSTALLATION),
+                            "circuit_number_of_outlets": sum(circuit_terminals) or None,
+                        })
+                        if measurements:
+                            rows["circuit_meas"].append({
+                                "circuit_id": circuit_id,
+                                "measurements_circuit_continuity": round(rng.uniform(0.05, 0.5), 2),
+                                **({"measurements_circuit_loop_impedance_min": min(loops)} if loops else {}),
+                            })
+
+        for name, model in (("revisions", models.Revision), ("switchboards", models.Switchboard),
+                            ("sb_meas", models.SwitchboardMeasurement), ("devices", models.SwitchboardDevice),
+                            ("circuits", models.Circuit), ("circuit_meas", models.CircuitMeasurement),
+                            ("terminals", models.TerminalDevice), ("terminal_meas", models.TerminalMeasurement)):
+            if rows[name]:
+                # executemany potřebuje ve všech řádcích stejné klíče
+                keys = set().union(*rows[name])
+                conn.execute(insert(model), [{key: row.get(key) for key in keys} for row in rows[name]])
+
+    return {
+        "revisions": [r["revision_id"] for r in rows["revisions"]],
+        "switchboards": [r["switchboard_id"] for r in rows["switchboards"]],
+        "devices": [r["device_id"] for r in rows["devices"]],
+        "circuits": [r["circuit_id"] for r in rows["circuits"]],
+        "terminal_devices": [r["terminal_device_id"] for r in rows["terminals"]],
+        "rows": sum(len(v) for v in rows.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=1)
+    parser.add_argument("--switchboards", type=int, default=3)
+    parser.add_argument("--rcds", type=int, default=2)
+    parser.add_argument("--devices", type=int, default=12)
+    parser.add_argument("--circuits", type=int, default=2)
+    parser.add_argument("--terminals", type=int, default=3)
+    parser.add_argument("--no-measurements", action="store_true")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    import database
+    import models
+    from migrations import migrate
+
+    migrate()
+    result = generate(
+        database.engine, models, revisions=args.revisions, switchboards=args.switchboards, rcds=args.rcds,
+        devices=args.devices, circuits=args.circuits, terminals=args.terminals,
+        measurements=not args.no_measurements, user_id=args.user_id, seed=args.seed,
+    )
+    print(f"{result['rows']} rows: revisions {result['revisions'][0]}–{result['revisions'][-1]}, "
+          f"{len(result['switchboards'])} switchboards, {len(result['devices'])} devices, "
+          f"{len(result['circuits'])} circuits, {len(result['terminal_devices'])} terminal devices")
+
+
+if __name__ == "__main__":
+    main()
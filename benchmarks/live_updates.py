@@ -0,0 +1,276 @@
+"""
+Živé změny revize přes Server-Sent Events (live.py) proti skutečnému gunicornu.
+
+Vygeneruje dvě revize (benchmarks/generate.py) a pro každý backend
+(memory s jedním workerem, database s --workers workery) otevře
+--connections nečinných odběrů /revisions/{id}/events první revize a pár
+odběrů druhé. Vypíše paměť workeru na spojení a CPU workeru za --idle
+sekund nečinnosti (jen memory – jeden worker), pak --writes krát uloží
+měření obvodu a změří, za jak dlouho zprávu dostanou všechna spojení.
+
+Ověří, že zprávu dostal každý odběratel revize a žádný odběratel jiné
+revize, že nese změněná pole a ID klienta z X-Live-Client, že uložení
+měření koncového zařízení pošle i přepočtený souhrn obvodu (zápis mimo
+ORM), že se po výpadku dorovnají zmeškané zprávy podle Last-Event-ID,
+že backend database za mezerou v seq (transakce, která commitne později)
+počká a zprávy doručí v pořadí, a že cizí revize vrací 404. Jinak skončí
+s kódem 1.
+
+    python benchmarks/live_updates.py --connections 500 --writes 20 --workers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import percentile  # noqa: E402
+from generate import generate  # noqa: E402
+from workers import run_server  # noqa: E402
+
+
+def proc_stats(pid):
+    """(RSS v kB, CPU čas v s) procesu z /proc."""
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return rss, (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class Listener:
+    """Jedno SSE spojení; sbírá zprávy (id, událost, data, čas přijetí)."""
+
+    def __init__(self, client, url, headers=None):
+        self.messages = []
+        self.ready = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.task = asyncio.create_task(self._run(client, url, headers or {}))
+
+    async def _run(self, client, url, headers):
+        async with client.stream("GET", url, headers=headers) as resp:
+            self.status = resp.status_code
+            if resp.status_code != 200:
+                self.ready.set()
+                return
+            fields = {}
+            async for line in resp.aiter_lines():
+                if line:
+                    name, _, value = line.partition(":")
+                    fields[name] = value.lstrip(" ")
+                    continue
+                if "retry" in fields:
+                    self.ready.set()
+                elif "event" in fields:
+                    self.messages.append((fields.get("id"), fields["event"], fields.get("data"), time.perf_counter()))
+                    self.changed.set()
+                fields = {}
+
+    async def close(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+async def scenario(base, args, rev_id, other_rev_id, circuit_id, td_id, backend, env_gap_seconds):
+    import httpx
+
+    failed = []
+
+    def check(label, ok):
+        if not ok:
+            failed.append(label)
+        print(f"  {label:<58} {'ok' if ok else 'FAIL'}")
+
+    # oba backendy zapisují do stejné databáze – stejná hodnota by nebyla změna
+    offset = 0 if backend == "memory" else 1
+
+    def value(i):
+        return round(offset + (i + 10) / 100, 2)
+
+    limits = httpx.Limits(max_connections=args.connections + 50, max_keepalive_connections=10)
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0, read=None)) as client:
+        pid = (await client.get(base + "/debug/live")).json()["pid"]
+
+        url = f"{base}/revisions/{rev_id}/events"
+        listeners = []
+        started = time.perf_counter()
+        for i in range(0, args.connections, 50):
+            batch = [Listener(client, url) for _ in range(min(50, args.connections - i))]
+            await asyncio.gather(*(listener.ready.wait() for listener in batch))
+            listeners += batch
+            if i == 0:
+                # první dávka zahřeje kód a alokátor, paměť na spojení měříme až od ní
+                rss_before, _ = proc_stats(pid)
+        connect_s = time.perf_counter() - started
+        others = [Listener(client, f"{base}/revisions/{other_rev_id}/events") for _ in range(5)]
+        await asyncio.gather(*(listener.ready.wait() for listener in others))
+        print(f"  {len(listeners)} connections open in {connect_s:.2f} s")
+
+        if backend == "memory":
+            await asyncio.sleep(1.0)
+            rss_open, cpu_start = proc_stats(pid)
+            await asyncio.sleep(args.idle)
+            _, cpu_end = proc_stats(pid)
+            print(f"  worker RSS +{(rss_open - rss_before) / max(1, len(listeners) - 50):.1f} kB per connection, "
+                  f"idle CPU {(cpu_end - cpu_start) / args.idle * 100:.2f} % over {args.idle:.0f} s")
+
+        latencies, write_ms = [], []
+        _, cpu_before = proc_stats(pid)
+        for i in range(args.writes):
+            for listener in listeners:
+                listener.changed.clear()
+            sent = time.perf_counter()
+            resp = await client.post(
+                f"{base}/circuits/{circuit_id}/measurements/save",
+                data={"measurements_circuit_continuity": str(value(i))},
+                headers={"X-Live-Client": "bench", "X-Fragment": "1"},
+            )
+            write_ms.append((time.perf_counter() - sent) * 1000)
+            if resp.status_code != 200:
+                check(f"write {i} -> {resp.status_code}", False)
+                break
+            try:
+                await asyncio.wait_for(asyncio.gather(*(l.changed.wait() for l in listeners)), 10)
+            except asyncio.TimeoutError:
+                pass
+            arrived = [l.messages[-1][3] for l in listeners if l.changed.is_set()]
+            check_all = len(arrived) == len(listeners)
+            if not check_all:
+                check(f"write {i}: all {len(listeners)} connections got the event", False)
+                break
+            latencies.append((max(arrived) - sent) * 1000)
+        _, cpu_after = proc_stats(pid)
+        if latencies:
+            print(f"  write {percentile(sorted(write_ms), 50):.1f} ms; last delivery after "
+                  f"p50 {percentile(sorted(latencies), 50):.1f} ms, max {max(latencies):.1f} ms "
+                  f"({len(listeners)} connections)")
+        if backend == "memory":
+            print(f"  worker CPU {(cpu_after - cpu_before) / args.writes * 1000:.1f} ms per write incl. fan-out")
+
+        first = listeners[0].messages
+        check("every connection got every write",
+              all(len([m for m in l.messages if m[1] == "change"]) == args.writes for l in listeners))
+        check("other revision got nothing", not any(l.messages for l in others))
+        data = json.loads(first[-1][2]) if first else {}
+        change = (data.get("changes") or [{}])[0]
+        check("payload: entity, id, changed field, origin",
+              data.get("origin") == "bench" and change.get("entity") == "circuit_measurement"
+              and change.get("id") == circuit_id
+              and change.get("fields", {}).get("measurements_circuit_continuity") == value(args.writes - 1)
+              and change.get("parent") == f"circuit:{circuit_id}")
+        check(f"payload is compact ({len(first[-1][2]) if first else 0} B)", bool(first) and len(first[-1][2]) < 1024)
+
+        probe = listeners[1]
+        seen = len(probe.messages)
+        await client.post(f"{base}/terminal-devices/{td_id}/measurements/save",
+                          data={"measurements_circuit_loop_impedance_min": str(value(99))})
+        await asyncio.sleep(0.3 if backend == "memory" else 1.2)
+        entities = {c["entity"]: c for m in probe.messages[seen:] for c in json.loads(m[2])["changes"]}
+        check("terminal save also sends circuit roll-up (non-ORM write)",
+              entities.get("terminal_measurement", {}).get("id") == td_id
+              and entities.get("circuit_measurement", {}).get("fields", {})
+              .get("measurements_circuit_loop_impedance_min") is not None
+              and "circuit" in entities)
+
+        if backend == "memory":
+            resumed = Listener(client, url, {"Last-Event-ID": probe.messages[-2][0]})
+            await resumed.ready.wait()
+            await asyncio.sleep(0.3)
+            check("Last-Event-ID replays the missed message",
+                  [m[0] for m in resumed.messages] == [probe.messages[-1][0]])
+            gone = Listener(client, url, {"Last-Event-ID": "999999"})
+            await gone.ready.wait()
+            await asyncio.sleep(0.3)
+            check("unknown Last-Event-ID asks for resync", [m[1] for m in gone.messages] == ["resync"])
+            await resumed.close()
+            await gone.close()
+
+        if backend == "database":
+            # transakce s nižším seq commitne až po vyšším: poller na ni počká
+            import database
+            from sqlalchemy import func, insert, select
+            from models import LiveEvent
+
+            def event_row(seq):
+                payload = json.dumps({"changes": [], "origin": f"gap-{seq}"})
+                with database.engine.begin() as conn:
+                    conn.execute(insert(LiveEvent).values(seq=seq, revision_id=rev_id, payload=payload))
+
+            def origins():
+                return [json.loads(m[2])["origin"] for m in probe.messages[seen:]]
+
+            with database.engine.connect() as conn:
+                last = conn.scalar(select(func.max(LiveEvent.seq)))
+            seen = len(probe.messages)
+            event_row(last + 2)
+            await asyncio.sleep(1.2)
+            held = origins() == []
+            event_row(last + 1)
+            await asyncio.sleep(1.2)
+            check("event behind a seq gap waits, then arrives in order",
+                  held and origins() == [f"gap-{last + 1}", f"gap-{last + 2}"])
+            seen = len(probe.messages)
+            event_row(last + 4)
+            await asyncio.sleep(1.2)
+            held = origins() == []
+            await asyncio.sleep(float(env_gap_seconds) + 0.6)
+            check("unfilled gap (rollback) skipped after LIVE_GAP_SECONDS",
+                  held and origins() == [f"gap-{last + 4}"])
+
+        missing = await client.get(f"{base}/revisions/999999/events")
+        check("unknown revision -> 404", missing.status_code == 404)
+
+        await asyncio.gather(*(listener.close() for listener in listeners + others))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--writes", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2, help="workery pro backend database")
+    parser.add_argument("--idle", type=float, default=5.0, help="sekundy měření nečinnosti")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import database
+    import models
+    from migrations import migrate
+
+    migrate()
+    data = generate(database.engine, models, revisions=2, switchboards=1)
+    rev_id, other_rev_id = data["revisions"]
+    circuit_id = data["circuits"][0]
+    with database.engine.connect() as conn:
+        from sqlalchemy import select
+
+        td_id = conn.scalar(select(models.TerminalDevice.terminal_device_id)
+                            .where(models.TerminalDevice.circuit_id == circuit_id))
+
+    failed = []
+    for backend, workers in (("memory", 1), ("database", args.workers)):
+        print(f"LIVE_BACKEND={backend}, {workers} worker(s)")
+        env = dict(os.environ, APP_BOOTSTRAPPED="1", GUNICORN_ACCESS_LOG="", LIVE_BACKEND=backend,
+                   LIVE_HEARTBEAT_SECONDS="1", LIVE_GAP_SECONDS="2")
+        result, _ = run_server(workers, env, "/debug/live", lambda url: asyncio.run(scenario(
+            url.rsplit("/debug/", 1)[0], args, rev_id, other_rev_id, circuit_id, td_id, backend,
+            env["LIVE_GAP_SECONDS"])))
+        failed += [f"{backend}: {label}" for label in result]
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
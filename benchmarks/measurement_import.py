@@ -0,0 +1,191 @@
+"""
+Benchmark importu exportů z měřicích přístrojů (importer.py).
+
+Vygeneruje CSV (středníky, desetinné čárky, úvodní řádky přístroje) a XML
+(vnořené Circuit/Point) s --readings odečty pro rozvaděč o --devices ×
+--circuits obvodech a --terminals označených koncových zařízeních. Změří
+propustnost parseru a špičku alokované paměti (tracemalloc) pro 1/5 a plný
+počet odečtů – špička nesmí růst s počtem odečtů. Pak soubor pošle na
+POST /switchboards/{id}/import jako dry run a naostro a ověří uložené
+hodnoty; odečet jen pro obvod u označeného místa nesmí založit prázdné
+měření koncového zařízení. Při chybě skončí s kódem 1.
+
+    python benchmarks/measurement_import.py --readings 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import seed  # noqa: E402
+
+
+def readings(targets, count, rng):
+    """Náhodné odečty (circuit_number, marking, zs, riso, ta) přes všechny cíle."""
+    for _ in range(count):
+        number, marking = rng.choice(targets)
+        yield number, marking, round(rng.uniform(0.2, 1.5), 2), round(rng.uniform(20, 500), 1), rng.randint(12, 40)
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        f.write("Instrument;MI 3152 EurotestXC\nSerial;12345678\n\n")
+        f.write("Circuit;Point;Zs (Ω);Riso (MΩ);tA (ms)\n")
+        for number, marking, zs, riso, ta in rows:
+            zs, riso = str(zs).replace(".", ","), str(riso).replace(".", ",")
+            f.write(f"{number};{marking};{zs};{riso};{ta}\n")
+
+
+def write_xml(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<Results instrument="1664 FC">\n')
+        for number, marking, zs, riso, ta in rows:
+            f.write(
+                f'  <Circuit CircuitNo="{number}"><Point Marking="{marking}">'
+                f'<Zs unit="Ω">{zs}</Zs><Value name="Riso">{riso}</Value><Ta>{ta}</Ta></Point></Circuit>\n'
+            )
+        f.write("</Results>\n")
+
+
+def parse_profile(importer, path):
+    """Propustnost bez tracemallocu (zpomaluje), špička paměti v druhém běhu."""
+    with open(path, "rb") as f:
+        _, stats = importer.parse_export(f, os.path.basename(path))
+    tracemalloc.start()
+    with open(path, "rb") as f:
+        importer.parse_export(f, os.path.basename(path))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return stats, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=50000)
+    parser.add_argument("--devices", type=int, default=30)
+    parser.add_argument("--circuits", type=int, default=2)
+    parser.add_argument("--terminals", type=int, default=3)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, select
+    import database
+    import importer
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    _, sb_ids, _ = seed(database.SessionLocal, models, switchboards=1, devices=args.devices,
+                        circuits=args.circuits, terminals=args.terminals)
+    targets = []
+    with database.SessionLocal() as db:
+        for circuit in db.scalars(select(models.Circuit)):
+            for k, td in enumerate(sorted(circuit.terminal_devices, key=lambda t: t.terminal_device_id)):
+                td.terminal_device_marking = f"Z{k + 1}"
+                targets.append((circuit.circuit_number, td.terminal_device_marking))
+        db.commit()
+
+    rng = random.Random(1)
+    full = list(readings(targets, args.readings, rng))
+    small = full[: max(1, args.readings // 5)]
+    expected = {}
+    for number, marking, zs, riso, ta in full:
+        lo, hi, r, t = expected.get((number, marking), (zs, zs, riso, ta))
+        expected[(number, marking)] = (min(lo, zs), max(hi, zs), min(r, riso), max(t, ta))
+
+    failed = False
+    files = {}
+    print(f"{len(targets)} terminal devices, {args.readings} readings")
+    print(f"{'file':<10} {'readings':>9} {'MB':>6} {'parse ms':>9} {'readings/s':>11} {'peak KiB':>9}")
+    for fmt, writer in (("csv", write_csv), ("xml", write_xml)):
+        peaks = []
+        for label, rows in (("1/5", small), ("full", full)):
+            path = os.path.join(tmpdir, f"export-{label.replace('/', '_')}.{fmt}")
+            writer(path, rows)
+            stats, peak = parse_profile(importer, path)
+            peaks.append(peak)
+            size = os.path.getsize(path) / 1e6
+            print(f"{fmt + ' ' + label:<10} {stats['readings']:>9} {size:>6.1f} {stats['parse_ms']:>9.1f} "
+                  f"{stats['readings_per_s']:>11} {peak / 1024:>9.0f}")
+            failed = failed or stats["readings"] != len(rows)
+        files[fmt] = path
+        # Paměť smí záviset na počtu cílů, ne na počtu odečtů (5× víc odečtů).
+        if peaks[1] > peaks[0] * 1.5:
+            print(f"  {fmt}: peak memory grows with file size")
+            failed = True
+
+    with TestClient(app_module.app) as client:
+        client.get("/revisions")
+        for fmt, path in files.items():
+            for dry_run in (True, False):
+                with open(path, "rb") as f:
+                    started = time.perf_counter()
+                    resp = client.post(
+                        f"/switchboards/{sb_ids[0]}/import",
+                        files={"file": (os.path.basename(path), f)},
+                        data={"dry_run": str(dry_run).lower()},
+                    )
+                    elapsed = (time.perf_counter() - started) * 1000
+                body = resp.json()
+                print(f"POST import {fmt} dry_run={dry_run}: {resp.status_code} {elapsed:.0f} ms "
+                      f"terminal_devices={body.get('terminal_devices')} changes={body.get('changes')} "
+                      f"unmatched={body.get('unmatched')}")
+                failed = failed or resp.status_code != 200 or body.get("unmatched")
+
+        # Označené místo jen s odečtem obvodu (spojitost) nezaloží prázdné měření zařízení.
+        with database.SessionLocal() as db:
+            circuit = db.scalars(select(models.Circuit).order_by(models.Circuit.circuit_id)).first()
+            td = models.TerminalDevice(circuit_id=circuit.circuit_id, revision_id=circuit.revision_id,
+                                       terminal_device_marking="Z9")
+            db.add(td)
+            db.commit()
+            number, circuit_id, td_id = circuit.circuit_number, circuit.circuit_id, td.terminal_device_id
+        path = os.path.join(tmpdir, "continuity.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Circuit;Point;Rlow (Ω)\n{number};Z9;0,25\n")
+        with open(path, "rb") as f:
+            resp = client.post(f"/switchboards/{sb_ids[0]}/import", files={"file": ("continuity.csv", f)},
+                               data={"dry_run": "false"})
+        with database.SessionLocal() as db:
+            empty_rows = db.scalar(select(func.count()).select_from(models.TerminalMeasurement)
+                                   .where(models.TerminalMeasurement.terminal_device_id == td_id))
+            continuity = db.scalar(select(models.CircuitMeasurement.measurements_circuit_continuity)
+                                   .where(models.CircuitMeasurement.circuit_id == circuit_id))
+        circuit_only = (resp.status_code == 200 and resp.json()["terminal_devices"] == 0
+                        and empty_rows == 0 and continuity == 0.25)
+        print("circuit-only reading at a marked point, no empty terminal row:", circuit_only)
+        failed = failed or not circuit_only
+
+    with database.SessionLocal() as db:
+        rows = db.execute(
+            select(models.Circuit.circuit_number, models.TerminalDevice.terminal_device_marking,
+                   models.TerminalMeasurement)
+            .join(models.TerminalDevice, models.TerminalDevice.circuit_id == models.Circuit.circuit_id)
+            .join(models.TerminalMeasurement)
+        ).all()
+        stored = {
+            (number, marking): (
+                m.measurements_circuit_loop_impedance_min, m.measurements_circuit_loop_impedance_max,
+                m.measurements_circuit_insulation_resistance, m.measurements_circuit_rcd_trip_time_ms,
+            )
+            for number, marking, m in rows
+        }
+    ok = stored == {k: tuple(float(x) for x in v) for k, v in expected.items()}
+    print("stored values match aggregated readings:", ok)
+    sys.exit(1 if failed or not ok else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Rozdílová synchronizace pro offline tablety (delta_sync.py).
+
+Vygeneruje dvě revize (benchmarks/generate.py, --switchboards rozvaděčů
+po --devices jističích) a tablet si první z nich stáhne celou (kurzor 0).
+Pak pro každý počet z --edits provede tolik úprav měření obvodů přes web
+a tablet stáhne jen změny od svého kurzoru. Vypíše záznamy, bajty, ms
+a SQL příkazy úplného stažení a jednotlivých rozdílů.
+
+Ověří, že rozdíl obsahuje jen změněné záznamy (úpravy druhé revize se
+neobjeví), že smazání dorazí jako tombstone, že odeslání změn s prošlou
+verzí vrátí konflikt s aktuálním stavem a ostatní operace uloží, že chybná
+operace neuloží nic a že kopie v tabletu po všech rozdílech (i po stránkách)
+odpovídá úplnému stažení. Jinak skončí s kódem 1.
+
+    python benchmarks/offline_sync.py --switchboards 20 --devices 24 --edits 1,10,100
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from generate import generate  # noqa: E402
+
+
+class Tablet:
+    """Kopie revize v tabletu: (entita, ID) -> (verze, data) a kurzor."""
+
+    def __init__(self, client, rev_id, statements):
+        self.client = client
+        self.url = f"/revisions/{rev_id}/sync"
+        self.statements = statements
+        self.records = {}
+        self.cursor = 0
+
+    def pull(self, limit=None):
+        """Stáhne změny od kurzoru (všechny stránky); vrátí (změny, tombstony, bajty, ms, SQL)."""
+        changes, deleted, size, queries = [], [], 0, 0
+        started = time.perf_counter()
+        while True:
+            params = {"cursor": self.cursor}
+            if limit:
+                params["limit"] = limit
+            self.statements.clear()
+            resp = self.client.get(self.url, params=params)
+            queries += len(self.statements)
+            size += len(resp.content)
+            page = resp.json()
+            changes += page["changes"]
+            deleted += page["deleted"]
+            for record in page["changes"]:
+                self.records[(record["entity"], record["id"])] = (record["version"], record["data"])
+            for record in page["deleted"]:
+                self.records.pop((record["entity"], record["id"]), None)
+            self.cursor = page["cursor"]
+            if not page["more"]:
+                break
+        return changes, deleted, size, (time.perf_counter() - started) * 1000, queries
+
+    def version(self, entity, entity_id):
+        return self.records[(entity, entity_id)][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--switchboards", type=int, default=20)
+    parser.add_argument("--devices", type=int, default=24)
+    parser.add_argument("--edits", default="1,10,100")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, select
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    data = generate(database.engine, models, revisions=2, switchboards=args.switchboards, devices=args.devices)
+    rev_id, other_rev_id = data["revisions"]
+    with database.engine.connect() as conn:
+        circuits = conn.scalars(
+            select(models.Circuit.circuit_id).where(models.Circuit.revision_id == rev_id).order_by(models.Circuit.circuit_id)
+        ).all()
+        other_circuit = conn.scalar(select(models.Circuit.circuit_id).where(models.Circuit.revision_id == other_rev_id))
+        terminals = conn.execute(
+            select(models.TerminalDevice.terminal_device_id, models.TerminalDevice.circuit_id)
+            .where(models.TerminalDevice.revision_id == rev_id)
+            .order_by(models.TerminalDevice.terminal_device_id)
+        ).all()
+
+    statements = []
+    for eng in (database.engine, database.async_engine.sync_engine):
+        event.listen(eng, "before_cursor_execute", lambda *_: statements.append(1))
+
+    failed = []
+
+    def check(label, ok):
+        if not ok:
+            failed.append(label)
+        print(f"  {label:<62} {'ok' if ok else 'FAIL'}")
+
+    def save_circuit(circuit_id, value):
+        resp = client.post(f"/circuits/{circuit_id}/measurements/save",
+                           data={"measurements_circuit_continuity": str(value)}, headers={"X-Fragment": "1"})
+        assert resp.status_code == 200, resp.status_code
+
+    print(f"{'pull':<24} {'records':>8} {'bytes':>10} {'ms':>9} {'SQL':>5}")
+    with TestClient(app_module.app) as client:
+        tablet = Tablet(client, rev_id, statements)
+        changes, deleted, size, ms, queries = tablet.pull()
+        print(f"{'full (cursor 0)':<24} {len(changes):>8} {size:>10} {ms:>9.1f} {queries:>5}")
+        full_size = size
+
+        value = 0.0
+        for count in (int(n) for n in args.edits.split(",")):
+            for circuit_id in circuits[:count]:
+                value += 0.01
+                save_circuit(circuit_id, round(value, 2))
+            save_circuit(other_circuit, round(value, 2))
+            changes, deleted, size, ms, queries = tablet.pull()
+            print(f"{f'after {count} edit(s)':<24} {len(changes):>8} {size:>10} {ms:>9.1f} {queries:>5}")
+            check(f"{count} edit(s): only the edited measurements ({size / full_size:.2%} of full)",
+                  sorted(c["id"] for c in changes) == sorted(circuits[:count])
+                  and {c["entity"] for c in changes} == {"circuit_measurement"} and not deleted)
+
+        changes, deleted, size, ms, queries = tablet.pull()
+        check(f"no changes -> empty delta ({size} B)", not changes and not deleted)
+
+        td_id, td_circuit = terminals[0]
+        client.post(f"/terminal-devices/{td_id}/delete", follow_redirects=False)
+        changes, deleted, *_ = tablet.pull()
+        check("delete arrives as tombstone (+ circuit roll-up)",
+              {(d["entity"], d["id"]) for d in deleted} == {("terminal_device", td_id), ("terminal_measurement", td_id)}
+              and {(c["entity"], c["id"]) for c in changes} >= {("circuit_measurement", td_circuit)})
+
+        # tablet offline: upravil obvody A a B, založil zařízení s měřením, smazal zařízení;
+        # mezitím někdo na webu upravil obvod B
+        circuit_a, circuit_b = circuits[1], circuits[2]
+        stale_b = tablet.version("circuit", circuit_b)
+        client.post("/revisions/%d/batch" % rev_id, json={"operations": [
+            {"op": "update", "entity": "circuit", "id": circuit_b, "data": {"circuit_room": "Kotelna"}}]})
+        td_delete = terminals[3][0]
+        push = [
+            {"op": "update", "entity": "circuit", "id": circuit_a, "version": tablet.version("circuit", circuit_a),
+             "data": {"circuit_room": "Sklep"}},
+            {"op": "update", "entity": "circuit", "id": circuit_b, "version": stale_b,
+             "data": {"circuit_room": "Sklep 2"}},
+            {"op": "create", "entity": "terminal_device", "ref": "td",
+             "data": {"circuit_id": circuit_a, "terminal_device_type": "Zásuvka", "terminal_device_quantity": 2}},
+            {"op": "update", "entity": "terminal_measurement", "id": "td",
+             "data": {"measurements_circuit_loop_impedance_min": 0.42}},
+            {"op": "delete", "entity": "terminal_device", "id": td_delete,
+             "version": tablet.version("terminal_device", td_delete)},
+        ]
+        statements.clear()
+        started = time.perf_counter()
+        resp = client.post(tablet.url, json={"changes": push})
+        push_ms, push_queries = (time.perf_counter() - started) * 1000, len(statements)
+        result = resp.json()
+        print(f"push of {len(push)} changes: {push_ms:.1f} ms, {push_queries} SQL, {len(resp.content)} B")
+        conflicts = result.get("conflicts", [])
+        check("stale version -> conflict with current server row",
+              resp.status_code == 200 and len(conflicts) == 1 and conflicts[0]["index"] == 1
+              and conflicts[0]["data"]["circuit_room"] == "Kotelna" and conflicts[0]["version"] > stale_b)
+        new_td = result.get("created", {}).get("td")
+        versions = {(v["entity"], v["id"]): v for v in result.get("versions", [])}
+        check("other changes applied, versions returned (incl. roll-up)",
+              result.get("applied") == 4 and new_td is not None
+              and ("circuit", circuit_a) in versions and ("terminal_measurement", new_td) in versions
+              and versions.get(("terminal_device", td_delete), {}).get("deleted") is True
+              and ("circuit_measurement", circuit_a) in versions)
+
+        retry = client.post(tablet.url, json={"changes": [
+            {"op": "update", "entity": "circuit", "id": circuit_b, "version": conflicts[0]["version"] if conflicts else 0,
+             "data": {"circuit_room": "Sklep 2"}}]}).json()
+        check("re-push with the server version is applied", retry.get("applied") == 1 and not retry.get("conflicts"))
+
+        stale_measurement = client.post(tablet.url, json={"changes": [
+            {"op": "update", "entity": "circuit_measurement", "id": circuit_a,
+             "version": tablet.version("circuit_measurement", circuit_a), "data": {"measurements_circuit_continuity": 9}}
+        ]}).json()
+        check("measurement changed by roll-up -> conflict", len(stale_measurement.get("conflicts", [])) == 1)
+
+        before = tablet.cursor
+        bad = client.post(tablet.url, json={"changes": [
+            {"op": "update", "entity": "circuit", "id": circuit_a, "data": {"circuit_room": "X"}},
+            {"op": "update", "entity": "circuit", "id": 10 ** 9, "data": {"circuit_room": "Y"}},
+        ]})
+        changes, *_ = tablet.pull()
+        check("invalid change -> 400, nothing saved",
+              bad.status_code == 400 and bad.json().get("operation") == 1
+              and not any(c["data"].get("circuit_room") == "X" for c in changes))
+        check("cursor advanced past own pushes", tablet.cursor > before)
+
+        fresh = Tablet(client, rev_id, statements)
+        fresh.pull()
+        check(f"replica after deltas == full download ({len(fresh.records)} records)", tablet.records == fresh.records)
+        paged = Tablet(client, rev_id, statements)
+        paged.pull(limit=97)
+        check("paged download (97 per page) == full download", paged.records == fresh.records)
+        check("unknown revision -> 404", client.get("/revisions/999999/sync").status_code == 404)
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Kontrola vlastnictví a dotazy přes celou revizi: spoje přes hierarchii vs.
+denormalizované revision_id (ownership.py).
+
+Vygeneruje --revisions revizí (benchmarks/generate.py), pak pro --lookups
+náhodných obvodů a koncových zařízení změří kontrolu vlastnictví oběma
+způsoby (Circuit -> SwitchboardDevice -> Switchboard -> Revision a o spoj
+víc u koncového zařízení, proti jednomu spoji přes revision_id) a stejně
+tak načtení všech koncových zařízení jedné revize. Ověří, že oba způsoby
+vrací totéž a že revision_id všech řádků souhlasí s hierarchií; jinak
+skončí s kódem 1.
+
+    python benchmarks/ownership_checks.py --revisions 500 --lookups 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from generate import generate  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from sqlalchemy import func, select
+    import database
+    import models
+    from migrations import migrate
+    from models import Circuit, Revision, Switchboard, SwitchboardDevice, TerminalDevice
+
+    migrate()
+    data = generate(database.engine, models, revisions=args.revisions)
+    print(f"{data['rows']} rows, {len(data['circuits'])} circuits, {len(data['terminal_devices'])} terminal devices")
+
+    user_id = 1
+    queries = {
+        "circuit owner": (
+            data["circuits"],
+            lambda i: select(Circuit.circuit_id).join(SwitchboardDevice).join(Switchboard).join(Revision)
+            .where(Circuit.circuit_id == i, Revision.user_id == user_id),
+            lambda i: select(Circuit.circuit_id).join(Revision, Revision.revision_id == Circuit.revision_id)
+            .where(Circuit.circuit_id == i, Revision.user_id == user_id),
+        ),
+        "terminal device owner": (
+            data["terminal_devices"],
+            lambda i: select(TerminalDevice.terminal_device_id).join(Circuit).join(SwitchboardDevice)
+            .join(Switchboard).join(Revision)
+            .where(TerminalDevice.terminal_device_id == i, Revision.user_id == user_id),
+            lambda i: select(TerminalDevice.terminal_device_id)
+            .join(Revision, Revision.revision_id == TerminalDevice.revision_id)
+            .where(TerminalDevice.terminal_device_id == i, Revision.user_id == user_id),
+        ),
+        "revision terminal devices": (
+            data["revisions"],
+            lambda i: select(TerminalDevice.terminal_device_id).join(Circuit).join(SwitchboardDevice)
+            .join(Switchboard).where(Switchboard.revision_id == i).order_by(TerminalDevice.terminal_device_id),
+            lambda i: select(TerminalDevice.terminal_device_id)
+            .where(TerminalDevice.revision_id == i).order_by(TerminalDevice.terminal_device_id),
+        ),
+    }
+
+    rng = random.Random(1)
+    failed = False
+    # "orm" = přes SQLAlchemy Core jako v aplikaci, "db" = jen SQLite (DBAPI kurzor,
+    # předkompilovaný SQL) – rozdíl ve spojích bez režie Pythonu.
+    print(f"{'query':<28} {'joins µs':>17} {'revision_id µs':>17} {'speedup':>13}")
+    print(f"{'':<28} {'orm':>8} {'db':>8} {'orm':>8} {'db':>8} {'orm':>6} {'db':>6}")
+    with database.engine.connect() as conn:
+        cursor = conn.connection.dbapi_connection.cursor()
+        for name, (ids, joined, direct) in queries.items():
+            sample = [rng.choice(ids) for _ in range(args.lookups)]
+            timings = []
+            answers = []
+            for build in (joined, direct):
+                statements = [build(i) for i in sample]
+                conn.execute(statements[0]).all()
+                started = time.perf_counter()
+                answers.append([conn.execute(stmt).scalars().all() for stmt in statements])
+                timings.append((time.perf_counter() - started) / len(sample) * 1e6)
+
+                compiled = statements[0].compile(conn)
+                sql = str(compiled)
+                params = [[build(i).compile(conn).params[key] for key in compiled.positiontup] for i in sample]
+                started = time.perf_counter()
+                raw = [[row[0] for row in cursor.execute(sql, p).fetchall()] for p in params]
+                timings.append((time.perf_counter() - started) / len(sample) * 1e6)
+                failed = failed or raw != answers[-1]
+            same = answers[0] == answers[1]
+            failed = failed or not same
+            orm_joins, db_joins, orm_direct, db_direct = timings
+            print(f"{name:<28} {orm_joins:>8.1f} {db_joins:>8.1f} {orm_direct:>8.1f} {db_direct:>8.1f} "
+                  f"{orm_joins / orm_direct:>5.1f}x {db_joins / db_direct:>5.1f}x{'' if same else '  MISMATCH'}")
+        cursor.close()
+
+        mismatched = conn.scalar(
+            select(func.count()).select_from(TerminalDevice).join(Circuit).join(SwitchboardDevice).join(Switchboard)
+            .where(
+                (TerminalDevice.revision_id != Switchboard.revision_id)
+                | (Circuit.revision_id != Switchboard.revision_id)
+                | (SwitchboardDevice.revision_id != Switchboard.revision_id)
+            )
+        )
+        print(f"rows with revision_id out of sync: {mismatched}")
+        failed = failed or mismatched != 0
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Zápisy z detailu rozvaděče a obvodu: přesměrování na celou stránku vs.
+fragment se změněnými prvky (X-Fragment, viz wants_fragment v main.py).
+
+Vygeneruje jednu revizi s jedním velkým rozvaděčem (benchmarks/generate.py,
+--devices jističů) a pro každý zápis (nový přístroj pod chráničem, nový
+obvod, úprava obvodu z draweru, změna nadřazeného chrániče, měření obvodu,
+nové koncové zařízení, měření koncového zařízení) změří --requests
+opakování oběma způsoby: POST + GET stránky po přesměrování proti jedinému
+POST vracejícímu fragment. Vypíše ms, SQL příkazy a bajty odpovědi.
+
+Ověří, že každý prvek fragmentu (podle id) je stejný jako tentýž prvek
+nově vykreslené celé stránky; jinak skončí s kódem 1.
+
+    python benchmarks/partial_updates.py --devices 200 --requests 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from html.parser import HTMLParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from generate import generate  # noqa: E402
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+class ElementFinder(HTMLParser):
+    """Najde v HTML prvky podle id a vrátí jejich zdrojový text (včetně potomků)."""
+
+    def __init__(self, html):
+        super().__init__(convert_charrefs=False)
+        self.html = html
+        self.line_offsets = [0]
+        for line in html.splitlines(keepends=True):
+            self.line_offsets.append(self.line_offsets[-1] + len(line))
+        self.elements = {}
+        self.top_level = []
+        self.open = []  # [id nebo None, začátek]
+        self.feed(html)
+
+    def _offset(self):
+        line, column = self.getpos()
+        return self.line_offsets[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        element_id = dict(attrs).get("id")
+        start = self._offset()
+        if tag in VOID_TAGS:
+            end = start + len(self.get_starttag_text())
+            if element_id:
+                self.elements[element_id] = self.html[start:end]
+            if element_id and not self.open:
+                self.top_level.append(element_id)
+            return
+        self.open.append((element_id, start))
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS or not self.open:
+            return
+        element_id, start = self.open.pop()
+        if element_id:
+            end = self.html.index(">", self._offset()) + 1
+            self.elements[element_id] = self.html[start:end]
+            if not self.open:
+                self.top_level.append(element_id)
+
+
+def normalize(html):
+    return " ".join(html.split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, select
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    data = generate(database.engine, models, revisions=1, switchboards=1, rcds=4, devices=args.devices,
+                    circuits=2, terminals=4)
+    sb_id = data["switchboards"][0]
+    with database.engine.connect() as conn:
+        rcd_ids = conn.scalars(
+            select(models.SwitchboardDevice.device_id).where(
+                models.SwitchboardDevice.switchboard_id == sb_id,
+                models.SwitchboardDevice.switchboard_device_residual_current_ma.is_not(None),
+            )
+        ).all()
+        device_id, circuit_id = conn.execute(
+            select(models.Circuit.device_id, models.Circuit.circuit_id)
+            .join(models.SwitchboardDevice, models.SwitchboardDevice.device_id == models.Circuit.device_id)
+            .where(models.SwitchboardDevice.switchboard_id == sb_id)
+            .order_by(models.Circuit.circuit_id)
+        ).first()
+        td_id = conn.scalar(
+            select(models.TerminalDevice.terminal_device_id).where(models.TerminalDevice.circuit_id == circuit_id)
+        )
+
+    statements = []
+    for eng in (database.engine, database.async_engine.sync_engine):
+        event.listen(eng, "before_cursor_execute", lambda *_: statements.append(1))
+
+    switchboard_page = f"/switchboards/{sb_id}"
+    circuit_page = f"/circuits/{circuit_id}"
+    writes = {
+        "device create (child)": (switchboard_page, lambda i: (
+            f"/switchboards/{sb_id}/devices/create",
+            {"switchboard_device_position": f"F9{i}", "switchboard_device_type": "MCB",
+             "switchboard_device_rated_current": "16", "parent_device_id": str(rcd_ids[0])})),
+        "circuit create": (switchboard_page, lambda i: (
+            f"/devices/{device_id}/circuits/create", {"circuit_number": f"{i}.9", "circuit_room": "Půda"})),
+        "circuit edit (drawer)": (switchboard_page, lambda i: (
+            f"/circuits/{circuit_id}/edit", {"circuit_number": "1.1", "circuit_room": f"Sklep {i}"})),
+        "set parent": (switchboard_page, lambda i: (
+            f"/devices/{device_id}/set-parent", {"parent_device_id": str(rcd_ids[i % len(rcd_ids)])})),
+        "circuit measurements": (circuit_page, lambda i: (
+            f"/circuits/{circuit_id}/measurements/save",
+            {"measurements_circuit_continuity": f"0.{i + 10}", "measurements_circuit_order_of_phases": "L1L2L3"})),
+        "terminal device create": (circuit_page, lambda i: (
+            f"/circuits/{circuit_id}/terminal-devices/create",
+            {"terminal_device_type": "Zásuvka 230 V", "terminal_device_quantity": "2",
+             "terminal_device_cable": f"CYKY-J 3x{i % 3 + 1},5"})),
+        "terminal measurements": (circuit_page, lambda i: (
+            f"/terminal-devices/{td_id}/measurements/save",
+            {"measurements_circuit_loop_impedance_min": f"0.{i + 20}", "measurements_circuit_rcd_trip_time_ms": "18"})),
+    }
+
+    failed = False
+    print(f"{'write':<24} {'mode':<10} {'ms':>8} {'SQL':>6} {'bytes':>9}")
+    with TestClient(app_module.app) as client:
+        for name, (page, build) in writes.items():
+            for mode, headers in (("redirect", {}), ("fragment", {"X-Fragment": "1"})):
+                elapsed, queries, size = [], [], []
+                for i in range(args.requests):
+                    url, form = build(i if mode == "redirect" else i + args.requests)
+                    statements.clear()
+                    started = time.perf_counter()
+                    resp = client.post(url, data=form, headers=headers)
+                    elapsed.append((time.perf_counter() - started) * 1000)
+                    queries.append(len(statements))
+                    size.append(len(resp.content))
+                    expected = resp.status_code == 200 and (resp.headers.get("x-fragment") == "1") == (mode == "fragment")
+                    failed = failed or not expected
+                print(f"{name:<24} {mode:<10} {sorted(elapsed)[len(elapsed) // 2]:>8.2f} "
+                      f"{max(queries):>6} {max(size):>9}")
+
+            url, form = build(2 * args.requests)
+            fragment = ElementFinder(client.post(url, data=form, headers={"X-Fragment": "1"}).text)
+            full = ElementFinder(client.get(page).text).elements
+            mismatched = [element_id for element_id in fragment.top_level
+                          if normalize(fragment.elements[element_id]) != normalize(full.get(element_id, ""))]
+            ok = bool(fragment.top_level) and not mismatched
+            failed = failed or not ok
+            print(f"  {len(fragment.top_level)} elements {'match the full page' if ok else f'DIFFER: {mismatched}'}")
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Kontrola, že počet SQL dotazů na detailových stránkách nezávisí na velikosti dat.
+
+Do jedné databáze založí malou a velkou revizi, u každé stránky spočítá
+vykonané SQL příkazy a porovná je. Pokud velká revize potřebuje víc dotazů
+než malá (N+1 – líné načítání v šabloně nebo v route), skript skončí s kódem 1.
+
+    python benchmarks/query_counts.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import seed  # noqa: E402
+
+
+def pages(rev_id, sb_ids, circ_ids):
+    return {
+        "revisions_list": "/revisions",
+        "revision_detail": f"/revisions/{rev_id}",
+        "switchboard_detail": f"/switchboards/{sb_ids[0]}",
+        "circuit_detail": f"/circuits/{circ_ids[0]}",
+    }
+
+
+def main():
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    import database
+    import models
+    import main as app_module
+
+    database.Base.metadata.create_all(bind=database.engine)
+    small = pages(*seed(database.SessionLocal, models, switchboards=1, devices=1, circuits=1, terminals=1))
+    large = pages(*seed(database.SessionLocal, models, switchboards=5, devices=40, circuits=3, terminals=25))
+
+    statements = []
+
+    def count(*_):
+        statements.append(1)
+
+    for eng in (database.engine, database.async_engine.sync_engine):
+        event.listen(eng, "before_cursor_execute", count)
+
+    def measure(client, path):
+        client.get(path)  # zahřátí (cache uživatele apod.)
+        statements.clear()
+        resp = client.get(path)
+        assert resp.status_code == 200, (path, resp.status_code)
+        return len(statements)
+
+    failed = False
+    with TestClient(app_module.app) as client:
+        print(f"{'page':<20} {'small':>6} {'large':>6}")
+        for name in small:
+            n_small = measure(client, small[name])
+            n_large = measure(client, large[name])
+            flag = "" if n_small == n_large else "  <-- roste s daty"
+            failed = failed or n_small != n_large
+            print(f"{name:<20} {n_small:>6} {n_large:>6}{flag}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
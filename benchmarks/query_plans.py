@@ -0,0 +1,140 @@
+"""
+Kontrola plánů dotazů – žádný hot dotaz nesmí procházet celou tabulku.
+
+Proti dočasné SQLite databázi projde detailové stránky, zápisové routy
+(ukládání měření, zakládání a mazání včetně kaskád) a synchronizaci tabletu
+(delta_sync.py – stažení změn, odeslání s konfliktem) s LIVE_BACKEND=database
+a dotazy, kterými workery čtou live_events (live.py), zachytí všechny vykonané
+SELECT/UPDATE/DELETE příkazy a pro každý spustí EXPLAIN QUERY PLAN. Pokud se
+v plánu objeví sekvenční průchod tabulkou (SCAN <tabulka> bez indexu), vypíše
+dotaz a skončí s kódem 1.
+
+    python benchmarks/query_plans.py [-v]
+"""
+import os
+import re
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import seed  # noqa: E402
+
+# "SCAN revisions" = průchod celou tabulkou; "SCAN x USING INDEX ..." je průchod
+# indexem (řazení bez filtru) a "SEARCH ..." je vyhledání v indexu – obojí je v pořádku.
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def drive(client, rev_id, sb_ids, circ_ids, db, models):
+    td = db.query(models.TerminalDevice).filter_by(circuit_id=circ_ids[0]).first()
+    dev = db.query(models.SwitchboardDevice).filter_by(switchboard_id=sb_ids[0]).first()
+    requests = [
+        ("get", "/revisions", None),
+        ("get", "/api/revisions?limit=1", None),
+        ("get", f"/revisions/{rev_id}", None),
+        ("get", f"/switchboards/{sb_ids[0]}", None),
+        ("get", f"/circuits/{circ_ids[0]}", None),
+        ("post", f"/switchboards/{sb_ids[0]}/measurements/save", {}),
+        ("post", f"/circuits/{circ_ids[0]}/measurements/save", {}),
+        ("post", f"/circuits/{circ_ids[0]}/terminal-devices/create", {"terminal_device_quantity": "1"}),
+        ("post", f"/terminal-devices/{td.terminal_device_id}/measurements/save", {"measurements_circuit_loop_impedance_min": "0.3"}),
+        ("fragment", f"/devices/{dev.device_id}/circuits/create", {"circuit_number": "10"}),
+        ("fragment", f"/circuits/{circ_ids[0]}/terminal-devices/create", {"terminal_device_cable": "CYKY-J 3x1,5"}),
+        ("fragment", f"/terminal-devices/{td.terminal_device_id}/measurements/save", {"measurements_circuit_loop_impedance_min": "0.4"}),
+        ("get", f"/revisions/{rev_id}/sync?cursor=0", None),
+        ("json", f"/revisions/{rev_id}/sync", {"changes": [
+            {"op": "update", "entity": "circuit", "id": circ_ids[0], "version": 1, "data": {"circuit_room": "Sklep"}},
+            {"op": "update", "entity": "circuit_measurement", "id": circ_ids[0], "version": 10 ** 6,
+             "data": {"measurements_circuit_continuity": 0.2}},
+            {"op": "delete", "entity": "terminal_device", "id": td.terminal_device_id, "version": 10 ** 6},
+        ]}),
+        ("get", f"/revisions/{rev_id}/sync?cursor=1", None),
+        ("post", f"/terminal-devices/{td.terminal_device_id}/delete", {}),
+        ("post", f"/switchboards/{sb_ids[0]}/devices/create", {"switchboard_device_position": "Q1"}),
+        ("post", f"/devices/{dev.device_id}/circuits/create", {"circuit_number": "9"}),
+        ("post", f"/devices/{dev.device_id}/set-parent", {"parent_device_id": ""}),
+        ("get", f"/switchboards/{sb_ids[0]}", None),
+        ("post", f"/circuits/{circ_ids[-1]}/delete", {}),
+        ("post", f"/devices/{dev.device_id}/delete", {}),
+        ("post", f"/switchboards/{sb_ids[-1]}/delete", {}),
+        ("post", f"/revisions/{rev_id}/delete", {}),
+    ]
+    for method, path, data in requests:
+        if method == "get":
+            resp = client.get(path)
+        elif method == "json":
+            resp = client.post(path, json=data)
+        elif method == "fragment":
+            resp = client.post(path, data=data, headers={"X-Fragment": "1"})
+        else:
+            resp = client.post(path, data=data, follow_redirects=False)
+        assert resp.status_code in (200, 303), (path, resp.status_code)
+
+
+def main():
+    verbose = "-v" in sys.argv
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    # zápisy do live_events a doplnění revize změn (live.py) běží jen s tímto backendem
+    os.environ.setdefault("LIVE_BACKEND", "database")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    import database
+    import live
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    # i s triggery – revision_id přístrojů a obvodů, sync_log (delta_sync.py)
+    migrate()
+    rev_id, sb_ids, circ_ids = seed(database.SessionLocal, models)
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            return
+        captured.append((statement, parameters))
+
+    with TestClient(app_module.app) as client:
+        for eng in (database.engine, database.async_engine.sync_engine):
+            event.listen(eng, "before_cursor_execute", capture)
+        db = database.SessionLocal()
+        try:
+            drive(client, rev_id, sb_ids, circ_ids, db, models)
+        finally:
+            db.close()
+        # dotazy workeru, který rozesílá zprávy z live_events
+        with database.engine.begin() as conn:
+            conn.execute(live.poll_query(0))
+            conn.execute(live.prune_query(0))
+        for eng in (database.engine, database.async_engine.sync_engine):
+            event.remove(eng, "before_cursor_execute", capture)
+
+    failures = []
+    seen = set()
+    with database.engine.connect() as conn:
+        raw = conn.connection.driver_connection
+        for statement, parameters in captured:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            plan = [row[3] for row in raw.execute("EXPLAIN QUERY PLAN " + statement, parameters)]
+            scans = [step for step in plan if FULL_SCAN.match(step)]
+            if scans:
+                failures.append((statement, plan))
+            if verbose or scans:
+                print(("FAIL " if scans else "ok   ") + " ".join(statement.split())[:160])
+                for step in plan:
+                    print("       " + step)
+
+    print(f"{len(seen)} distinct statements checked, {len(failures)} with a full table scan")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Kontrola a režie měření požadavků (metrics.py).
+
+Spustí sám sebe dvakrát v podprocesu – s METRICS_ENABLED=0 a =1 – a v každém
+projde --rounds krát detail revize, rozvaděče a obvodu. Porovná propustnost
+(režie zapnutého měření) a v zapnutém běhu ověří, že /metrics vrací
+Prometheus text se šablonami route, že počty SQL příkazů sedí s nezávislým
+počítadlem, že se měří i vykreslení fragmentu (makra přes template.module)
+a že pomalý požadavek (METRICS_SLOW_MS=0 pro jednu route)
+zaloguje nejdražší dotazy. Při chybě skončí s kódem 1.
+
+    python benchmarks/request_metrics.py --rounds 300
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import seed  # noqa: E402
+
+SAMPLE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? [0-9.e+-]+$')
+
+
+def child(rounds):
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    import database
+    import metrics
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    rev_id, sb_ids, circ_ids = seed(database.SessionLocal, models)
+    paths = [f"/revisions/{rev_id}", f"/switchboards/{sb_ids[0]}", f"/circuits/{circ_ids[0]}"]
+    result = {"enabled": metrics.METRICS_ENABLED}
+
+    with TestClient(app_module.app) as client:
+        for path in paths:
+            client.get(path)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for path in paths:
+                client.get(path)
+        result["req_per_s"] = rounds * len(paths) / (time.perf_counter() - started)
+
+        if metrics.METRICS_ENABLED:
+            statements = []
+            event.listen(database.async_engine.sync_engine, "before_cursor_execute",
+                         lambda *_: statements.append(1))
+            before = metrics.registry.statements["/switchboards/{switchboard_id}"].sum
+            client.get(paths[1])
+            result["render_recorded"] = metrics.registry.render["/switchboards/{switchboard_id}"].sum > 0
+            result["statements_match"] = \
+                metrics.registry.statements["/switchboards/{switchboard_id}"].sum - before == len(statements)
+            # fragment se vykresluje makry přes get_template().module, ne TemplateResponse
+            client.post(f"/circuits/{circ_ids[0]}/measurements/save",
+                        data={"measurements_circuit_continuity": "0.1"}, headers={"X-Fragment": "1"})
+            fragment_render = metrics.registry.render.get("/circuits/{circuit_id}/measurements/save")
+            result["fragment_render_recorded"] = fragment_render is not None and fragment_render.sum > 0
+
+            records = []
+            handler = logging.Handler()
+            handler.emit = records.append
+            metrics.logger.addHandler(handler)
+            metrics.METRICS_SLOW_MS = 0
+            client.get(paths[2])
+            metrics.METRICS_SLOW_MS = 10 ** 9
+            message = records[0].getMessage() if records else ""
+            result["slow_log"] = message.splitlines()[:3]
+            result["slow_log_ok"] = "/circuits/{circuit_id}" in message and "SELECT" in message
+
+            client.get("/revisions/999999/nonexistent-page")
+            body = client.get("/metrics").text
+            lines = [line for line in body.splitlines() if line and not line.startswith("#")]
+            result["format_ok"] = all(SAMPLE.match(line) for line in lines)
+            result["routes"] = sorted({m for m in re.findall(r'route="([^"]+)"', body)})
+            result["sample"] = [line for line in lines if "/switchboards/{switchboard_id}" in line
+                                and ("_count" in line or "quantile" in line)][:6]
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=300)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.rounds)
+        return
+
+    results = {}
+    for enabled in ("0", "1"):
+        env = dict(os.environ, METRICS_ENABLED=enabled, METRICS_SLOW_MS="1000000000")
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--rounds", str(args.rounds)],
+                             env=env, capture_output=True, text=True, check=True).stdout
+        results[enabled] = json.loads(out.strip().splitlines()[-1])
+
+    off, on = results["0"], results["1"]
+    overhead = (off["req_per_s"] / on["req_per_s"] - 1) * 100
+    print(f"metrics off: {off['req_per_s']:.0f} req/s, on: {on['req_per_s']:.0f} req/s ({overhead:+.1f} % time)")
+    print("routes:", ", ".join(on["routes"]))
+    for line in on["sample"]:
+        print(" ", line)
+    print("slow request log:")
+    for line in on["slow_log"]:
+        print(" ", line)
+    checks = {
+        "prometheus format": on["format_ok"],
+        "route templates": "/switchboards/{switchboard_id}" in on["routes"] and "unmatched" in on["routes"],
+        "statement count": on["statements_match"],
+        "render time": on["render_recorded"],
+        "fragment render time": on["fragment_render_recorded"],
+        "slow request log": on["slow_log_ok"],
+    }
+    failed = False
+    for name, ok in checks.items():
+        print(f"{name:<20} {'ok' if ok else 'FAILED'}")
+        failed = failed or not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
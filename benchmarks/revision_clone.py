@@ -0,0 +1,237 @@
+"""
+Benchmark kopie revize (cloning.py) proti naivní kopii po ORM objektech.
+
+Naplní revizi o --switchboards × --devices přístrojích × --circuits obvodech
+× --terminals koncových zařízeních (výchozí ~5 500 uzlů) s měřeními na všech
+úrovních; polovina přístrojů má nadřazený chránič s vyšším ID. Revizi
+zkopíruje naivně (db.add po objektech, flush kvůli ID) a přes
+POST /revisions/{id}/clone s měřeními i bez nich. Vypíše čas, počet SQL
+příkazů a commitů a ověří, že kopie má stejný strom včetně vazeb
+parent_device_id a v sync_log právě jeden záznam na každý řádek – stejně
+jako kopie zapsaná přes triggery (jinak kód 1).
+
+    python benchmarks/revision_clone.py --devices 100 --terminals 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import seed  # noqa: E402
+
+
+def add_links_and_measurements(db, models, revision_id):
+    """Nadřazené chrániče (poslední přístroj rozvaděče) a měření na všech úrovních."""
+    from sqlalchemy import select
+
+    for sb in db.scalars(select(models.Switchboard).where(models.Switchboard.revision_id == revision_id)):
+        devices = sorted(sb.devices, key=lambda d: d.device_id)
+        rcd = devices[-1]
+        rcd.switchboard_device_type = "RCD"
+        for dev in devices[: len(devices) // 2]:
+            dev.parent_device_id = rcd.device_id
+        sb.measurements = models.SwitchboardMeasurement(measurements_switchboard_earth_resistance=1.5)
+        for n, dev in enumerate(devices):
+            for circuit in dev.circuits:
+                circuit.measurements = models.CircuitMeasurement(measurements_circuit_continuity=0.1 + n % 5 / 10)
+                for k, td in enumerate(circuit.terminal_devices):
+                    td.measurements = models.TerminalMeasurement(
+                        measurements_circuit_loop_impedance_max=0.5 + k / 10
+                    )
+    db.commit()
+
+
+def tree(db, models, revision_id):
+    """Strom revize bez ID – rozvaděče, přístroje s pozicí nadřazeného, obvody, zařízení, měření."""
+    from sqlalchemy import select
+
+    def values(obj):
+        if obj is None:
+            return None
+        return tuple(getattr(obj, c.key) for c in obj.__table__.columns if c.key.startswith("measurements_"))
+
+    result = []
+    for sb in db.scalars(
+        select(models.Switchboard)
+        .where(models.Switchboard.revision_id == revision_id)
+        .order_by(models.Switchboard.switchboard_order)
+    ):
+        devices = []
+        for dev in sorted(sb.devices, key=lambda d: d.switchboard_device_position):
+            parent = dev.parent_device
+            if parent is not None and parent.switchboard_id != sb.switchboard_id:
+                parent = "jiný rozvaděč"
+            circuits = [
+                (c.circuit_number, values(c.measurements),
+                 sorted((t.terminal_device_type, values(t.measurements)) for t in c.terminal_devices))
+                for c in sorted(dev.circuits, key=lambda c: c.circuit_number)
+            ]
+            devices.append((dev.switchboard_device_position, getattr(parent, "switchboard_device_position", parent),
+                            circuits))
+        result.append((sb.switchboard_name, values(sb.measurements), devices))
+    return result
+
+
+def strip_measurements(items):
+    """Očekávaný strom kopie bez měření: prázdné měření rozvaděče, ostatní žádné."""
+    empty_sb = None
+    result = []
+    for name, sb_values, devices in items:
+        empty_sb = tuple(None for _ in sb_values) if sb_values else sb_values
+        result.append((name, empty_sb, [
+            (pos, parent, [(num, None, sorted((t, None) for t, _ in tds)) for num, _, tds in circuits])
+            for pos, parent, circuits in devices
+        ]))
+    return result
+
+
+def sync_log_counts(db, models, revision_id):
+    """Počty záznamů sync_log revize po entitách; None, pokud záznam nemá řádek v tabulce."""
+    from sqlalchemy import func, select
+    import delta_sync
+
+    counts = dict(db.execute(
+        select(models.SyncLog.entity, func.count())
+        .where(models.SyncLog.revision_id == revision_id, models.SyncLog.deleted.is_(False))
+        .group_by(models.SyncLog.entity)
+    ).all())
+    for entity, (model, key) in delta_sync.ENTITIES.items():
+        logged = select(models.SyncLog.entity_id).where(
+            models.SyncLog.entity == entity, models.SyncLog.revision_id == revision_id)
+        rows = db.scalar(select(func.count()).select_from(model).where(model.__table__.c[key].in_(logged)))
+        if rows != counts.get(entity, 0):
+            return None
+    return counts
+
+
+def naive_clone(db, models, revision_id):
+    """Kopie po ORM objektech tak, jak by vypadala bez cloning.py."""
+    from sqlalchemy.orm import undefer_group
+
+    src = db.get(models.Revision, revision_id, options=[undefer_group("texts")])
+
+    def copy(obj, **overrides):
+        data = {c.key: getattr(obj, c.key) for c in obj.__table__.columns if not c.primary_key}
+        data.update(overrides)
+        return type(obj)(**data)
+
+    rev = copy(src, revision_name=f"{src.revision_name} (kopie)")
+    db.add(rev)
+    db.flush()
+    for sb in src.switchboards:
+        new_sb = copy(sb, revision_id=rev.revision_id)
+        db.add(new_sb)
+        db.flush()
+        if sb.measurements is not None:
+            db.add(copy(sb.measurements, switchboard_id=new_sb.switchboard_id))
+        mapping = {}
+        for dev in sb.devices:
+            new_dev = copy(dev, switchboard_id=new_sb.switchboard_id, revision_id=rev.revision_id,
+                           parent_device_id=None)
+            db.add(new_dev)
+            db.flush()
+            mapping[dev.device_id] = new_dev
+            for circuit in dev.circuits:
+                new_circuit = copy(circuit, device_id=new_dev.device_id, revision_id=rev.revision_id)
+                db.add(new_circuit)
+                db.flush()
+                if circuit.measurements is not None:
+                    db.add(copy(circuit.measurements, circuit_id=new_circuit.circuit_id))
+                for td in circuit.terminal_devices:
+                    new_td = copy(td, circuit_id=new_circuit.circuit_id, revision_id=rev.revision_id)
+                    db.add(new_td)
+                    db.flush()
+                    if td.measurements is not None:
+                        db.add(copy(td.measurements, terminal_device_id=new_td.terminal_device_id))
+        for dev in sb.devices:
+            if dev.parent_device_id in mapping:
+                mapping[dev.device_id].parent_device_id = mapping[dev.parent_device_id].device_id
+    db.commit()
+    return rev.revision_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--switchboards", type=int, default=5)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--circuits", type=int, default=2)
+    parser.add_argument("--terminals", type=int, default=4)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    rev_id, _, _ = seed(database.SessionLocal, models, switchboards=args.switchboards, devices=args.devices,
+                        circuits=args.circuits, terminals=args.terminals)
+    with database.SessionLocal() as db:
+        add_links_and_measurements(db, models, rev_id)
+        source = tree(db, models, rev_id)
+    nodes = args.switchboards * (1 + args.devices * (1 + args.circuits * (1 + args.terminals)))
+    print(f"revision {rev_id}: {nodes} nodes")
+
+    counts = []
+    for eng in (database.engine, database.async_engine.sync_engine):
+        event.listen(eng, "before_cursor_execute", lambda *_: counts.append("SQL"))
+        event.listen(eng, "commit", lambda *_: counts.append("COMMIT"))
+
+    results = []
+    failed = False
+    with TestClient(app_module.app) as client:
+        client.get("/revisions")
+
+        counts.clear()
+        started = time.perf_counter()
+        with database.SessionLocal() as db:
+            naive_id = naive_clone(db, models, rev_id)
+        results.append(("naive ORM", naive_id, True, time.perf_counter() - started, list(counts)))
+
+        for with_measurements in (True, False):
+            counts.clear()
+            started = time.perf_counter()
+            resp = client.post(f"/revisions/{rev_id}/clone",
+                               data={"with_measurements": str(with_measurements).lower()},
+                               follow_redirects=False)
+            elapsed = time.perf_counter() - started
+            assert resp.status_code == 303, resp.status_code
+            new_id = int(resp.headers["location"].rsplit("/", 1)[1])
+            label = "clone" if with_measurements else "clone, no meas."
+            results.append((label, new_id, with_measurements, elapsed, list(counts)))
+
+    print(f"{'mode':<16} {'ms':>9} {'sql':>6} {'commits':>8}  tree")
+    with database.SessionLocal() as db:
+        naive_id = results[0][1]
+        for label, new_id, with_measurements, elapsed, events in results:
+            copied = tree(db, models, new_id)
+            expected = source if with_measurements else strip_measurements(source)
+            same = copied == expected and new_id != rev_id
+            # kopie přes ORM zapisuje sync_log triggery – stejné počty po entitách
+            logged = sync_log_counts(db, models, new_id)
+            expected_log = sync_log_counts(db, models, naive_id)
+            if not with_measurements:
+                expected_log.pop("circuit_measurement", None)
+                expected_log.pop("terminal_measurement", None)
+            same = same and logged == expected_log
+            failed = failed or not same
+            print(f"{label:<16} {elapsed * 1000:>9.1f} {events.count('SQL'):>6} {events.count('COMMIT'):>8}  "
+                  f"{'ok' if same else 'MISMATCH'}")
+        failed = failed or tree(db, models, rev_id) != source
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
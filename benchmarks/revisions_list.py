@@ -0,0 +1,125 @@
+"""
+Benchmark seznamu revizí: původní načtení všech revizí se všemi sloupci
+proti keyset stránkování (pagination.py) s projekcí sloupců.
+
+Vloží --revisions revizí s dlouhými textovými poli. Změří dotaz původního
+seznamu (select(Revision) .all()), první a hlubokou stránku HTML i JSON
+API a ověří, že průchod přes kurzory vrátí každou revizi právě jednou
+v sestupném pořadí i když mezitím přibudou nové, a že neplatný kurzor
+vrátí 400. Při chybě skončí s kódem 1.
+
+    python benchmarks/revisions_list.py --revisions 10000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+def timed(fn, repeat=5):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=10000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert, select
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+    from pagination import encode_cursor
+
+    migrate()
+    text = "Zjištěné závady a doporučení. " * 200
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.User), [{"user_id": 1, "username": "demo", "email": "demo@example.com",
+                                            "password_hash": "x"}])
+        conn.execute(insert(models.Revision), [
+            {"user_id": 1, "revision_name": f"Revize {n}", "revision_code": f"R-{n}",
+             "revision_address": f"Ulice {n}", "revision_description": text,
+             "revision_overall_assessment": text, "revision_project_documentation": text}
+            for n in range(args.revisions)
+        ])
+
+    def old_list():
+        # původní revisions_list: všechny revize, všechny sloupce
+        with database.SessionLocal() as db:
+            return db.execute(
+                select(models.Revision.__table__).where(models.Revision.user_id == 1)
+                .order_by(models.Revision.revision_id.desc())
+            ).all()
+
+    failed = False
+    with TestClient(app_module.app) as client:
+        client.get("/revisions")
+        _, old_ms = timed(old_list)
+
+        first, first_ms = timed(lambda: client.get("/api/revisions").json())
+        # hluboká stránka: kurzor z konce seznamu
+        deep_cursor = encode_cursor(100)
+        _, deep_ms = timed(lambda: client.get("/api/revisions", params={"cursor": deep_cursor}).json())
+        html, html_ms = timed(lambda: client.get("/revisions"))
+
+        print(f"{args.revisions} revisions")
+        print(f"{'query':<28} {'ms':>8}")
+        print(f"{'old list (all, all columns)':<28} {old_ms:>8.1f}")
+        print(f"{'API first page':<28} {first_ms:>8.1f}")
+        print(f"{'API page near the end':<28} {deep_ms:>8.1f}")
+        print(f"{'HTML first page':<28} {html_ms:>8.1f}")
+        failed = failed or html.status_code != 200 or "cursor=" not in html.text
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            body = client.get("/api/revisions", params={"cursor": cursor, "limit": 200} if cursor else {"limit": 200}).json()
+            seen.extend(item["revision_id"] for item in body["items"])
+            pages += 1
+            if pages == 3:
+                client.post("/revisions/create", data={"revision_name": "Během procházení"}, follow_redirects=False)
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+        with database.SessionLocal() as db:
+            expected = db.scalars(
+                select(models.Revision.revision_id)
+                .where(models.Revision.user_id == 1, models.Revision.revision_id <= seen[0])
+                .order_by(models.Revision.revision_id.desc())
+            ).all()
+        walk_ok = seen == expected and len(set(seen)) == len(seen)
+        columns_ok = set(first["items"][0]) == {"revision_id", "revision_name", "revision_code", "revision_address"}
+        bad = client.get("/api/revisions", params={"cursor": "xyz"})
+        print(f"cursor walk: {pages} pages, {len(seen)} revisions, {'ok' if walk_ok else 'FAILED'}")
+        print(f"projected columns: {'ok' if columns_ok else 'FAILED'}")
+        print(f"invalid cursor: {bad.status_code}")
+        failed = failed or not walk_ok or not columns_ok or bad.status_code != 400
+
+        detail = client.get(f"/revisions/{seen[0]}")
+        edit = client.get(f"/revisions/{seen[0]}/edit")
+        failed = failed or detail.status_code != 200 or edit.status_code != 200
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
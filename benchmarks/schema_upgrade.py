@@ -0,0 +1,147 @@
+"""
+Kontrola migrací: čerstvá databáze proti databázi z doby před migracemi.
+
+Založí dvě dočasné SQLite databáze. První zmigruje od nuly, do druhé
+nejdřív zapíše schéma a malou revizi podle baseline_schema.py (stav před
+zavedením migrací, bez schema_version) a pak ji zmigruje. Ověří, že obě
+skončí se stejnými tabulkami, sloupci, indexy a triggery, že upgrade doplnil
+odvozená data (revision_id, verze, sync_log, fulltext) a že druhé spuštění
+migrací nic nedělá. Jinak skončí s kódem 1.
+
+    python benchmarks/schema_upgrade.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+def schema(engine):
+    """Tabulky se sloupci, indexy a cizími klíči a názvy triggerů."""
+    from sqlalchemy import inspect, text
+
+    insp = inspect(engine)
+    result = {}
+    for table in insp.get_table_names():
+        result[table] = (
+            sorted((c["name"], str(c["type"]), c["nullable"]) for c in insp.get_columns(table)),
+            sorted((i["name"], tuple(i["column_names"]), bool(i["unique"])) for i in insp.get_indexes(table)),
+            sorted((tuple(f["constrained_columns"]), f["referred_table"]) for f in insp.get_foreign_keys(table)),
+        )
+    with engine.connect() as conn:
+        result["triggers"] = sorted(conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")))
+    return result
+
+
+def seed_baseline(engine):
+    """Schéma a data tak, jak je zapisovala aplikace před migracemi."""
+    from sqlalchemy import insert
+    import baseline_schema
+
+    baseline_schema.metadata.create_all(engine)
+    t = baseline_schema.metadata.tables
+    with engine.begin() as conn:
+        conn.execute(insert(t["users"]).values(user_id=1, username="u", email="u@example.com", password_hash="x"))
+        conn.execute(insert(t["revisions"]).values(revision_id=1, user_id=1, revision_name="Bytový dům"))
+        conn.execute(insert(t["switchboards"]).values(switchboard_id=1, revision_id=1, switchboard_name="RH"))
+        conn.execute(insert(t["switchboard_measurements"]).values(switchboard_id=1))
+        conn.execute(insert(t["switchboard_devices"]).values(device_id=1, switchboard_id=1, switchboard_device_type="RCD"))
+        conn.execute(insert(t["switchboard_devices"]).values(
+            device_id=2, switchboard_id=1, parent_device_id=1, switchboard_device_type="Jistič"))
+        conn.execute(insert(t["circuits"]).values(circuit_id=1, device_id=2, circuit_room="Kotelna"))
+        conn.execute(insert(t["circuit_measurements"]).values(circuit_id=1))
+        conn.execute(insert(t["terminal_devices"]).values(terminal_device_id=1, circuit_id=1, terminal_device_type="Zásuvka"))
+        conn.execute(insert(t["terminal_measurements"]).values(terminal_device_id=1))
+
+
+async def search_hits(path, query):
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    import search
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with AsyncSession(engine) as db:
+        hits = await search.search(db, 1, query)
+    await engine.dispose()
+    return len(hits)
+
+
+def main():
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/app.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from sqlalchemy import create_engine, event, func, select, text
+    import models
+    from migrations import LATEST_VERSION, current_version, migrate
+
+    failed = []
+
+    def check(label, ok):
+        if not ok:
+            failed.append(label)
+        print(f"  {label:<58} {'ok' if ok else 'FAIL'}")
+
+    fresh = create_engine(f"sqlite:///{tmpdir}/fresh.db")
+    started = time.perf_counter()
+    migrate(fresh)
+    print(f"fresh database migrated in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    upgraded_path = f"{tmpdir}/upgraded.db"
+    upgraded = create_engine(f"sqlite:///{upgraded_path}")
+    seed_baseline(upgraded)
+    started = time.perf_counter()
+    try:
+        migrate(upgraded)
+        print(f"baseline database upgraded in {(time.perf_counter() - started) * 1000:.0f} ms")
+    except Exception as exc:  # noqa: BLE001 – vypíše se jako neúspěšná kontrola
+        print(f"upgrade failed: {exc}")
+        check("baseline database upgrades", False)
+        sys.exit(1)
+
+    with upgraded.connect() as conn:
+        check("upgraded to the latest version", current_version(conn) == LATEST_VERSION)
+    expected, actual = schema(fresh), schema(upgraded)
+    check("same tables", set(expected) == set(actual))
+    for table in sorted(set(expected) & set(actual)):
+        if expected[table] != actual[table]:
+            check(f"same schema of {table}", False)
+    check("same columns, indexes, foreign keys and triggers", expected == actual)
+
+    with upgraded.connect() as conn:
+        revision_ids = [
+            conn.scalar(select(func.count()).select_from(model).where(model.revision_id == 1))
+            for model in (models.SwitchboardDevice, models.Circuit, models.TerminalDevice)
+        ]
+        check("revision_id backfilled on devices, circuits, terminals", revision_ids == [2, 1, 1])
+        check("revision version row created",
+              conn.scalar(select(models.RevisionVersion.version).where(models.RevisionVersion.revision_id == 1)) is not None)
+        check("switchboard version row created",
+              conn.scalar(select(models.SwitchboardVersion.version).where(models.SwitchboardVersion.switchboard_id == 1))
+              is not None)
+        check("sync log backfilled for every record",
+              conn.scalar(select(func.count()).select_from(models.SyncLog).where(models.SyncLog.revision_id == 1)) == 9)
+    check("existing rows are searchable", asyncio.run(search_hits(upgraded_path, "kotelna")) == 1)
+
+    statements = []
+    event.listen(upgraded, "before_cursor_execute", lambda *_: statements.append(1))
+    migrate(upgraded)
+    check(f"second run is a no-op ({len(statements)} statement)", len(statements) == 1)
+
+    with upgraded.begin() as conn:
+        conn.execute(text("INSERT INTO circuits (circuit_id, device_id, circuit_room) VALUES (2, 2, 'Sklep')"))
+        check("triggers fill revision_id on new rows",
+              conn.scalar(select(models.Circuit.revision_id).where(models.Circuit.circuit_id == 2)) == 1)
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark SQLite profilu: smíšené čtení a zápisy při rollback journalu vs. WAL.
+
+Každý režim běží v samostatném procesu (pragmy se nastavují při připojení
+podle SQLITE_JOURNAL_MODE / SQLITE_SYNCHRONOUS). Zátěž: souběžné GET detailu
+rozvaděče a každý --write-every-tý požadavek uloží měření rozvaděče (POST).
+
+    python benchmarks/sqlite_profile.py --concurrency 10 --requests 600
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import percentile, seed  # noqa: E402
+
+PROFILES = {
+    "rollback journal": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_MMAP_SIZE": "0"},
+    "WAL profile": {},
+}
+
+
+async def mixed_load(app, sb_ids, concurrency, total, write_every):
+    import httpx
+
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker(client):
+        nonlocal errors
+        for i in remaining:
+            sb_id = sb_ids[i % len(sb_ids)]
+            start = time.perf_counter()
+            if i % write_every == 0:
+                resp = await client.post(
+                    f"/switchboards/{sb_id}/measurements/save",
+                    data={"measurements_switchboard_insulation_resistance": str(i)},
+                )
+            else:
+                resp = await client.get(f"/switchboards/{sb_id}")
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code >= 400:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async with app.router.lifespan_context(app):
+            # Řádky měření založíme předem: první uložení je read-then-insert
+            # a souběžné první zápisy by kolidovaly na unikátním klíči.
+            for sb_id in sb_ids:
+                await client.post(f"/switchboards/{sb_id}/measurements/save", data={})
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    return latencies, elapsed, errors
+
+
+def child(args):
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    _, sb_ids, _ = seed(database.SessionLocal, models, switchboards=4, devices=20)
+    latencies, elapsed, errors = asyncio.run(
+        mixed_load(app_module.app, sb_ids, args.concurrency, args.requests, args.write_every)
+    )
+    ms = [v * 1000 for v in latencies]
+    print(
+        f"throughput={len(ms) / elapsed:.1f} req/s p50={percentile(ms, 50):.1f} "
+        f"p99={percentile(ms, 99):.1f} ms errors={errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--write-every", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    for name, overrides in PROFILES.items():
+        env = dict(os.environ, **overrides)
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", "--concurrency", str(args.concurrency),
+             "--requests", str(args.requests), "--write-every", str(args.write_every)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        print(f"{name:18} {out}")
+
+
+if __name__ == "__main__":
+    main()
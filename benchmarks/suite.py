@@ -0,0 +1,260 @@
+"""
+Benchmark hlavních stránek a ukládacích endpointů nad syntetickými daty.
+
+Vygeneruje (benchmarks/generate.py) do dočasné SQLite databáze --revisions
+revizí, každou s --switchboards rozvaděči (hlavní vypínač -> chrániče ->
+jističe -> obvody -> koncová zařízení, vše s měřeními), a přes TestClient
+volá skutečnou aplikaci: seznam revizí, detail revize, rozvaděče a obvodu
+a ukládací endpointy (měření rozvaděče, obvodu a koncového zařízení,
+úprava obvodu, hromadná měření). Pro každý scénář vypíše p50/p95/p99
+latence a počet SQL příkazů na požadavek.
+
+Výsledek se uloží jako JSON do benchmarks/results/ (nebo --output). S
+--baseline se porovná s dřívějším výsledkem: regrese je víc SQL příkazů
+na požadavek, nebo p95 horší o víc než --tolerance (a zároveň o víc než
+--min-delta-ms). Při regresi nebo chybné odpovědi skončí s kódem 1.
+
+    python benchmarks/suite.py --revisions 200 --requests 100
+    python benchmarks/suite.py --baseline benchmarks/results/<soubor>.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from generate import generate  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, p):
+    """Percentil metodou nejbližšího pořadí (values seřazené)."""
+    index = max(0, min(len(values) - 1, -(-p * len(values) // 100) - 1))
+    return values[index]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenarios(client, data, board):
+    """název -> (funkce(i) vracející odpověď, očekávané stavy)."""
+    revisions, switchboards = data["revisions"], data["switchboards"]
+    circuits, terminals = data["circuits"], data["terminal_devices"]
+
+    def pick(ids, i):
+        # procházíme rozprostřeně celou databází, ne jen první záznamy
+        return ids[i * 7919 % len(ids)]
+
+    def bulk(i):
+        sb_id = pick(switchboards, i)
+        circuit_ids, terminal_ids = board(sb_id)
+        return client.post(f"/switchboards/{sb_id}/measurements/bulk", json={
+            "circuits": [{"circuit_id": c, "measurements_circuit_continuity": round(0.1 + (c + i) % 4 * 0.05, 2)}
+                         for c in circuit_ids],
+            "terminal_devices": [{"terminal_device_id": t,
+                                  "measurements_circuit_loop_impedance_min": round(0.2 + (t + i) % 7 * 0.05, 2)}
+                                 for t in terminal_ids],
+        })
+
+    return {
+        "revisions_list": (lambda i: client.get("/revisions"), (200,)),
+        "revision_detail": (lambda i: client.get(f"/revisions/{pick(revisions, i)}"), (200,)),
+        "switchboard_detail": (lambda i: client.get(f"/switchboards/{pick(switchboards, i)}"), (200,)),
+        "circuit_detail": (lambda i: client.get(f"/circuits/{pick(circuits, i)}"), (200,)),
+        "switchboard_measurements_save": (lambda i: client.post(
+            f"/switchboards/{pick(switchboards, i)}/measurements/save",
+            data={"measurements_switchboard_insulation_resistance": str(100 + i % 50),
+                  "measurements_switchboard_earth_resistance": str(round(1 + i % 5 * 0.5, 1))},
+            follow_redirects=False), (303,)),
+        "circuit_measurements_save": (lambda i: client.post(
+            f"/circuits/{pick(circuits, i)}/measurements/save",
+            data={"measurements_circuit_continuity": str(round(0.1 + i % 4 * 0.05, 2)),
+                  "measurements_circuit_insulation_resistance": str(200 + i % 30)},
+            follow_redirects=False), (303,)),
+        "terminal_measurements_save": (lambda i: client.post(
+            f"/terminal-devices/{pick(terminals, i)}/measurements/save",
+            data={"measurements_circuit_loop_impedance_min": str(round(0.2 + i % 7 * 0.05, 2)),
+                  "measurements_circuit_rcd_trip_time_ms": str(15 + i % 9)},
+            follow_redirects=False), (303,)),
+        "circuit_edit": (lambda i: client.post(
+            f"/circuits/{pick(circuits, i)}/edit",
+            data={"circuit_number": f"{i % 40 + 1}.1", "circuit_room": "Kuchyň",
+                  "circuit_cable": "CYKY-J 3x2,5", "circuit_cable_installation_method": "pod omítkou"},
+            follow_redirects=False), (303,)),
+        "switchboard_measurements_bulk": (bulk, (200,)),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Seznam popisů regresí proti baseline."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        if current["queries_max"] > before["queries_max"]:
+            regressions.append(f"{name}: SQL/request {before['queries_max']} -> {current['queries_max']}")
+        limit = max(before["p95_ms"] * (1 + tolerance), before["p95_ms"] + min_delta_ms)
+        if current["p95_ms"] > limit:
+            regressions.append(f"{name}: p95 {before['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=200)
+    parser.add_argument("--switchboards", type=int, default=3)
+    parser.add_argument("--rcds", type=int, default=2)
+    parser.add_argument("--devices", type=int, default=12)
+    parser.add_argument("--circuits", type=int, default=2)
+    parser.add_argument("--terminals", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=50, help="měřených požadavků na scénář")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", action="append", help="jen vybrané scénáře (lze opakovat)")
+    parser.add_argument("--output", help="cesta k JSON výsledku (výchozí benchmarks/results/…)")
+    parser.add_argument("--baseline", help="dřívější JSON výsledek k porovnání")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="povolené zhoršení p95 (poměr)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="menší zhoršení p95 se ignoruje")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, select
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    scale = {key: getattr(args, key) for key in
+             ("revisions", "switchboards", "rcds", "devices", "circuits", "terminals", "seed")}
+    started = time.perf_counter()
+    data = generate(database.engine, models, measurements=True, **scale)
+    generated_ms = (time.perf_counter() - started) * 1000
+    print(f"generated {data['rows']} rows in {generated_ms:.0f} ms "
+          f"({len(data['revisions'])} revisions, {len(data['switchboards'])} switchboards, "
+          f"{len(data['circuits'])} circuits, {len(data['terminal_devices'])} terminal devices)")
+
+    boards = {}
+
+    def board(sb_id):
+        """ID obvodů a koncových zařízení rozvaděče (mimo měřený požadavek)."""
+        if sb_id not in boards:
+            with database.engine.connect() as conn:
+                circuit_ids = conn.scalars(
+                    select(models.Circuit.circuit_id)
+                    .join(models.SwitchboardDevice, models.SwitchboardDevice.device_id == models.Circuit.device_id)
+                    .where(models.SwitchboardDevice.switchboard_id == sb_id)
+                ).all()
+                terminal_ids = conn.scalars(
+                    select(models.TerminalDevice.terminal_device_id)
+                    .where(models.TerminalDevice.circuit_id.in_(circuit_ids))
+                ).all()
+            boards[sb_id] = (circuit_ids, terminal_ids)
+        return boards[sb_id]
+
+    counter = {"statements": 0}
+
+    def count(*_):
+        counter["statements"] += 1
+
+    failed = False
+    results = {
+        "meta": {
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "scale": scale,
+            "rows": data["rows"],
+            "requests": args.requests,
+        },
+        "scenarios": {},
+    }
+    with TestClient(app_module.app) as client:
+        for eng in (database.engine, database.async_engine.sync_engine):
+            event.listen(eng, "before_cursor_execute", count)
+        print(f"{'scenario':<32} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL/req':>8}")
+        for name, (call, expected) in scenarios(client, data, board).items():
+            if args.only and name not in args.only:
+                continue
+            for i in range(args.warmup):
+                call(args.requests + i)
+            timings, queries, bad = [], [], []
+            for i in range(args.requests):
+                if name == "switchboard_measurements_bulk":
+                    board(data["switchboards"][i * 7919 % len(data["switchboards"])])
+                counter["statements"] = 0
+                t0 = time.perf_counter()
+                resp = call(i)
+                timings.append((time.perf_counter() - t0) * 1000)
+                queries.append(counter["statements"])
+                if resp.status_code not in expected:
+                    bad.append(resp.status_code)
+            timings.sort()
+            queries.sort()
+            entry = {f"p{p}_ms": round(percentile(timings, p), 3) for p in PERCENTILES}
+            entry.update({
+                "mean_ms": round(sum(timings) / len(timings), 3),
+                "max_ms": round(timings[-1], 3),
+                "queries": percentile(queries, 50),
+                "queries_max": queries[-1],
+                "requests": len(timings),
+            })
+            results["scenarios"][name] = entry
+            print(f"{name:<32} {entry['p50_ms']:>8.1f} {entry['p95_ms']:>8.1f} {entry['p99_ms']:>8.1f} "
+                  f"{entry['queries']:>4}/{entry['queries_max']:<3}")
+            if bad:
+                failed = True
+                print(f"  FAIL: unexpected status {sorted(set(bad))} ({len(bad)}x)")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['commit'] or 'local'}.json")
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2)
+    print(f"results: {os.path.relpath(output, ROOT)}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if baseline.get("meta", {}).get("scale") != scale:
+            print("warning: baseline was measured at a different scale")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if not regressions:
+            print(f"no regressions against {os.path.relpath(args.baseline, ROOT)}")
+        failed = failed or bool(regressions)
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark stránky detailu rozvaděče na velkém syntetickém rozvaděči.
+
+Vytvoří rozvaděč s --devices přístroji (každý --rcd-every-tý je proudový
+chránič, ostatní jsou jističe zavěšené pod posledním chráničem) a ke každému
+jističi --circuits obvodů. Měří celý GET /switchboards/{id} přes testovacího
+klienta – bez cache tabulek přístrojů (před každým požadavkem se vyprázdní)
+a s ní (fragment_cache.py), vždy bez If-None-Match.
+
+Pak ověří, že zápisy přístrojů a obvodů (nový obvod, úprava obvodu, změna
+nadřazeného chrániče, smazání přístroje i přímý SQL zápis mimo aplikaci)
+změní vykreslenou tabulku, že uložení měření cache nezneplatní a že LRU
+drží limit velikosti. Jinak skončí s kódem 1.
+
+    python benchmarks/switchboard_detail.py --devices 500 --runs 20
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+def seed_board(SessionLocal, models, devices, circuits, rcd_every):
+    db = SessionLocal()
+    try:
+        if not db.get(models.User, 1):
+            db.add(models.User(user_id=1, username="demo", email="demo@example.com", password_hash="x"))
+        rev = models.Revision(user_id=1, revision_name="Velký rozvaděč")
+        sb = models.Switchboard(revision=rev, switchboard_name="RH", switchboard_order=1)
+        db.add(rev)
+        current_rcd = None
+        for d in range(devices):
+            if d % rcd_every == 0:
+                current_rcd = models.SwitchboardDevice(
+                    switchboard=sb,
+                    switchboard_device_position=f"FI{d // rcd_every + 1}",
+                    switchboard_device_type="RCD",
+                    switchboard_device_residual_current_ma=30,
+                    switchboard_device_poles=4,
+                )
+                db.add(current_rcd)
+                continue
+            dev = models.SwitchboardDevice(
+                switchboard=sb,
+                parent_device=current_rcd,
+                switchboard_device_position=f"F{d}",
+                switchboard_device_type="MCB",
+                switchboard_device_rated_current=16,
+            )
+            for c in range(circuits):
+                dev.circuits.append(models.Circuit(circuit_number=f"{d}.{c + 1}", circuit_room="Místnost"))
+            db.add(dev)
+        db.commit()
+        return sb.switchboard_id
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--circuits", type=int, default=2)
+    parser.add_argument("--rcd-every", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+    import database
+    import fragment_cache
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    sb_id = seed_board(database.SessionLocal, models, args.devices, args.circuits, args.rcd_every)
+    url = f"/switchboards/{sb_id}"
+    cache = fragment_cache.cache
+
+    failed = False
+
+    def check(label, ok):
+        nonlocal failed
+        failed = failed or not ok
+        print(f"{label:<52} {'ok' if ok else 'FAIL'}")
+
+    def devices_table(html):
+        start = html.index("<!-- Proudové chrániče -->")
+        return html[start:html.index("<!-- Offcanvas drawer pro přístroj -->")]
+
+    with TestClient(app_module.app) as client:
+        client.get(url)
+        results = {}
+        for mode in ("cold", "hot"):
+            timings = []
+            for _ in range(args.runs):
+                if mode == "cold":
+                    cache.clear()
+                start = time.perf_counter()
+                resp = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+                failed = failed or resp.status_code != 200
+            results[mode] = (timings, resp.text)
+
+        print(f"devices={args.devices} circuits/device={args.circuits} runs={args.runs} html={len(resp.content)} B")
+        for mode, (timings, _html) in results.items():
+            print("switchboard_detail {} cache ms: median={:.1f} min={:.1f} max={:.1f}".format(
+                mode, statistics.median(timings), min(timings), max(timings)
+            ))
+        stats = client.get("/debug/fragment-cache").json()
+        print(f"fragment cache: {stats}")
+        check("cached page is identical to a fresh render", results["cold"][1] == results["hot"][1])
+        check("hot runs are all hits", stats["hits"] >= args.runs)
+
+        with database.SessionLocal() as db:
+            dev = db.query(models.SwitchboardDevice).filter_by(
+                switchboard_id=sb_id, switchboard_device_type="MCB").first()
+            rcd = db.query(models.SwitchboardDevice).filter(
+                models.SwitchboardDevice.switchboard_id == sb_id,
+                models.SwitchboardDevice.device_id != dev.parent_device_id,
+                models.SwitchboardDevice.switchboard_device_type == "RCD").first()
+            circuit_id = dev.circuits[0].circuit_id
+            device_id, rcd_id = dev.device_id, rcd.device_id
+
+        def changes(label, write, expect_change=True):
+            before = devices_table(client.get(url).text)
+            hits = cache.hits
+            response = write()
+            page = client.get(url)
+            changed = devices_table(page.text) != before
+            ok = response.status_code < 400 and page.status_code == 200 and changed == expect_change
+            if not expect_change:
+                ok = ok and cache.hits == hits + 1
+            check(label, ok)
+
+        changes("circuit create changes the device table", lambda: client.post(
+            f"/devices/{device_id}/circuits/create", data={"circuit_number": "99.1", "circuit_room": "Půda"},
+            follow_redirects=False))
+        changes("circuit edit changes the device table", lambda: client.post(
+            f"/circuits/{circuit_id}/edit", data={"circuit_number": "1.1", "circuit_room": "Sklep"},
+            follow_redirects=False))
+        changes("set-parent changes the device table", lambda: client.post(
+            f"/devices/{device_id}/set-parent", data={"parent_device_id": str(rcd_id)}, follow_redirects=False))
+        check("set-parent rejects a cycle", client.post(
+            f"/devices/{rcd_id}/set-parent", data={"parent_device_id": str(device_id)},
+            follow_redirects=False).status_code == 303
+            and re.search(rf'data-device-id="{rcd_id}"\s+data-parent-id=""', client.get(url).text) is not None)
+        changes("measurement save keeps the cached table", lambda: client.post(
+            f"/circuits/{circuit_id}/measurements/save", data={"measurements_circuit_continuity": "0.4"},
+            follow_redirects=False), expect_change=False)
+
+        def direct_sql():
+            with database.engine.begin() as conn:
+                conn.execute(text("UPDATE circuits SET circuit_room = 'Garáž' WHERE circuit_id = :id"),
+                             {"id": circuit_id})
+            return client.get("/debug/fragment-cache")
+
+        changes("direct SQL write changes the device table", direct_sql)
+        changes("device delete changes the device table", lambda: client.post(
+            f"/devices/{device_id}/delete", follow_redirects=False))
+
+    small = fragment_cache.FragmentCache(max_bytes=3 * sys.getsizeof("x" * 1000))
+    for i in range(5):
+        small.put(i, 1, "x" * 1000)
+    small.get(2, 1)
+    small.put(5, 1, "x" * 1000)
+    small.put(6, 1, "x" * 100000)
+    check("LRU keeps the byte limit and evicts the oldest",
+          list(small.entries) == [4, 2, 5] and small.bytes <= small.max_bytes and small.evictions == 3)
+    check("stale version is a miss", small.get(2, 2) is None and small.get(2, 1) is not None)
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
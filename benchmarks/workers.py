@@ -0,0 +1,150 @@
+"""
+Zátěžový test produkčního režimu: 1 worker vs. N workerů gunicornu.
+
+Připraví dočasnou SQLite databázi s jedním větším rozvaděčem, pro každý
+zadaný počet workerů spustí `gunicorn -c gunicorn.conf.py main:app` na
+volném portu a přes skutečné HTTP pošle paralelní GET /switchboards/{id}.
+Zároveň ověří, že bootstrap (migrace, výchozí uživatel) proběhl jen jednou.
+
+    python benchmarks/workers.py --workers 1,4 --concurrency 32 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import percentile  # noqa: E402
+from switchboard_detail import seed_board  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, proc, timeout=30.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn skončil při startu")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} neodpovídá do {timeout} s")
+
+
+async def load(url, concurrency, total):
+    import httpx
+
+    latencies = []
+    remaining = iter(range(total))
+
+    async def worker(client):
+        for _ in remaining:
+            start = time.perf_counter()
+            resp = await client.get(url)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                raise RuntimeError(f"{url} -> {resp.status_code}")
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, elapsed
+
+
+def run_server(workers, env, path, action):
+    """Spustí gunicorn, zavolá action(url) a vrátí (výsledek, výstup serveru)."""
+    port = free_port()
+    env = dict(env, PORT=str(port), WEB_CONCURRENCY=str(workers), GUNICORN_ACCESS_LOG="")
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}{path}"
+    try:
+        wait_ready(url, proc)
+        result = action(url)
+    except Exception:
+        log.seek(0)
+        sys.stderr.write(log.read().decode("utf-8", "replace")[-4000:])
+        raise
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        log.seek(0)
+        output = log.read().decode("utf-8", "replace")
+        log.close()
+    return result, output
+
+
+def check_single_bootstrap(workers, tmpdir):
+    """Na prázdné databázi musí migrace proběhnout právě jednou, ne v každém workeru."""
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmpdir}/empty.db", SECRET_KEY="benchmark")
+    env.pop("APP_BOOTSTRAPPED", None)
+    _, output = run_server(workers, env, "/revisions", lambda url: None)
+    runs = output.count("Migration 1:")
+    booted = output.count("Booting worker")
+    print(f"bootstrap check: workers={booted} initial migrations={runs}")
+    return runs == 1 and booted == workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=f"1,{max(2, os.cpu_count() or 1)}",
+                        help="čárkou oddělené počty workerů")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--devices", type=int, default=60)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmpdir}/bench.db", SECRET_KEY="benchmark")
+    env.pop("APP_BOOTSTRAPPED", None)
+    os.environ.update(DATABASE_URL=env["DATABASE_URL"], SECRET_KEY=env["SECRET_KEY"])
+
+    import database
+    import models
+    from migrations import migrate
+
+    migrate()
+    sb_id = seed_board(database.SessionLocal, models, args.devices, 2, 6)
+    database.engine.dispose()
+
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    ok = check_single_bootstrap(max(worker_counts), tmpdir)
+
+    def measure(url):
+        asyncio.run(load(url, args.concurrency, args.concurrency * 5))  # zahřátí všech workerů
+        return asyncio.run(load(url, args.concurrency, args.requests))
+
+    print(f"cpu={os.cpu_count()} concurrency={args.concurrency} requests={args.requests}")
+    for workers in worker_counts:
+        (latencies, elapsed), _ = run_server(workers, env, f"/switchboards/{sb_id}", measure)
+        ms = [v * 1000 for v in latencies]
+        print(
+            f"workers={workers}: throughput={len(ms) / elapsed:.1f} req/s "
+            f"p50={percentile(ms, 50):.1f} p99={percentile(ms, 99):.1f} ms"
+        )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Kontrola zakládacích formulářů a dávkového endpointu: počet SQL příkazů
+a commitů na jedno kliknutí, atomicita dávky.
+
+Každý zakládací tok (revize, rozvaděč, přístroj) i dávka smí commitnout
+nejvýše jednou. Dávka s chybnou poslední operací nesmí uložit nic; dávka
+nesmí přiřadit nadřazený přístroj z jiného rozvaděče ani vytvořit cyklus
+(stejně jako formulář set-parent). Jinak skript skončí s kódem 1.
+
+    python benchmarks/write_flows.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from concurrency import seed  # noqa: E402
+
+
+def batch_operations(sb_id, devices=20):
+    ops = [{"op": "create", "entity": "switchboard", "ref": "rn", "data": {"switchboard_name": "RN"}}]
+    for d in range(devices):
+        ops.append({"op": "create", "entity": "device", "ref": f"f{d}",
+                    "data": {"switchboard_id": "rn", "switchboard_device_position": f"F{d + 1}"}})
+        ops.append({"op": "create", "entity": "circuit", "ref": f"c{d}",
+                    "data": {"device_id": f"f{d}", "circuit_number": str(d + 1)}})
+        ops.append({"op": "create", "entity": "terminal_device",
+                    "data": {"circuit_id": f"c{d}", "terminal_device_quantity": 2}})
+    ops.append({"op": "update", "entity": "switchboard", "id": sb_id, "data": {"switchboard_note": "dávka"}})
+    return ops
+
+
+def main():
+    tmpdir = tempfile.mkdtemp(prefix="revize-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, func, select
+    import database
+    import models
+    import main as app_module
+    from migrations import migrate
+
+    migrate()
+    rev_id, sb_ids, _ = seed(database.SessionLocal, models)
+
+    statements = []
+    for eng in (database.engine, database.async_engine.sync_engine):
+        event.listen(eng, "before_cursor_execute", lambda *_: statements.append("SQL"))
+        event.listen(eng, "commit", lambda *_: statements.append("COMMIT"))
+
+    def count_rows(model):
+        with database.SessionLocal() as db:
+            return db.scalar(select(func.count()).select_from(model))
+
+    failed = False
+    with TestClient(app_module.app) as client:
+        client.get("/revisions")
+        flows = {
+            "revision_create": lambda: client.post(
+                "/revisions/create", data={"revision_name": "Nová"}, follow_redirects=False),
+            "switchboard_create": lambda: client.post(
+                f"/revisions/{rev_id}/switchboards/create", data={"switchboard_name": "R9"}, follow_redirects=False),
+            "device_create": lambda: client.post(
+                f"/switchboards/{sb_ids[0]}/devices/create", data={"switchboard_device_position": "Q9"},
+                follow_redirects=False),
+            "batch (61 ops)": lambda: client.post(
+                f"/revisions/{rev_id}/batch", json={"operations": batch_operations(sb_ids[0])}),
+        }
+        print(f"{'flow':<20} {'status':>6} {'sql':>5} {'commits':>8}")
+        for name, call in flows.items():
+            statements.clear()
+            resp = call()
+            sql = statements.count("SQL")
+            commits = statements.count("COMMIT")
+            bad = resp.status_code >= 400 or commits != 1
+            failed = failed or bad
+            print(f"{name:<20} {resp.status_code:>6} {sql:>5} {commits:>8}{'  <--' if bad else ''}")
+
+        before = count_rows(models.SwitchboardDevice)
+        ops = batch_operations(sb_ids[0], devices=3)
+        ops.append({"op": "update", "entity": "circuit", "id": 10 ** 9, "data": {"circuit_room": "x"}})
+        resp = client.post(f"/revisions/{rev_id}/batch", json={"operations": ops})
+        atomic = resp.status_code == 400 and resp.json()["operation"] == len(ops) - 1
+        atomic = atomic and count_rows(models.SwitchboardDevice) == before
+        failed = failed or not atomic
+        print(f"batch rollback on error: {'ok' if atomic else 'FAILED'} ({resp.status_code} {resp.json()})")
+
+        with database.SessionLocal() as db:
+            a, b, c = db.scalars(select(models.SwitchboardDevice.device_id)
+                                 .where(models.SwitchboardDevice.switchboard_id == sb_ids[0])
+                                 .order_by(models.SwitchboardDevice.device_id).limit(3))
+            other = db.scalar(select(models.SwitchboardDevice.device_id)
+                              .where(models.SwitchboardDevice.switchboard_id == sb_ids[1]))
+
+        def parent_op(device_id, parent):
+            return {"op": "update", "entity": "device", "id": device_id, "data": {"parent_device_id": parent}}
+
+        # (popis, operace, index operace, která má selhat; None = projde)
+        cases = [
+            ("parent in the same switchboard", [parent_op(a, b), parent_op(c, b)], None),
+            ("parent from another switchboard", [parent_op(a, other)], 0),
+            ("cycle of two devices", [parent_op(b, a)], 0),
+            ("cycle through a new device", [
+                {"op": "create", "entity": "device", "ref": "q",
+                 "data": {"switchboard_id": sb_ids[0], "parent_device_id": a}},
+                parent_op(b, "q"),
+            ], 1),
+            ("device moved away from its children", [
+                {"op": "update", "entity": "device", "id": b, "data": {"switchboard_id": sb_ids[1]}},
+            ], 0),
+            ("device moved with its children", [
+                {"op": "update", "entity": "device", "id": b, "data": {"switchboard_id": sb_ids[1]}},
+                {"op": "update", "entity": "device", "id": a, "data": {"switchboard_id": sb_ids[1]}},
+                {"op": "update", "entity": "device", "id": c, "data": {"switchboard_id": sb_ids[1]}},
+            ], None),
+        ]
+        for label, ops, bad_index in cases:
+            before = count_rows(models.SwitchboardDevice)
+            resp = client.post(f"/revisions/{rev_id}/batch", json={"operations": ops})
+            if bad_index is None:
+                ok = resp.status_code == 200
+            else:
+                ok = (resp.status_code == 400 and resp.json()["operation"] == bad_index
+                      and count_rows(models.SwitchboardDevice) == before)
+            failed = failed or not ok
+            print(f"batch {label:<38} {'ok' if ok else 'FAILED'} ({resp.status_code} {resp.json()})")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
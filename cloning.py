@@ -0,0 +1,190 @@
+"""
+Hluboká kopie revize – výchozí stav pro další periodickou revizi.
+
+Zkopíruje revizi se všemi rozvaděči, přístroji (včetně vazeb parent_device_id),
+obvody a koncovými zařízeními, volitelně i s měřeními. Každá úroveň stromu se
+načte jedním SELECTem; nová ID se pro celou úroveň rezervují předem (sekvence
+v Postgresu, MAX(id) v SQLite) a řádky se vloží jedním hromadným INSERTem.
+Převodní tabulka staré ID -> nové ID pak přemapuje cizí klíče další úrovně.
+Vazby mezi přístroji se doplní jedním hromadným UPDATE po vložení všech
+přístrojů. Žádné ORM objekty se nevytvářejí, commit je jeden.
+
+Triggery sync_log jsou po dobu klonu vypnuté (delta_sync.pause); záznamy
+nové revize se do sync_log zapíšou na konci hromadně, ne po řádcích.
+"""
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import delta_sync
+from models import (
+    Circuit,
+    CircuitMeasurement,
+    Revision,
+    Switchboard,
+    SwitchboardDevice,
+    SwitchboardMeasurement,
+    TerminalDevice,
+    TerminalMeasurement,
+)
+
+
+def _pk(model):
+    return model.__mapper__.primary_key[0]
+
+
+def _rows(result, model, fk=None, id_map=None, revision_id=None):
+    """
+    Řádky SELECTu jako slovníky bez primárního klíče, s přemapovaným FK
+    (a denormalizovaným revision_id nové revize, je-li zadané).
+    """
+    pk = _pk(model).key
+    old_ids, rows = [], []
+    for row in result.mappings():
+        row = dict(row)
+        old_ids.append(row.pop(pk))
+        if fk is not None:
+            row[fk] = id_map[row[fk]]
+        if revision_id is not None:
+            row["revision_id"] = revision_id
+        rows.append(row)
+    return old_ids, rows
+
+
+async def _allocate_ids(db: AsyncSession, model, count: int) -> list:
+    """
+    Rezervuje `count` nových primárních klíčů. Postgres je bere ze sekvence
+    sloupce jedním dotazem; SQLite navazuje na MAX(id) – transakce už v tu
+    chvíli drží zápisový zámek (INSERT revize), nikdo jiný ID nepřidělí.
+    """
+    pk = _pk(model)
+    if db.get_bind().dialect.name == "postgresql":
+        sequence = func.pg_get_serial_sequence(model.__tablename__, pk.name)
+        return list((await db.scalars(
+            select(func.nextval(sequence)).select_from(func.generate_series(1, count))
+        )).all())
+    start = (await db.scalar(select(func.max(pk)))) or 0
+    return list(range(start + 1, start + 1 + count))
+
+
+async def _insert_many(db: AsyncSession, model, old_ids, rows) -> dict:
+    """Hromadný INSERT s předem přidělenými ID; vrací {staré ID: nové ID}."""
+    if not rows:
+        return {}
+    new_ids = await _allocate_ids(db, model, len(rows))
+    pk = _pk(model).key
+    for row, new_id in zip(rows, new_ids):
+        row[pk] = new_id
+    await db.execute(insert(model), rows)
+    return dict(zip(old_ids, new_ids))
+
+
+async def _copy_measurements(db: AsyncSession, model, fk_column, source_ids, id_map):
+    """Měření navázaná 1:1 na zkopírované záznamy (switchboard/circuit/terminal)."""
+    if not id_map:
+        return
+    result = await db.execute(select(model.__table__).where(fk_column.in_(source_ids)))
+    _, rows = _rows(result, model, fk_column.key, id_map)
+    if rows:
+        await db.execute(insert(model), rows)
+
+
+async def clone_revision(
+    db: AsyncSession,
+    revision_id: int,
+    revision_name: str | None = None,
+    with_measurements: bool = False,
+) -> int:
+    """
+    Zkopíruje revizi (vlastnictví ověřuje volající) a commitne. Bez měření
+    dostanou nové rozvaděče prázdné SwitchboardMeasurement jako při založení
+    z formuláře. Vrací ID nové revize.
+    """
+    rev_table = Revision.__table__
+    source = (await db.execute(
+        select(rev_table).where(rev_table.c.revision_id == revision_id)
+    )).mappings().one()
+    revision = dict(source)
+    revision.pop("revision_id")
+    revision["revision_name"] = revision_name or f"{source['revision_name'] or 'Revize'} (kopie)"
+    pause_id = await delta_sync.pause(db)
+    new_revision_id = (await db.execute(
+        insert(Revision).values(**revision).returning(Revision.revision_id)
+    )).scalar_one()
+
+    sb_table = Switchboard.__table__
+    dev_table = SwitchboardDevice.__table__
+    circuit_table = Circuit.__table__
+    td_table = TerminalDevice.__table__
+
+    # ID zdrojových záznamů jako poddotazy – filtrují měření bez dlouhých
+    # seznamů parametrů; každá úroveň má vlastní revision_id (ownership.py).
+    sb_ids = select(sb_table.c.switchboard_id).where(sb_table.c.revision_id == revision_id)
+    circuit_ids = select(circuit_table.c.circuit_id).where(circuit_table.c.revision_id == revision_id)
+    td_ids = select(td_table.c.terminal_device_id).where(td_table.c.revision_id == revision_id)
+
+    old_ids, rows = _rows(
+        await db.execute(
+            select(sb_table)
+            .where(sb_table.c.revision_id == revision_id)
+            .order_by(sb_table.c.switchboard_id)
+        ),
+        Switchboard, "revision_id", {revision_id: new_revision_id},
+    )
+    switchboards = await _insert_many(db, Switchboard, old_ids, rows)
+
+    old_ids, rows = _rows(
+        await db.execute(
+            select(dev_table).where(dev_table.c.revision_id == revision_id).order_by(dev_table.c.device_id)
+        ),
+        SwitchboardDevice, "switchboard_id", switchboards, new_revision_id,
+    )
+    # Nadřazený přístroj může mít vyšší ID než podřízený – vazby až po vložení všech.
+    parents = []
+    for old_id, row in zip(old_ids, rows):
+        if row["parent_device_id"] is not None:
+            parents.append((old_id, row["parent_device_id"]))
+            row["parent_device_id"] = None
+    devices = await _insert_many(db, SwitchboardDevice, old_ids, rows)
+    links = [
+        {"device_id": devices[old_id], "parent_device_id": devices[parent_id]}
+        for old_id, parent_id in parents
+        if parent_id in devices
+    ]
+    if links:
+        await db.execute(update(SwitchboardDevice), links)
+
+    old_ids, rows = _rows(
+        await db.execute(
+            select(circuit_table)
+            .where(circuit_table.c.revision_id == revision_id)
+            .order_by(circuit_table.c.circuit_id)
+        ),
+        Circuit, "device_id", devices, new_revision_id,
+    )
+    circuits = await _insert_many(db, Circuit, old_ids, rows)
+
+    old_ids, rows = _rows(
+        await db.execute(
+            select(td_table).where(td_table.c.revision_id == revision_id).order_by(td_table.c.terminal_device_id)
+        ),
+        TerminalDevice, "circuit_id", circuits, new_revision_id,
+    )
+    terminals = await _insert_many(db, TerminalDevice, old_ids, rows)
+
+    if with_measurements:
+        await _copy_measurements(
+            db, SwitchboardMeasurement, SwitchboardMeasurement.switchboard_id, sb_ids, switchboards
+        )
+        await _copy_measurements(db, CircuitMeasurement, CircuitMeasurement.circuit_id, circuit_ids, circuits)
+        await _copy_measurements(
+            db, TerminalMeasurement, TerminalMeasurement.terminal_device_id, td_ids, terminals
+        )
+    elif switchboards:
+        await db.execute(
+            insert(SwitchboardMeasurement),
+            [{"switchboard_id": new_id} for new_id in switchboards.values()],
+        )
+
+    await delta_sync.log_revision(db, new_revision_id, pause_id)
+    await db.commit()
+    return new_revision_id
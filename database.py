@@ -1,5 +1,8 @@
+import logging
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Základní URL databáze: Railway / Postgres přes env, jinak lokální SQLite.
@@ -13,18 +16,169 @@ if DATABASE_URL.startswith("postgres://"):
 if DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg://", 1)
 
+# Asynchronní varianta URL: psycopg3 umí async pod stejným dialektem,
+# pro SQLite použijeme aiosqlite.
+ASYNC_DATABASE_URL = DATABASE_URL
+if ASYNC_DATABASE_URL.startswith("sqlite://"):
+    ASYNC_DATABASE_URL = ASYNC_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
 # Speciální connect_args jen pro SQLite
 connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
+if IS_SQLITE:
     connect_args = {"check_same_thread": False}
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Velikost poolu na jeden worker proces. Bez DB_POOL_SIZE se celkový počet
+# spojení (DB_MAX_CONNECTIONS) dělí mezi workery (WEB_CONCURRENCY nastavuje
+# i gunicorn.conf.py), aby N workerů dohromady nepřekročilo limit databáze.
+# Worker potřebuje aspoň dvě spojení, gunicorn.conf.py proto workery omezí na
+# DB_MAX_CONNECTIONS // 2; při více workerech (jiný správce procesů) by
+# součet limit překročil – to se zaloguje.
+# Pro souborovou SQLite dialekt aiosqlite jinak volí NullPool (nové spojení
+# a vlákno pro každý požadavek, pragmy znovu) – spojení proto držíme v poolu.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+
+async_pool_args = {}
+sync_pool_args = {}
+if not IS_SQLITE:
+    per_worker = max(2, DB_MAX_CONNECTIONS // WEB_CONCURRENCY)
+    if per_worker * WEB_CONCURRENCY > DB_MAX_CONNECTIONS and "DB_POOL_SIZE" not in os.environ:
+        logging.getLogger("revize.database").warning(
+            "%d workers x %d connections exceed DB_MAX_CONNECTIONS=%d",
+            WEB_CONCURRENCY, per_worker, DB_MAX_CONNECTIONS,
+        )
+    common_pool_args = {
+        # Spojení starší než recycle se zahodí (ochrana před timeouty proxy / PgBounceru).
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        # Ověření spojení před výdejem z poolu – po restartu databáze žádné 500.
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+    }
+    # Async engine obsluhuje požadavky: stálá spojení + malá rezerva na špičky.
+    async_pool_args = dict(
+        common_pool_args,
+        pool_size=_env_int("DB_POOL_SIZE", max(1, per_worker - 1)),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 1),
+    )
+    # Synchronní engine slouží jen startu (migrace, výchozí uživatel) a skriptům.
+    sync_pool_args = dict(common_pool_args, pool_size=1, max_overflow=1)
+elif ":memory:" not in DATABASE_URL:
+    async_pool_args = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 5),
+    }
+
+engine = create_engine(DATABASE_URL, connect_args=connect_args, **sync_pool_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine pro HTTP routy – dotazy neblokují event loop uvicornu.
+# expire_on_commit=False: po commitu se atributy nesmí líně donačítat (mimo await).
+async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=connect_args, **async_pool_args)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+# SQLite profil pro offline notebooky: WAL (čtení neblokují zápis a naopak),
+# synchronous=NORMAL (ve WAL režimu bezpečné, fsync jen při checkpointu),
+# mmap pro čtení a busy_timeout místo okamžitého "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, _record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+class PoolStats:
+    """
+    Počítadla výdejů spojení z poolu jednoho engine – podklad pro nastavení
+    DB_POOL_SIZE / DB_MAX_OVERFLOW. Když se peak_checked_out drží na
+    pool_size + max_overflow, požadavky čekají na spojení.
+    """
+
+    def __init__(self, name, engine_):
+        self.name = name
+        self.pool = engine_.pool
+        self.connects = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        event.listen(engine_, "connect", self._on_connect)
+        event.listen(engine_, "checkout", self._on_checkout)
+        event.listen(engine_, "checkin", self._on_checkin)
+
+    def _on_connect(self, *_):
+        self.connects += 1
+
+    def _on_checkout(self, *_):
+        self.checkouts += 1
+        self.checked_out += 1
+        self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, *_):
+        self.checked_out = max(0, self.checked_out - 1)
+
+    def snapshot(self):
+        data = {
+            "pool": type(self.pool).__name__,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checked_out": self.checked_out,
+            "peak_checked_out": self.peak_checked_out,
+        }
+        # size/overflow má jen QueuePool (NullPool/StaticPool je nemají).
+        if hasattr(self.pool, "size"):
+            data["pool_size"] = self.pool.size()
+            data["overflow"] = self.pool.overflow()
+        return data
+
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+_pool_stats = [PoolStats("async", async_engine.sync_engine), PoolStats("sync", engine)]
+
+
+def pool_stats():
+    """Statistiky výdejů spojení pro oba engine (v rámci tohoto procesu)."""
+    return {stats.name: stats.snapshot() for stats in _pool_stats}
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,342 @@
+"""
+Rozdílová synchronizace revize pro offline tablety.
+
+V technických místnostech a sklepech není signál; tablet si revizi stáhne,
+pracuje offline a po návratu pošle změny a stáhne jen to, co se mezitím
+změnilo – ne celou revizi znovu.
+
+Tabulka sync_log má pro každý záznam stromu revizí (revize, rozvaděče,
+přístroje, obvody, koncová zařízení a jejich měření) jeden řádek: seq
+z jediné rostoucí řady, čas změny (updated_at) a příznak smazání. Triggery
+ho při každém zápisu přepíšou novým seq, při smazání ponechají jako
+tombstone – bez ohledu na to, kdo zapisuje (formuláře, dávky, import).
+Klonování revize triggery vypne (pause) a sync_log nové revize zapíše samo
+jedním INSERT…SELECT na entitu (log_revision). Měření jsou 1:1 k rodiči
+a mají ID rodiče, stejně jako v dávce.
+
+GET /revisions/{id}/sync?cursor=N vrátí záznamy a tombstony revize se seq
+větším než kurzor (jedním průchodem indexu revision_id, seq) a nový kurzor;
+velikost odpovědi odpovídá počtu změněných záznamů, ne velikosti revize.
+Kurzor 0 je úplné stažení. Stránkuje se po SYNC_PAGE_SIZE záznamech
+("more": true – pokračovat s vráceným kurzorem). seq záznamu je zároveň
+jeho verze.
+
+POST /revisions/{id}/sync pošle změny tabletu ve formátu dávky (batch.py),
+navíc s "version" – verzí záznamu, ze které tablet vycházel. Pokud se
+záznam od té doby změnil nebo byl smazán, operace se neprovede a vrátí se
+jako konflikt s aktuálním stavem záznamu; ostatní operace se provedou
+v jedné transakci. Operace bez "version" přepíše, co na serveru je.
+Odpověď nese nové verze všech záznamů, které zápis změnil (i přepočtené
+souhrny obvodů).
+
+Aby kurzor nepřeskočil změnu, musí se pořadí seq v rámci revize shodovat
+s pořadím commitů. SQLite má jediného zapisovatele; v Postgresu trigger
+zamkne řádek revize v revision_versions (zamyká ho i trigger ETagu,
+http_cache.py), takže souběžné zápisy do téže revize jdou za sebou.
+"""
+import os
+from datetime import date, datetime
+
+from sqlalchemy import and_, delete, false, func, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import http_cache
+from batch import BATCH_MAX_OPERATIONS, BatchError, run_batch
+from models import (
+    Circuit,
+    CircuitMeasurement,
+    Revision,
+    RevisionVersion,
+    Switchboard,
+    SwitchboardDevice,
+    SwitchboardMeasurement,
+    SyncLog,
+    SyncLogPause,
+    TerminalDevice,
+    TerminalMeasurement,
+)
+
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "1000"))
+
+# entita -> (model, sloupec s ID entity) – shora dolů, stejné názvy jako v dávce
+ENTITIES = {
+    "revision": (Revision, "revision_id"),
+    "switchboard": (Switchboard, "switchboard_id"),
+    "switchboard_measurement": (SwitchboardMeasurement, "switchboard_id"),
+    "device": (SwitchboardDevice, "device_id"),
+    "circuit": (Circuit, "circuit_id"),
+    "circuit_measurement": (CircuitMeasurement, "circuit_id"),
+    "terminal_device": (TerminalDevice, "terminal_device_id"),
+    "terminal_measurement": (TerminalMeasurement, "terminal_device_id"),
+}
+
+# revize řádku s prefixem NEW/OLD (u měření přes rodiče)
+REVISION_OF = dict(http_cache.TREE_TABLES, revisions="{row}.revision_id")
+
+
+def _log(entity, key, revision, row, deleted):
+    # jeden řádek na záznam: starý (i tombstone) se nahradí novým seq
+    return (
+        f"DELETE FROM sync_log WHERE entity = '{entity}' AND entity_id = {row}.{key}; "
+        f"INSERT INTO sync_log (revision_id, entity, entity_id, deleted) "
+        f"VALUES ({revision.format(row=row)}, '{entity}', {row}.{key}, {deleted});"
+    )
+
+
+def install(conn):
+    """Tabulka sync_log, záznamy existujících řádků a triggery (volá migrace)."""
+    SyncLog.__table__.create(bind=conn, checkfirst=True)
+    for entity, (model, key) in ENTITIES.items():
+        table = model.__tablename__
+        conn.exec_driver_sql(
+            f"INSERT INTO sync_log (revision_id, entity, entity_id, deleted) "
+            f"SELECT {REVISION_OF[table].format(row=table)}, '{entity}', {key}, false FROM {table}"
+        )
+    install_triggers(conn)
+
+
+def install_triggers(conn):
+    """
+    Triggery sync_log (znovu založené, volá i migrace 11). Nic nezapisují,
+    pokud transakce vložila řádek do sync_log_pause (viz pause).
+    """
+    SyncLogPause.__table__.create(bind=conn, checkfirst=True)
+    if conn.dialect.name == "postgresql":
+        for entity, (model, key) in ENTITIES.items():
+            table = model.__tablename__
+            revision = REVISION_OF[table]
+            if table == "revisions":
+                # smazaná revize už se nesynchronizuje (404) – záznamy se zahodí
+                on_delete = "DELETE FROM sync_log WHERE revision_id = OLD.revision_id; RETURN NULL;"
+            else:
+                on_delete = (
+                    f"PERFORM 1 FROM revision_versions WHERE revision_id = {revision.format(row='OLD')} FOR UPDATE; "
+                    f"{_log(entity, key, revision, 'OLD', 'true')} RETURN NULL;"
+                )
+            conn.exec_driver_sql(
+                f"CREATE OR REPLACE FUNCTION {table}_sync_log() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+                f"IF EXISTS (SELECT 1 FROM sync_log_pause) THEN RETURN NULL; END IF; "
+                f"IF TG_OP = 'DELETE' THEN {on_delete} END IF; "
+                f"PERFORM 1 FROM revision_versions WHERE revision_id = {revision.format(row='NEW')} FOR UPDATE; "
+                f"{_log(entity, key, revision, 'NEW', 'false')} RETURN NULL; END $$"
+            )
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_sync_log ON {table}")
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {table}_sync_log AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION {table}_sync_log()"
+            )
+        return
+
+    for entity, (model, key) in ENTITIES.items():
+        table = model.__tablename__
+        revision = REVISION_OF[table]
+        if table == "revisions":
+            on_delete = "DELETE FROM sync_log WHERE revision_id = OLD.revision_id;"
+        else:
+            on_delete = _log(entity, key, revision, "OLD", 1)
+        for event, body in (("INSERT", _log(entity, key, revision, "NEW", 0)),
+                            ("UPDATE", _log(entity, key, revision, "NEW", 0)),
+                            ("DELETE", on_delete)):
+            name = f"{table}_sync_{event.lower()}"
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {name} AFTER {event} ON {table} "
+                f"WHEN NOT EXISTS (SELECT 1 FROM sync_log_pause) BEGIN {body} END"
+            )
+
+
+async def pause(db: AsyncSession) -> int:
+    """
+    Vypne triggery sync_log do konce hromadného zápisu v této transakci –
+    u klonu by jinak každý vložený řádek stál DELETE+INSERT do sync_log.
+    Zápis se musí uzavřít voláním log_revision před commitem.
+    """
+    return (await db.execute(insert(SyncLogPause).values().returning(SyncLogPause.pause_id))).scalar_one()
+
+
+def _revision_filter(model, key, revision_id):
+    # záznamy revize: přímo podle revision_id, měření přes rodiče (1:1, stejné ID)
+    table = model.__table__
+    parent = next(iter(table.c[key].foreign_keys), None)
+    if parent is None:
+        return table.c.revision_id == revision_id
+    parent_table = parent.column.table
+    return table.c[key].in_(select(parent.column).where(parent_table.c.revision_id == revision_id))
+
+
+async def log_revision(db: AsyncSession, revision_id: int, pause_id: int):
+    """
+    Znovu zapne triggery a zapíše sync_log pro všechny záznamy revize –
+    jeden INSERT…SELECT na entitu, shora dolů jako triggery. Staré řádky se
+    stejným ID (tombstony, SQLite ID znovu přiděluje) se nahradí.
+    """
+    await db.execute(delete(SyncLogPause).where(SyncLogPause.pause_id == pause_id))
+    for entity, (model, key) in ENTITIES.items():
+        column = model.__table__.c[key]
+        where = _revision_filter(model, key, revision_id)
+        await db.execute(
+            delete(SyncLog).where(SyncLog.entity == entity, SyncLog.entity_id.in_(select(column).where(where)))
+        )
+        await db.execute(insert(SyncLog).from_select(
+            ["revision_id", "entity", "entity_id", "deleted"],
+            select(literal(revision_id), literal(entity), column, false()).where(where),
+        ))
+
+
+def changes_query(revision_id: int, cursor: int, limit: int):
+    """Záznamy sync_log revize po kurzoru, v pořadí seq."""
+    return (
+        select(SyncLog.seq, SyncLog.entity, SyncLog.entity_id, SyncLog.deleted)
+        .where(SyncLog.revision_id == revision_id, SyncLog.seq > cursor)
+        .order_by(SyncLog.seq)
+        .limit(limit)
+    )
+
+
+def rows_query(entity: str, ids):
+    """Aktuální řádky entity s jejich verzí (seq) – data i verze z jednoho dotazu."""
+    model, key = ENTITIES[entity]
+    table = model.__table__
+    return (
+        select(SyncLog.seq, table)
+        .select_from(table)
+        .join(SyncLog, and_(SyncLog.entity == entity, SyncLog.entity_id == table.c[key]))
+        .where(table.c[key].in_(ids))
+    )
+
+
+def versions_query(keys):
+    """
+    Verze záznamů podle (entita, ID) – vyhledání v unikátním indexu. Revizi
+    kontroluje volající; podmínka na revision_id by planner svedla na index
+    revize a průchod všemi jejími záznamy.
+    """
+    by_entity = {}
+    for entity, entity_id in keys:
+        by_entity.setdefault(entity, set()).add(entity_id)
+    return select(SyncLog.entity, SyncLog.entity_id, SyncLog.seq, SyncLog.deleted, SyncLog.revision_id).where(
+        or_(*(and_(SyncLog.entity == entity, SyncLog.entity_id.in_(ids)) for entity, ids in by_entity.items()))
+    )
+
+
+def _value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+async def _load(db: AsyncSession, entity: str, ids) -> list:
+    key = ENTITIES[entity][1]
+    records = []
+    for row in (await db.execute(rows_query(entity, ids))).mappings():
+        data = {name: _value(value) for name, value in row.items() if name != "seq"}
+        records.append({"entity": entity, "id": data[key], "version": row["seq"], "data": data})
+    return records
+
+
+async def changes_since(db: AsyncSession, revision_id: int, cursor: int, limit: int = SYNC_PAGE_SIZE) -> dict:
+    """
+    Změny revize po kurzoru: {"cursor", "more", "changes": [záznam s daty],
+    "deleted": [tombstone]}. Záznamy jsou seřazené shora dolů (rodič před
+    potomkem). Verze načteného záznamu může být novější než kurzor stránky –
+    tablet ho pak dostane znovu, nic se nepřeskočí.
+    """
+    log = (await db.execute(changes_query(revision_id, cursor, limit + 1))).all()
+    more = len(log) > limit
+    log = log[:limit]
+
+    wanted = {}
+    deleted = []
+    for seq, entity, entity_id, is_deleted in log:
+        if is_deleted:
+            deleted.append({"entity": entity, "id": entity_id, "version": seq})
+        else:
+            wanted.setdefault(entity, []).append(entity_id)
+    changes = []
+    for entity in ENTITIES:
+        if entity in wanted:
+            changes += await _load(db, entity, wanted[entity])
+    return {"cursor": log[-1].seq if log else cursor, "more": more, "changes": changes, "deleted": deleted}
+
+
+async def push(db: AsyncSession, revision_id: int, changes) -> dict:
+    """
+    Provede změny tabletu (operace dávky s volitelnou "version") a commitne.
+    Vrací {"created": {ref: id}, "applied": počet, "conflicts": [...],
+    "versions": [...]}; při BatchError se nic neuloží.
+    """
+    if not isinstance(changes, list) or not changes:
+        raise BatchError(None, "changes musí být neprázdný seznam")
+    if len(changes) > BATCH_MAX_OPERATIONS:
+        raise BatchError(None, f"nejvýše {BATCH_MAX_OPERATIONS} operací v dávce")
+
+    # Zápis bez změny zamkne revizi (Postgres řádek, SQLite zápisový zámek) –
+    # mezi kontrolou verzí a zápisem do revize nikdo jiný nezapíše.
+    await db.execute(
+        update(RevisionVersion)
+        .where(RevisionVersion.revision_id == revision_id)
+        .values(version=RevisionVersion.version)
+    )
+    start = await db.scalar(select(func.max(SyncLog.seq)).where(SyncLog.revision_id == revision_id)) or 0
+
+    checked = {}
+    for i, change in enumerate(changes):
+        if not isinstance(change, dict) or change.get("version") is None:
+            continue
+        if not isinstance(change["version"], int) or not isinstance(change.get("id"), int):
+            raise BatchError(i, "version vyžaduje číselné version i id")
+        checked[i] = (change.get("entity"), change["id"])
+    current = {}
+    if checked:
+        rows = await db.execute(versions_query(set(checked.values())))
+        current = {
+            (entity, entity_id): (seq, deleted)
+            for entity, entity_id, seq, deleted, rev_id in rows
+            if rev_id == revision_id
+        }
+
+    conflicts, operations, indexes = [], [], []
+    for i, change in enumerate(changes):
+        entry = current.get(checked.get(i))
+        if entry is not None and (entry[1] or entry[0] > change["version"]):
+            conflicts.append({"index": i, "entity": change["entity"], "id": change["id"],
+                              "version": entry[0], "deleted": bool(entry[1]), "data": None})
+        else:
+            operations.append(change)
+            indexes.append(i)
+
+    result = {"created": {}}
+    if operations:
+        try:
+            result = await run_batch(db, revision_id, operations)
+        except BatchError as exc:
+            if exc.index is not None:
+                exc.index = indexes[exc.index]
+            raise
+
+    # aktuální stav záznamů v konfliktu, aby je tablet mohl sloučit
+    wanted = {}
+    for conflict in conflicts:
+        if not conflict["deleted"]:
+            wanted.setdefault(conflict["entity"], []).append(conflict["id"])
+    loaded = {}
+    for entity, ids in wanted.items():
+        for record in await _load(db, entity, ids):
+            loaded[(entity, record["id"])] = record
+    for conflict in conflicts:
+        record = loaded.get((conflict["entity"], conflict["id"]))
+        if record is not None:
+            conflict["version"], conflict["data"] = record["version"], record["data"]
+
+    # revize je zamčená – všechno po `start` zapsala tahle transakce
+    versions = (await db.execute(changes_query(revision_id, start, None))).all()
+    await db.commit()
+    return {
+        "created": result["created"],
+        "applied": len(operations),
+        "conflicts": conflicts,
+        "versions": [
+            {"entity": entity, "id": entity_id, "version": seq, "deleted": bool(deleted)}
+            for seq, entity, entity_id, deleted in versions
+        ],
+    }
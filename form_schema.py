@@ -0,0 +1,144 @@
+"""
+Cache zkompilovaného schématu formulářů z DropdownConfig / FieldCategory /
+DropdownSource.
+
+Metadata formulářů se mění výjimečně (úpravy v administraci), čtou se při
+každém vykreslení formuláře. Každý proces (worker) si proto drží schéma pro
+entity_type v paměti a databázi se ptá jen na číslo verze – nejvýše jednou
+za FORM_METADATA_POLL_SECONDS. Mezi kontrolami vykreslení formuláře nestojí
+žádný dotaz; po změně verze se cache zahodí a schéma se zkompiluje znovu
+(3 dotazy).
+
+Verzi v tabulce form_metadata_version zvyšují triggery na všech třech
+tabulkách metadat, takže ji posune každý zápis bez ohledu na to, kdo ho
+udělal – a ostatní workery změnu uvidí nejpozději po jednom intervalu.
+"""
+import os
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import DropdownConfig, DropdownSource, FieldCategory, FormMetadataVersion
+
+
+# Jak často (s) se worker ptá databáze na verzi metadat.
+FORM_METADATA_POLL_SECONDS = float(os.getenv("FORM_METADATA_POLL_SECONDS", "2"))
+
+METADATA_TABLES = ("dropdown_sources", "dropdown_config", "field_categories")
+
+# Kategorie polí bez záznamu ve FieldCategory.
+DEFAULT_CATEGORY = "basic"
+
+_schemas = {}  # entity_type -> zkompilované schéma
+_version = None
+_checked_at = None
+
+# Počítadla (benchmarks/form_schema_cache.py).
+stats = {"hits": 0, "compiles": 0, "version_checks": 0, "invalidations": 0}
+
+
+def install(conn):
+    """Řádek s verzí a triggery na tabulkách metadat (volá migrace)."""
+    FormMetadataVersion.__table__.create(bind=conn, checkfirst=True)
+    if conn.execute(select(FormMetadataVersion.id)).first() is None:
+        conn.execute(FormMetadataVersion.__table__.insert().values(id=1, version=1))
+
+    bump = "UPDATE form_metadata_version SET version = version + 1"
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(
+            "CREATE FUNCTION form_metadata_bump() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+            f"{bump}; RETURN NULL; END $$"
+        )
+        for table in METADATA_TABLES:
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {table}_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE "
+                f"ON {table} FOR EACH STATEMENT EXECUTE FUNCTION form_metadata_bump()"
+            )
+        return
+    for table in METADATA_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {table}_bump_version_{event.lower()} AFTER {event} ON {table} "
+                f"BEGIN {bump}; END"
+            )
+
+
+async def _compile(db: AsyncSession, entity_type: str, version: int) -> dict:
+    configs = (await db.scalars(
+        select(DropdownConfig)
+        .where(DropdownConfig.entity_type == entity_type, DropdownConfig.enabled.isnot(False))
+        .order_by(DropdownConfig.display_order, DropdownConfig.id)
+    )).all()
+    categories = (await db.scalars(
+        select(FieldCategory)
+        .where(FieldCategory.entity_type == entity_type)
+        .order_by(FieldCategory.display_order, FieldCategory.id)
+    )).all()
+    sources = {c.dropdown_category for c in configs if c.dropdown_enabled and c.dropdown_category}
+    options = {category: [] for category in sources}
+    if sources:
+        for source in await db.scalars(
+            select(DropdownSource)
+            .where(DropdownSource.category.in_(sources))
+            .order_by(DropdownSource.display_order, DropdownSource.value)
+        ):
+            options[source.category].append(source.value)
+
+    fields = {}
+    by_category = {}
+    for config in configs:
+        category = config.field_category or DEFAULT_CATEGORY
+        field = {
+            "name": config.field_name,
+            "label": config.custom_label or config.field_label or config.field_name,
+            "type": config.field_type or "text",
+            "required": bool(config.is_required),
+            "category": category,
+            "options": options.get(config.dropdown_category) if config.dropdown_enabled else None,
+        }
+        fields[config.field_name] = field
+        by_category.setdefault(category, []).append(field)
+
+    ordered = [
+        {"key": c.category_key, "label": c.category_label, "icon": c.icon, "fields": by_category.pop(c.category_key, [])}
+        for c in categories
+    ]
+    # Pole s kategorií, která ve FieldCategory není, na konec pod klíčem kategorie.
+    ordered.extend(
+        {"key": key, "label": key, "icon": None, "fields": items}
+        for key, items in sorted(by_category.items())
+    )
+    return {"entity_type": entity_type, "version": version, "categories": ordered, "fields": fields}
+
+
+async def get_form_schema(db: AsyncSession, entity_type: str) -> dict:
+    """
+    Schéma formuláře pro entity_type: {"entity_type", "version",
+    "categories": [{"key", "label", "icon", "fields": [...]}],
+    "fields": {field_name: {"name", "label", "type", "required", "category", "options"}}}.
+    Výsledek je sdílený – volající ho nesmí měnit.
+    """
+    global _version, _checked_at
+    now = time.monotonic()
+    if _checked_at is None or now - _checked_at >= FORM_METADATA_POLL_SECONDS:
+        stats["version_checks"] += 1
+        version = await db.scalar(select(FormMetadataVersion.version).where(FormMetadataVersion.id == 1))
+        if version != _version:
+            if _version is not None:
+                stats["invalidations"] += 1
+            _schemas.clear()
+            _version = version
+        _checked_at = now
+
+    schema = _schemas.get(entity_type)
+    if schema is None:
+        stats["compiles"] += 1
+        version = _version
+        schema = await _compile(db, entity_type, version)
+        # Během kompilace mohl jiný požadavek zjistit novější verzi.
+        if version == _version:
+            _schemas[entity_type] = schema
+    else:
+        stats["hits"] += 1
+    return schema
@@ -0,0 +1,195 @@
+"""
+Cache vykreslených tabulek přístrojů a obvodů na detailu rozvaděče.
+
+Tabulky chráničů a ostatních přístrojů s obvody (šablona
+switchboard_devices.html) jsou nejdražší část stránky a mění se mnohem
+méně často, než se stránka zobrazuje – uložení měření, úprava údajů
+rozvaděče ani změny v jiných rozvaděčích revize se jich netýkají.
+
+Každý rozvaděč má v switchboard_versions číslo verze, které triggery zvýší
+při každém zápisu do jeho přístrojů a obvodů (bez ohledu na to, kdo a
+v kterém workeru zapisuje). Worker drží vykreslené HTML pod klíčem
+(ID rozvaděče, verze); detail rozvaděče verzi přečte stejným dotazem jako
+verzi revize pro ETag, a když sedí, přeskočí načítání přístrojů a obvodů
+i vykreslení tabulek.
+
+Cache je LRU omezená velikostí (FRAGMENT_CACHE_MAX_BYTES na worker).
+Zápisové routy přístrojů a obvodů (včetně změny nadřazeného chrániče)
+záznam rozvaděče hned zahodí, aby zastaralé HTML nezabíralo místo do
+vytlačení. Počty zásahů a minutí jsou na /debug/fragment-cache a při
+METRICS_ENABLED=1 i v /metrics.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+import http_cache
+from models import Switchboard, SwitchboardVersion
+
+FRAGMENT_CACHE_MAX_BYTES = int(os.getenv("FRAGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# (tabulka, rozvaděč řádku s prefixem NEW/OLD) – co se vykresluje v tabulkách
+DEVICE_TABLES = (
+    ("switchboard_devices", "{row}.switchboard_id"),
+    ("circuits", "(SELECT switchboard_id FROM switchboard_devices WHERE device_id = {row}.device_id)"),
+)
+
+BUMP = "UPDATE switchboard_versions SET version = version + 1 WHERE switchboard_id"
+# Nový rozvaděč; pokud ID patřilo smazanému rozvaděči, verze pokračuje.
+UPSERT = (
+    "INSERT INTO switchboard_versions (switchboard_id, version) VALUES (NEW.switchboard_id, 1) "
+    "ON CONFLICT (switchboard_id) DO UPDATE SET version = switchboard_versions.version + 1"
+)
+
+
+def install(conn):
+    """Tabulka verzí, verze existujících rozvaděčů a triggery (volá migrace)."""
+    SwitchboardVersion.__table__.create(bind=conn, checkfirst=True)
+    conn.exec_driver_sql(
+        "INSERT INTO switchboard_versions (switchboard_id, version) SELECT switchboard_id, 1 FROM switchboards "
+        "WHERE switchboard_id NOT IN (SELECT switchboard_id FROM switchboard_versions)"
+    )
+
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(
+            "CREATE FUNCTION switchboards_insert_version() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+            f"{UPSERT}; RETURN NULL; END $$"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER switchboards_insert_version AFTER INSERT ON switchboards "
+            "FOR EACH ROW EXECUTE FUNCTION switchboards_insert_version()"
+        )
+        for table, switchboard in DEVICE_TABLES:
+            new, old = switchboard.format(row="NEW"), switchboard.format(row="OLD")
+            conn.exec_driver_sql(
+                f"CREATE FUNCTION {table}_bump_switchboard_version() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+                f"IF TG_OP <> 'DELETE' THEN {BUMP} = {new}; END IF; "
+                f"IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND {old} IS DISTINCT FROM {new}) THEN "
+                f"{BUMP} = {old}; END IF; "
+                "RETURN NULL; END $$"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {table}_bump_switchboard_version AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION {table}_bump_switchboard_version()"
+            )
+        return
+
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER switchboards_fragment_version_insert AFTER INSERT ON switchboards BEGIN {UPSERT}; END"
+    )
+    for table, switchboard in DEVICE_TABLES:
+        new, old = switchboard.format(row="NEW"), switchboard.format(row="OLD")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_fragment_version_insert AFTER INSERT ON {table} BEGIN {BUMP} = {new}; END"
+        )
+        # přesun přístroje do jiného rozvaděče zvýší verzi obou
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_fragment_version_update AFTER UPDATE ON {table} "
+            f"BEGIN {BUMP} IN ({new}, {old}); END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_fragment_version_delete AFTER DELETE ON {table} BEGIN {BUMP} = {old}; END"
+        )
+
+
+def versions_query(switchboard_id, user_id):
+    """
+    SELECT (verze revize pro ETag, verze přístrojů rozvaděče) jedním dotazem,
+    jen pokud rozvaděč patří uživateli.
+    """
+    return (
+        http_cache.version_query(Switchboard, switchboard_id, user_id)
+        .add_columns(SwitchboardVersion.version)
+        .outerjoin(SwitchboardVersion, SwitchboardVersion.switchboard_id == Switchboard.switchboard_id)
+    )
+
+
+class FragmentCache:
+    """LRU HTML fragmentů podle ID rozvaděče; jeden záznam (poslední verze) na rozvaděč."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # switchboard_id -> (verze, html, velikost)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, switchboard_id: int, version: int):
+        with self.lock:
+            entry = self.entries.get(switchboard_id)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(switchboard_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, switchboard_id: int, version: int, html: str):
+        size = sys.getsizeof(html)
+        with self.lock:
+            self._drop(switchboard_id)
+            # fragment větší než celá cache by jen vytlačil všechno ostatní
+            if size > self.max_bytes:
+                return
+            self.entries[switchboard_id] = (version, html, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _version, _html, evicted = self.entries.popitem(last=False)[1]
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, switchboard_id: int):
+        with self.lock:
+            if self._drop(switchboard_id):
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def _drop(self, switchboard_id) -> bool:
+        entry = self.entries.pop(switchboard_id, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[2]
+        return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def exposition(self) -> list:
+        """Řádky pro /metrics (formát Prometheus)."""
+        stats = self.stats()
+        lines = []
+        for name, kind, help_text in (
+            ("hits", "counter", "Zásahy cache tabulek přístrojů rozvaděče."),
+            ("misses", "counter", "Minutí cache tabulek přístrojů rozvaděče."),
+            ("evictions", "counter", "Záznamy vytlačené kvůli velikosti."),
+            ("invalidations", "counter", "Záznamy zahozené zápisovými routami."),
+            ("entries", "gauge", "Počet záznamů v cache."),
+            ("bytes", "gauge", "Velikost záznamů v cache (B)."),
+        ):
+            metric = f"revize_fragment_cache_{name}" + ("_total" if kind == "counter" else "")
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}", f"{metric} {stats[name]}"]
+        return lines
+
+
+cache = FragmentCache(FRAGMENT_CACHE_MAX_BYTES)
@@ -0,0 +1,56 @@
+"""
+Produkční konfigurace gunicornu s uvicorn workery.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Počet workerů: WEB_CONCURRENCY, výchozí počet CPU, ale nejvýše tolik, kolik
+dovolí rozpočet spojení DB_MAX_CONNECTIONS (na worker aspoň dvě spojení –
+viz database.py). Vyšší WEB_CONCURRENCY se sníží a master to zaloguje.
+Aplikace se načte jednou v master procesu (preload_app), tam proběhne
+i bootstrap databáze (migrace, výchozí uživatel) – workery ho díky
+APP_BOOTSTRAPPED přeskočí. Spojení otevřená v masteru se po forku ve
+workerech nepoužijí (post_fork).
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# os.cpu_count() v kontejneru vrací CPU hostitele, ne limit kontejneru.
+MAX_WORKERS = max(1, int(os.getenv("DB_MAX_CONNECTIONS", "20")) // 2)
+requested_workers = int(os.getenv("WEB_CONCURRENCY") or min(os.cpu_count() or 1, MAX_WORKERS))
+workers = max(1, min(requested_workers, MAX_WORKERS))
+worker_class = "app_worker.Worker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+# Prázdná GUNICORN_ACCESS_LOG access log vypne (např. při zátěžových testech).
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+
+# database.py podle počtu workerů dělí rozpočet spojení (DB_MAX_CONNECTIONS);
+# musí to být nastavené dřív, než se v masteru načte aplikace.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+
+def on_starting(server):
+    from database import engine
+    from main import bootstrap
+
+    if workers < requested_workers:
+        server.log.warning(
+            "WEB_CONCURRENCY=%d exceeds the DB_MAX_CONNECTIONS budget, starting %d workers",
+            requested_workers, workers,
+        )
+
+    bootstrap()
+    # Spojení z bootstrapu nesmí zdědit workery.
+    engine.dispose()
+    os.environ["APP_BOOTSTRAPPED"] = "1"
+
+
+def post_fork(server, worker):
+    from database import async_engine, engine
+
+    # Pool zděděný z masteru zahodíme bez zavírání spojení (patří rodiči);
+    # každý worker si otevře vlastní.
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
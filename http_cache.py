@@ -0,0 +1,146 @@
+"""
+HTTP cache detailních stránek revize, rozvaděče a obvodu (ETag / 304).
+
+Každá revize má v revision_versions číslo verze, které triggery zvýší při
+každém zápisu kdekoli v jejím stromu (revize, rozvaděče, přístroje, obvody,
+koncová zařízení i všechna měření) – bez ohledu na to, kdo zapisuje.
+Detailní stránka pak nejdřív jedním dotazem přečte verzi (zároveň ověří
+vlastnictví) a když klient pošle If-None-Match se stejným ETagem, vrátí 304
+bez načítání stromu a bez vykreslení šablony.
+
+ETag je silný: stránka, ID, verze revize a otisk šablon (nové nasazení se
+změněnými šablonami zneplatní všechny ETagy). Verze se čte před načtením
+dat, takže ETag může být nanejvýš starší než obsah, nikdy novější.
+"""
+import hashlib
+import os
+
+from sqlalchemy import select
+from starlette.responses import Response
+
+from models import Revision, RevisionVersion
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Prohlížeč se musí pokaždé zeptat (no-cache), odpověď je jen pro daného uživatele.
+CACHE_CONTROL = "private, no-cache"
+
+# (tabulka, revize řádku s prefixem NEW/OLD) – všechny tabulky stromu revize
+TREE_TABLES = (
+    ("switchboards", "{row}.revision_id"),
+    ("switchboard_measurements",
+     "(SELECT revision_id FROM switchboards WHERE switchboard_id = {row}.switchboard_id)"),
+    ("switchboard_devices", "{row}.revision_id"),
+    ("circuits", "{row}.revision_id"),
+    ("circuit_measurements", "(SELECT revision_id FROM circuits WHERE circuit_id = {row}.circuit_id)"),
+    ("terminal_devices", "{row}.revision_id"),
+    ("terminal_measurements",
+     "(SELECT revision_id FROM terminal_devices WHERE terminal_device_id = {row}.terminal_device_id)"),
+)
+
+BUMP = "UPDATE revision_versions SET version = version + 1 WHERE revision_id"
+# Nový řádek revize; pokud ID patřilo smazané revizi, verze pokračuje.
+UPSERT = (
+    "INSERT INTO revision_versions (revision_id, version) VALUES (NEW.revision_id, 1) "
+    "ON CONFLICT (revision_id) DO UPDATE SET version = revision_versions.version + 1"
+)
+
+
+def _templates_fingerprint() -> str:
+    digest = hashlib.sha1()
+    for root, _dirs, files in sorted(os.walk(TEMPLATES_DIR)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as fh:
+                digest.update(name.encode())
+                digest.update(fh.read())
+    return digest.hexdigest()[:10]
+
+
+TEMPLATES_FINGERPRINT = _templates_fingerprint()
+
+
+def install(conn):
+    """Tabulka verzí, verze existujících revizí a triggery (volá migrace)."""
+    RevisionVersion.__table__.create(bind=conn, checkfirst=True)
+    conn.exec_driver_sql(
+        "INSERT INTO revision_versions (revision_id, version) SELECT revision_id, 1 FROM revisions "
+        "WHERE revision_id NOT IN (SELECT revision_id FROM revision_versions)"
+    )
+
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(
+            "CREATE FUNCTION revisions_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+            f"IF TG_OP = 'INSERT' THEN {UPSERT}; ELSE {BUMP} = NEW.revision_id; END IF; "
+            "RETURN NULL; END $$"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER revisions_bump_version AFTER INSERT OR UPDATE ON revisions "
+            "FOR EACH ROW EXECUTE FUNCTION revisions_bump_version()"
+        )
+        for table, revision in TREE_TABLES:
+            new, old = revision.format(row="NEW"), revision.format(row="OLD")
+            conn.exec_driver_sql(
+                f"CREATE FUNCTION {table}_bump_revision_version() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+                f"IF TG_OP <> 'DELETE' THEN {BUMP} = {new}; END IF; "
+                f"IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND {old} IS DISTINCT FROM {new}) THEN "
+                f"{BUMP} = {old}; END IF; "
+                "RETURN NULL; END $$"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {table}_bump_revision_version AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION {table}_bump_revision_version()"
+            )
+        return
+
+    conn.exec_driver_sql(f"CREATE TRIGGER revisions_version_insert AFTER INSERT ON revisions BEGIN {UPSERT}; END")
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER revisions_version_update AFTER UPDATE ON revisions BEGIN {BUMP} = NEW.revision_id; END"
+    )
+    for table, revision in TREE_TABLES:
+        new, old = revision.format(row="NEW"), revision.format(row="OLD")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_version_insert AFTER INSERT ON {table} BEGIN {BUMP} = {new}; END"
+        )
+        # přesun pod jinou revizi zvýší verzi obou
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_version_update AFTER UPDATE ON {table} "
+            f"BEGIN {BUMP} IN ({new}, {old}); END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_version_delete AFTER DELETE ON {table} BEGIN {BUMP} = {old}; END"
+        )
+
+
+def version_query(model, entity_id, user_id):
+    """
+    SELECT verze revize, do které patří záznam `model` s daným ID, jen pokud
+    revize patří uživateli. `model` je Revision nebo model s revision_id.
+    """
+    stmt = select(RevisionVersion.version).join(Revision, Revision.revision_id == RevisionVersion.revision_id)
+    if model is not Revision:
+        stmt = stmt.join(model, model.revision_id == Revision.revision_id)
+    pk = model.__mapper__.primary_key[0]
+    return stmt.where(pk == entity_id, Revision.user_id == user_id)
+
+
+def etag(page: str, entity_id: int, version: int) -> str:
+    return f'"{page}-{entity_id}-{version}-{TEMPLATES_FINGERPRINT}"'
+
+
+def is_fresh(request, tag: str) -> bool:
+    """Odpovídá If-None-Match požadavku ETagu (včetně seznamu a *)?"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or tag in candidates or f"W/{tag}" in candidates
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": CACHE_CONTROL})
+
+
+def with_etag(response, tag: str):
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
@@ -0,0 +1,380 @@
+"""
+Import měření z exportů měřicích přístrojů (Metrel, Fluke, Sonel – CSV a XML).
+
+Soubor se čte proudově: CSV po řádcích přes csv.reader, XML přes iterparse
+s uvolňováním zpracovaných elementů. Odečty se rovnou slučují podle cíle
+(obvod, resp. koncové zařízení obvodu), takže paměť roste s velikostí
+rozvaděče, ne s počtem odečtů v souboru.
+
+Sloupce / elementy se rozpoznávají podle názvu (ALIASES) bez ohledu na
+velikost písmen, diakritiku, mezery a jednotky v závorkách. Odečet se přiřadí:
+
+- s označením (terminal_device_marking) ke koncovému zařízení obvodu se
+  stejným circuit_number a stejným označením,
+- bez označení k obvodu podle circuit_number.
+
+Více odečtů téhož cíle se slučuje na nejhorší hodnotu (AGGREGATE), stejně
+jako souhrn obvodu z koncových zařízení. Hodnoty se berou v jednotkách,
+v jakých je ukládají formuláře (MΩ, Ω, ms, mA).
+"""
+import csv
+import io
+import re
+import time
+import unicodedata
+from functools import lru_cache
+import xml.etree.ElementTree as ET
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from measurements import chunks, save_measurement_grid
+from models import Circuit, CircuitMeasurement, SwitchboardDevice, TerminalDevice, TerminalMeasurement
+
+
+CIRCUIT = "circuit_number"
+MARKING = "terminal_device_marking"
+# Jedna hodnota impedance smyčky (Zs) plní minimum i maximum.
+LOOP = "loop_impedance"
+
+# Normalizovaný název sloupce -> pole měření (nebo klíč cíle).
+ALIASES = {
+    CIRCUIT: ("circuit", "circuitno", "circuitnumber", "obvod", "cisloobvodu", "okruh", "obwod", "nrobwodu"),
+    MARKING: ("marking", "point", "testpoint", "oznaceni", "misto", "mistomereni", "punkt", "terminaldevicemarking"),
+    LOOP: ("zs", "zloop", "zl", "loopimpedance", "impedancesmycky", "zpetla", "impedancjapetli"),
+    "measurements_circuit_loop_impedance_min": ("zsmin", "zloopmin", "loopimpedancemin"),
+    "measurements_circuit_loop_impedance_max": ("zsmax", "zloopmax", "loopimpedancemax"),
+    "measurements_circuit_insulation_resistance": (
+        "riso", "rins", "insulation", "insulationresistance", "izolacniodpor", "rizo",
+    ),
+    "measurements_circuit_rcd_trip_time_ms": ("trcd", "ta", "triptime", "rcdtriptime", "vybavovacicas", "czaswyzwolenia"),
+    "measurements_circuit_rcd_test_current_ma": ("idn", "iδn", "ideltan", "rcdtestcurrent", "zkusebniproud"),
+    "measurements_circuit_continuity": ("rlow", "rlo", "r2", "rpe", "continuity", "spojitost", "ciaglosc"),
+    "measurements_circuit_earth_resistance": ("re", "ra", "earthresistance", "zemniodpor", "uziemienie"),
+    "measurements_circuit_order_of_phases": ("phaseorder", "phaserotation", "orderofphases", "sledfazi", "kolejnoscfaz"),
+}
+
+# Slučování více odečtů téhož cíle: nejhorší hodnota, u textu poslední.
+AGGREGATE = {
+    "measurements_circuit_loop_impedance_min": min,
+    "measurements_circuit_loop_impedance_max": max,
+    "measurements_circuit_insulation_resistance": min,
+    "measurements_circuit_rcd_trip_time_ms": max,
+    "measurements_circuit_rcd_test_current_ma": max,
+    "measurements_circuit_continuity": max,
+    "measurements_circuit_earth_resistance": max,
+    "measurements_circuit_order_of_phases": None,
+}
+
+TERMINAL_FIELDS = tuple(
+    c.name for c in TerminalMeasurement.__table__.columns if c.name.startswith("measurements_")
+)
+
+# Kolik položek diffu a nespárovaných odečtů vracet (počty jsou vždy úplné).
+SAMPLE_LIMIT = 200
+
+_NUMBER = re.compile(r"[-+]?\d+(?:[.,]\d+)?(?:[eE][-+]?\d+)?")
+
+
+class ExportFormatError(ValueError):
+    """Soubor nelze zpracovat (neznámý formát, chybí sloupec obvodu)."""
+
+
+def normalize(name: str) -> str:
+    name = re.sub(r"\(.*?\)|\[.*?\]", "", name or "")
+    name = unicodedata.normalize("NFKD", name.lower())
+    return "".join(ch for ch in name if ch.isalnum() and not unicodedata.combining(ch))
+
+
+_LOOKUP = {normalize(alias): field for field, aliases in ALIASES.items() for alias in aliases}
+
+
+@lru_cache(maxsize=1024)
+def _field(name):
+    """Pole pro název sloupce / elementu; názvů je v souboru málo, opakují se na každém řádku."""
+    return _LOOKUP.get(normalize(name))
+
+
+def parse_number(value):
+    """'0,45 Ω' -> 0.45, '>999' -> 999.0; bez čísla None."""
+    match = _NUMBER.search(value or "")
+    return float(match.group().replace(",", ".")) if match else None
+
+
+def _reading(raw: dict, stats: dict):
+    """Surový záznam (název -> text) na (circuit_number, marking, {pole: hodnota})."""
+    circuit = marking = None
+    values = {}
+    for name, text in raw.items():
+        field = _field(name)
+        if field is None or text is None:
+            continue
+        text = text.strip()
+        if field == CIRCUIT:
+            circuit = text or None
+        elif field == MARKING:
+            marking = text or None
+        elif not text:
+            continue
+        elif field == "measurements_circuit_order_of_phases":
+            values[field] = text
+        else:
+            number = parse_number(text)
+            if number is None:
+                stats["invalid_values"] += 1
+            elif field == LOOP:
+                values["measurements_circuit_loop_impedance_min"] = number
+                values["measurements_circuit_loop_impedance_max"] = number
+            else:
+                values[field] = number
+    return circuit, marking, values
+
+
+def _merge(target: dict, values: dict):
+    for field, value in values.items():
+        combine = AGGREGATE[field]
+        if field in target and combine is not None:
+            target[field] = combine(target[field], value)
+        else:
+            target[field] = value
+
+
+def _csv_records(text_stream):
+    sample = text_stream.read(8192)
+    text_stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(text_stream, dialect)
+    header = None
+    for row in reader:
+        if header is None:
+            # Exporty mívají před hlavičkou řádky s popisem přístroje;
+            # hlavička je první řádek se sloupcem obvodu.
+            if any(_field(cell) == CIRCUIT for cell in row):
+                header = row
+            continue
+        yield dict(zip(header, row))
+    if header is None:
+        raise ExportFormatError("v CSV chybí sloupec s číslem obvodu")
+
+
+def _leaf_name(elem):
+    return elem.get("name") or elem.get("type") or _local(elem.tag)
+
+
+def _element_fields(elem):
+    """Atributy elementu a jeho listoví potomci (<Zs>0.4</Zs>, <Value name="Zs">0.4</Value>)."""
+    raw = {_local(name): value for name, value in elem.attrib.items()}
+    for child in elem:
+        if len(child) == 0:
+            raw[_leaf_name(child)] = child.text or ""
+    return raw
+
+
+def _is_key(name):
+    return _field(name) in (CIRCUIT, MARKING)
+
+
+def _xml_records(binary_stream):
+    """
+    Záznam je element, jehož atributy nebo listoví potomci obsahují aspoň
+    jednu měřenou veličinu. Číslo obvodu a označení může nést i některý
+    z předků (<Circuit CircuitNo="3"><Point Marking="Z1" Zs="0.4"/></Circuit>).
+    Zpracované podstromy se z rodiče odstraňují, paměť drží jen rozpracovaná větev.
+    """
+    # Pro každý otevřený element jeho číslo obvodu / označení (z atributů
+    # a z už uzavřených listových potomků) – předci se tak neprocházejí znovu.
+    stack, context, has_children = [], [], []
+    for event, elem in ET.iterparse(binary_stream, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            context.append({_local(n): v for n, v in elem.attrib.items() if _is_key(_local(n))})
+            has_children.append(False)
+            continue
+        stack.pop()
+        context.pop()
+        # Zpracované potomky odstraňujeme, len(elem) proto o listu nic neříká.
+        is_leaf = not has_children.pop()
+        if stack:
+            has_children[-1] = True
+        if is_leaf and stack and _is_key(_leaf_name(elem)):
+            context[-1][_leaf_name(elem)] = elem.text or ""
+
+        raw = _element_fields(elem)
+        fields = {_field(name) for name in raw}
+        if not fields - {None, CIRCUIT, MARKING}:
+            if is_leaf:
+                continue  # hodnota v textu nebo atributech; zpracuje ji rodič
+        else:
+            for inherited in reversed(context):
+                for name, text in inherited.items():
+                    field = _field(name)
+                    if field not in fields:
+                        raw[name] = text
+                        fields.add(field)
+            yield raw
+        if stack:
+            stack[-1].remove(elem)
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _detect(binary_stream, filename):
+    head = binary_stream.read(4096)
+    binary_stream.seek(0)
+    if (filename or "").lower().endswith(".xml") or head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"<"):
+        return "xml", None
+    try:
+        head.decode("utf-8")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as exc:
+        # useknutý vícebajtový znak na konci vzorku není chyba kódování
+        encoding = "utf-8-sig" if exc.start >= len(head) - 3 else "cp1250"
+    return "csv", encoding
+
+
+def parse_export(binary_stream, filename=None):
+    """
+    Proudově načte export a sloučí odečty podle cíle. Vrací
+    ({(circuit_number, marking): {pole: hodnota}}, statistiky).
+    Běží synchronně – z async routy volat v threadpoolu.
+    """
+    started = time.perf_counter()
+    fmt, encoding = _detect(binary_stream, filename)
+    stats = {"format": fmt, "readings": 0, "skipped": 0, "invalid_values": 0}
+    if fmt == "xml":
+        records = _xml_records(binary_stream)
+    else:
+        text_stream = io.TextIOWrapper(binary_stream, encoding=encoding, errors="replace", newline="")
+        records = _csv_records(text_stream)
+
+    targets = {}
+    try:
+        for raw in records:
+            circuit, marking, values = _reading(raw, stats)
+            if not values:
+                continue  # prázdný nebo popisný řádek
+            stats["readings"] += 1
+            if circuit is None:
+                stats["skipped"] += 1
+                continue
+            _merge(targets.setdefault((circuit, marking), {}), values)
+    except (ET.ParseError, csv.Error) as exc:
+        raise ExportFormatError(f"poškozený soubor: {exc}")
+    if not stats["readings"]:
+        raise ExportFormatError("soubor neobsahuje žádné rozpoznané odečty")
+
+    elapsed = time.perf_counter() - started
+    stats["parse_ms"] = round(elapsed * 1000, 1)
+    stats["readings_per_s"] = round(stats["readings"] / elapsed) if elapsed else None
+    return targets, stats
+
+
+async def _board(db: AsyncSession, switchboard_id: int):
+    """Obvody rozvaděče podle čísla a koncová zařízení podle (obvod, označení)."""
+    rows = (
+        await db.execute(
+            select(Circuit.circuit_id, Circuit.circuit_number, TerminalDevice.terminal_device_id,
+                   TerminalDevice.terminal_device_marking)
+            .select_from(Circuit)
+            .join(SwitchboardDevice)
+            .outerjoin(TerminalDevice, TerminalDevice.circuit_id == Circuit.circuit_id)
+            .filter(SwitchboardDevice.switchboard_id == switchboard_id)
+        )
+    ).all()
+    circuits, terminals = {}, {}
+    for circuit_id, number, td_id, marking in rows:
+        if number:
+            circuits.setdefault(number.strip(), circuit_id)
+        if td_id is not None and marking:
+            terminals.setdefault((circuit_id, marking.strip()), td_id)
+    return circuits, terminals
+
+
+async def _existing(db: AsyncSession, model, key, ids):
+    result = {}
+    for chunk in chunks(sorted(ids), 500):
+        for row in await db.scalars(select(model).where(getattr(model, key).in_(chunk))):
+            result[getattr(row, key)] = row
+    return result
+
+
+def _changed(old, new):
+    if isinstance(old, float) and isinstance(new, float):
+        return abs(old - new) > 1e-9
+    return old != new
+
+
+async def import_measurements(db: AsyncSession, switchboard_id: int, targets: dict, stats: dict,
+                              dry_run: bool = True) -> dict:
+    """
+    Přiřadí sloučené odečty k obvodům / koncovým zařízením rozvaděče a vrátí
+    diff proti uloženým hodnotám. Bez dry_run je hromadně uloží
+    (save_measurement_grid) a commitne. Vlastnictví rozvaděče ověřuje volající.
+    """
+    circuits, terminals = await _board(db, switchboard_id)
+
+    circuit_rows, terminal_rows, terminal_circuits = {}, {}, {}
+    unmatched = []
+    for (number, marking), values in targets.items():
+        circuit_id = circuits.get(number)
+        td_id = terminals.get((circuit_id, marking)) if marking else None
+        if circuit_id is None or (marking and td_id is None):
+            unmatched.append({"circuit_number": number, "marking": marking})
+            continue
+        circuit_values = values
+        if td_id is not None:
+            # Jen odečty obvodu (např. spojitost) u označeného místa nezakládají
+            # prázdné měření koncového zařízení.
+            terminal_values = {f: v for f, v in values.items() if f in TERMINAL_FIELDS}
+            if terminal_values:
+                terminal_circuits[td_id] = circuit_id
+                terminal_rows[td_id] = terminal_values
+            # Pole, která koncové zařízení nemá (spojitost, Re, sled fází), patří obvodu.
+            circuit_values = {f: v for f, v in values.items() if f not in TERMINAL_FIELDS}
+        if circuit_values:
+            _merge(circuit_rows.setdefault(circuit_id, {}), circuit_values)
+
+    diff = []
+    changes = 0
+    for model, key, rows in (
+        (TerminalMeasurement, "terminal_device_id", terminal_rows),
+        (CircuitMeasurement, "circuit_id", circuit_rows),
+    ):
+        existing = await _existing(db, model, key, rows)
+        for target_id, values in rows.items():
+            current = existing.get(target_id)
+            for field, new in values.items():
+                old = getattr(current, field) if current is not None else None
+                if _changed(old, new):
+                    changes += 1
+                    if len(diff) < SAMPLE_LIMIT:
+                        diff.append({key: target_id, "field": field, "old": old, "new": new})
+
+    result = dict(
+        stats,
+        dry_run=dry_run,
+        circuits=len(circuit_rows),
+        terminal_devices=len(terminal_rows),
+        unmatched=len(unmatched),
+        unmatched_samples=unmatched[:SAMPLE_LIMIT],
+        changes=changes,
+        diff=diff,
+    )
+    if dry_run:
+        return result
+
+    started = time.perf_counter()
+    await save_measurement_grid(
+        db,
+        [{"circuit_id": cid, **values} for cid, values in circuit_rows.items()],
+        [{"terminal_device_id": tid, **values} for tid, values in terminal_rows.items()],
+        terminal_circuits,
+    )
+    await db.commit()
+    result["write_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
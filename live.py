@@ -0,0 +1,514 @@
+"""
+Živé změny revize pro otevřené stránky (Server-Sent Events).
+
+Detail revize, rozvaděče a obvodu se přihlásí na GET /revisions/{id}/events
+a místo opakovaného načítání stránky dostává po každém commitu jednu
+kompaktní zprávu se změnami v revizi: entita, ID, operace (create / update /
+delete), změněná pole s novými hodnotami a nadřazený prvek. Skript v base.html
+hodnoty dosadí do prvků označených data-live; když změnu na stránce doplnit
+nejde (nový nebo smazaný prvek, pole, které stránka nemá jako vstup),
+nabídne obnovení stránky. Vlastní zápisy stránka pozná podle X-Live-Client.
+
+Změny sbírají události ORM session (after_flush); zápisy mimo ORM
+(přepočet souhrnů měření, hromadné upserty) je doplní přes record().
+Revize změny se bere z objektu nebo z nadřazeného objektu v identity map,
+jinak jedním dotazem na flush.
+
+Každý worker má Hub: pro každou revizi množinu odběratelů s omezenou
+frontou hotových SSE zpráv. Zpráva se zakóduje jednou a do front se jen
+vloží. Nečinné spojení nedrží spojení z poolu ani vlastní časovač –
+keepalive komentář rozesílá jediný společný časovač (LIVE_HEARTBEAT_SECONDS).
+Odběratel, který nestíhá číst (plná fronta), dostane místo dalších zpráv
+„resync“ a stránku si obnoví. Posledních LIVE_BUFFER_SIZE zpráv hub drží
+pro navázání po výpadku spojení (Last-Event-ID).
+
+Jak se změny dostanou do hubů, určuje LIVE_BACKEND:
+- memory (výchozí): po commitu rovnou do hubu vlastního workeru; bez
+  odběratelů ve workeru se změny ani nesbírají. Stačí pro jeden worker.
+- database: změny se zapíšou do tabulky live_events ve stejné transakci jako
+  zápis a každý worker, který má odběratele, ji čte jedním dotazem za
+  LIVE_POLL_SECONDS. Rozešle tak zápisy všech workerů i jiných procesů
+  (importy, skripty přes ORM), na SQLite i Postgresu. Zápisy se kvůli tomu
+  nezamykají: seq se na Postgresu přiděluje při INSERTu, takže transakce
+  s nižším seq může commitnout později – poller proto za mezerou v seq
+  čeká, než se doplní, nejdéle LIVE_GAP_SECONDS (pak ji považuje za
+  rollback a pokračuje).
+- off: nic se nesbírá a /revisions/{id}/events vrací 404.
+Jiný přenos (např. Redis pub/sub) je další třída se stejnými metodami.
+"""
+import asyncio
+import json
+import os
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from database import async_engine
+from models import (
+    Circuit,
+    CircuitMeasurement,
+    LiveEvent,
+    Revision,
+    Switchboard,
+    SwitchboardDevice,
+    SwitchboardMeasurement,
+    TerminalDevice,
+    TerminalMeasurement,
+)
+
+LIVE_BACKEND = os.getenv("LIVE_BACKEND", "memory")
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "64"))
+LIVE_BUFFER_SIZE = int(os.getenv("LIVE_BUFFER_SIZE", "1000"))
+LIVE_POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", "0.5"))
+# víc změn v revizi v jedné transakci (import, dávka) se nevypisuje – stránka se obnoví
+LIVE_MAX_CHANGES = int(os.getenv("LIVE_MAX_CHANGES", "200"))
+# kolik posledních řádků live_events nechat (backend database)
+LIVE_EVENTS_KEEP = int(os.getenv("LIVE_EVENTS_KEEP", "10000"))
+
+# jak dlouho poller čeká na chybějící seq (transakce, která ještě necommitla)
+LIVE_GAP_SECONDS = float(os.getenv("LIVE_GAP_SECONDS", "3"))
+
+# za kolik ms se má prohlížeč po výpadku znovu připojit
+RETRY_MS = 3000
+
+# model -> (entita, klíč v událostech, (nadřazená entita, sloupec)).
+# Měření jsou 1:1 ke svému prvku, klíčem je proto ID prvku, ne ID měření.
+ENTITIES = {
+    Revision: ("revision", "revision_id", None),
+    Switchboard: ("switchboard", "switchboard_id", ("revision", "revision_id")),
+    SwitchboardMeasurement: ("switchboard_measurement", "switchboard_id", ("switchboard", "switchboard_id")),
+    SwitchboardDevice: ("switchboard_device", "device_id", ("switchboard", "switchboard_id")),
+    Circuit: ("circuit", "circuit_id", ("switchboard_device", "device_id")),
+    CircuitMeasurement: ("circuit_measurement", "circuit_id", ("circuit", "circuit_id")),
+    TerminalDevice: ("terminal_device", "terminal_device_id", ("circuit", "circuit_id")),
+    TerminalMeasurement: ("terminal_measurement", "terminal_device_id", ("terminal_device", "terminal_device_id")),
+}
+
+# entita -> model, jehož řádek s ID klíče nese revision_id
+REVISION_SOURCE = {
+    "switchboard": Switchboard,
+    "switchboard_measurement": Switchboard,
+    "switchboard_device": SwitchboardDevice,
+    "circuit": Circuit,
+    "circuit_measurement": Circuit,
+    "terminal_device": TerminalDevice,
+    "terminal_measurement": TerminalDevice,
+}
+
+RESYNC = b"event: resync\ndata: {}\n\n"
+HEARTBEAT = b": \n\n"
+
+# ID klienta (stránky) z hlavičky X-Live-Client zapisujícího požadavku
+origin: ContextVar[Optional[str]] = ContextVar("live_origin", default=None)
+
+
+def _json_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def _message(changes, client) -> str:
+    """JSON zprávy pro jednu revizi; velké dávky jen jako pokyn k obnovení stránky."""
+    if len(changes) > LIVE_MAX_CHANGES:
+        payload = {"changes": [], "count": len(changes), "resync": True, "origin": client}
+    else:
+        payload = {"changes": changes, "origin": client}
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class Subscriber:
+    __slots__ = ("revision_id", "queue", "overflowed")
+
+    def __init__(self, revision_id: int, queue_size: int):
+        self.revision_id = revision_id
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+
+class Hub:
+    """Odběratelé tohoto workeru podle revize a poslední rozeslané zprávy."""
+
+    def __init__(self, queue_size: int, buffer_size: int):
+        self.queue_size = queue_size
+        self.subscribers = {}  # revision_id -> {Subscriber}
+        self.recent = deque(maxlen=buffer_size)  # (event_id, revision_id, zpráva)
+        self.last_id = 0
+        self.loop = None
+        self.heartbeat = None
+        self.closing = False
+        self.connections = 0
+        self.events = 0
+        self.deliveries = 0
+        self.resyncs = 0
+
+    def subscribe(self, revision_id: int, last_event_id: Optional[int] = None) -> Subscriber:
+        self.loop = asyncio.get_running_loop()
+        sub = Subscriber(revision_id, self.queue_size)
+        if last_event_id is not None and last_event_id < self.last_id:
+            if self.recent and self.recent[0][0] <= last_event_id + 1:
+                for event_id, rev_id, message in self.recent:
+                    if event_id > last_event_id and rev_id == revision_id:
+                        self._offer(sub, message)
+            else:
+                # zmeškané zprávy už v bufferu nejsou
+                self._overflow(sub)
+        elif last_event_id is not None and last_event_id > self.last_id:
+            # ID z jiného procesu (restart workeru, memory backend) – nevíme, co chybí
+            self._overflow(sub)
+        if self.closing:
+            sub.queue.put_nowait(None)
+        self.subscribers.setdefault(revision_id, set()).add(sub)
+        self.connections += 1
+        if self.heartbeat is None:
+            self.heartbeat = asyncio.create_task(self._heartbeat())
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        subs = self.subscribers.get(sub.revision_id)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self.subscribers[sub.revision_id]
+        self.connections -= 1
+
+    def hello(self) -> bytes:
+        # ID poslední zprávy, aby prohlížeč po výpadku poslal Last-Event-ID i bez přijaté změny
+        return f"retry: {RETRY_MS}\nid: {self.last_id}\n\n".encode()
+
+    def publish(self, revision_id: int, data: str, event_id: Optional[int] = None):
+        """Rozešle zprávu odběratelům revize; volat lze i z jiného vlákna než event loopu."""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(revision_id, data, event_id)
+        else:
+            loop.call_soon_threadsafe(self._deliver, revision_id, data, event_id)
+
+    def _deliver(self, revision_id, data, event_id):
+        if event_id is None:
+            event_id = self.last_id + 1
+        elif event_id <= self.last_id:
+            return
+        self.last_id = event_id
+        message = f"id: {event_id}\nevent: change\ndata: {data}\n\n".encode()
+        self.recent.append((event_id, revision_id, message))
+        self.events += 1
+        for sub in self.subscribers.get(revision_id, ()):
+            self._offer(sub, message)
+
+    def _offer(self, sub: Subscriber, message: bytes):
+        if sub.overflowed:
+            return
+        try:
+            sub.queue.put_nowait(message)
+            self.deliveries += 1
+        except asyncio.QueueFull:
+            self._overflow(sub)
+
+    def _overflow(self, sub: Subscriber):
+        sub.overflowed = True
+        self.resyncs += 1
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(RESYNC)
+
+    async def _heartbeat(self):
+        try:
+            while self.subscribers:
+                await asyncio.sleep(LIVE_HEARTBEAT_SECONDS)
+                for subs in list(self.subscribers.values()):
+                    for sub in subs:
+                        if sub.queue.empty():
+                            sub.queue.put_nowait(HEARTBEAT)
+        finally:
+            self.heartbeat = None
+
+    def close(self):
+        """Ukončí všechna spojení (vypnutí workeru)."""
+        self.closing = True
+        for subs in list(self.subscribers.values()):
+            for sub in subs:
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sub.queue.put_nowait(None)
+
+    def stats(self) -> dict:
+        return {
+            "backend": LIVE_BACKEND,
+            "connections": self.connections,
+            "revisions": len(self.subscribers),
+            "last_event_id": self.last_id,
+            "events": self.events,
+            "deliveries": self.deliveries,
+            "resyncs": self.resyncs,
+            "pid": os.getpid(),
+        }
+
+    def exposition(self) -> list:
+        """Řádky pro /metrics (formát Prometheus)."""
+        stats = self.stats()
+        lines = []
+        for name, kind, help_text in (
+            ("connections", "gauge", "Otevřená SSE spojení ve workeru."),
+            ("events", "counter", "Rozeslané zprávy o změnách."),
+            ("deliveries", "counter", "Zprávy vložené do front odběratelů."),
+            ("resyncs", "counter", "Odběratelé, kteří nestíhali a mají obnovit stránku."),
+        ):
+            metric = f"revize_live_{name}" + ("_total" if kind == "counter" else "")
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}", f"{metric} {stats[name]}"]
+        return lines
+
+
+class MemoryBackend:
+    """Změny jen pro odběratele vlastního workeru, rozeslané po commitu."""
+
+    def collecting(self) -> bool:
+        return hub.connections > 0
+
+    def stage(self, session, changes):
+        # všechny flushe transakce dohromady – jedna zpráva na revizi a commit
+        ready = session.info.setdefault("live_ready", {})
+        for revision_id, items in changes.items():
+            ready.setdefault(revision_id, []).extend(items)
+
+    def committed(self, session, client):
+        for revision_id, items in session.info.pop("live_ready", {}).items():
+            hub.publish(revision_id, _message(items, client))
+
+    async def prepare(self):
+        pass
+
+    def subscribed(self):
+        pass
+
+
+def poll_query(last_seq: int):
+    """Nové zprávy v live_events (backend database)."""
+    return (
+        select(LiveEvent.seq, LiveEvent.revision_id, LiveEvent.payload)
+        .where(LiveEvent.seq > last_seq)
+        .order_by(LiveEvent.seq)
+    )
+
+
+def prune_query(last_seq: int):
+    return delete(LiveEvent).where(LiveEvent.seq <= last_seq - LIVE_EVENTS_KEEP)
+
+
+class DatabaseBackend:
+    """Změny přes tabulku live_events, kterou čte každý worker s odběrateli."""
+
+    def __init__(self):
+        self.poller = None
+        self.last_seq = None
+        self.gap_since = None  # od kdy poller čeká na seq last_seq + 1
+
+    def collecting(self) -> bool:
+        return True
+
+    def stage(self, session, changes):
+        # ve stejné transakci jako zápis – rollback zahodí i zprávu
+        client = session.info.get("live_origin")
+        session.connection().execute(
+            insert(LiveEvent),
+            [{"revision_id": rev_id, "payload": _message(items, client)} for rev_id, items in changes.items()],
+        )
+
+    def committed(self, session, client):
+        pass
+
+    async def prepare(self):
+        # číslování zpráv je společné všem workerům – hub začne od posledního seq
+        if self.last_seq is None:
+            async with async_engine.connect() as conn:
+                self.last_seq = await conn.scalar(select(func.max(LiveEvent.seq))) or 0
+            hub.last_id = max(hub.last_id, self.last_seq)
+
+    def subscribed(self):
+        if self.poller is None:
+            self.poller = asyncio.create_task(self._poll())
+
+    def _gap_expired(self) -> bool:
+        now = asyncio.get_running_loop().time()
+        if self.gap_since is None:
+            self.gap_since = now
+        return now - self.gap_since >= LIVE_GAP_SECONDS
+
+    async def _poll(self):
+        polls = 0
+        try:
+            while hub.subscribers:
+                await asyncio.sleep(LIVE_POLL_SECONDS)
+                async with async_engine.connect() as conn:
+                    rows = (await conn.execute(poll_query(self.last_seq))).all()
+                    polls += 1
+                    if polls % 600 == 0:
+                        await conn.execute(prune_query(self.last_seq))
+                        await conn.commit()
+                for seq, revision_id, data in rows:
+                    if seq != self.last_seq + 1 and not self._gap_expired():
+                        break
+                    hub.publish(revision_id, data, event_id=seq)
+                    self.last_seq = seq
+                    self.gap_since = None
+        finally:
+            self.poller = None
+
+
+BACKENDS = {"memory": MemoryBackend, "database": DatabaseBackend}
+
+hub = Hub(LIVE_QUEUE_SIZE, LIVE_BUFFER_SIZE)
+backend = BACKENDS[LIVE_BACKEND]() if LIVE_BACKEND != "off" else None
+
+
+async def stream(revision_id: int, last_event_id: Optional[int] = None):
+    """Tělo SSE odpovědi: zprávy o změnách revize, dokud se klient neodpojí."""
+    await backend.prepare()
+    sub = hub.subscribe(revision_id, last_event_id)
+    backend.subscribed()
+    try:
+        yield hub.hello()
+        while True:
+            message = await sub.queue.get()
+            if message is None:
+                return
+            yield message
+            if message is RESYNC:
+                return
+    finally:
+        hub.unsubscribe(sub)
+
+
+def record(db, entity: str, rows, key: str, skip_none: bool = False):
+    """
+    Změny zapsané mimo ORM (hromadný UPDATE / upsert) – řádky jsou slovníky
+    s klíčem `key` a zapsanými poli. S skip_none=True se NULL vynechá
+    (upsert s keep_existing_on_null původní hodnotu nepřepsal).
+    """
+    if backend is None or not backend.collecting():
+        return
+    session = db.sync_session
+    pending = session.info.setdefault("live_pending", [])
+    for row in rows:
+        fields = {
+            name: _json_value(value)
+            for name, value in row.items()
+            if name != key and not (skip_none and value is None)
+        }
+        if fields:
+            pending.append([None, {"entity": entity, "id": row[key], "op": "update", "fields": fields}])
+
+
+def _change(obj, op):
+    entity, key, parent = ENTITIES[type(obj)]
+    state = inspect(obj)
+    values = state.dict
+    change = {"entity": entity, "id": values.get(key), "op": op}
+    if op == "create":
+        change["fields"] = {
+            attr.key: _json_value(values[attr.key])
+            for attr in state.mapper.column_attrs
+            if values.get(attr.key) is not None
+        }
+    elif op == "update":
+        fields = {}
+        for attr in state.mapper.column_attrs:
+            history = state.attrs[attr.key].history
+            if history.has_changes():
+                fields[attr.key] = _json_value(history.added[0] if history.added else None)
+        if not fields:
+            return None
+        change["fields"] = fields
+    if parent is not None and values.get(parent[1]) is not None:
+        change["parent"] = f"{parent[0]}:{values[parent[1]]}"
+    # měření revision_id nemají – doplní je _resolve
+    return [values.get("revision_id"), change]
+
+
+def _resolve(session):
+    """Doplní revizi změnám, které ji nemají: z identity map, zbytek jedním dotazem na model."""
+    pending = session.info.get("live_pending")
+    if not pending:
+        return
+    missing = {}
+    for item in pending:
+        if item[0] is not None:
+            continue
+        model = REVISION_SOURCE[item[1]["entity"]]
+        key = model.__mapper__.identity_key_from_primary_key((item[1]["id"],))
+        obj = session.identity_map.get(key)
+        revision_id = obj.__dict__.get("revision_id") if obj is not None else None
+        if revision_id is not None:
+            item[0] = revision_id
+        else:
+            missing.setdefault(model, set()).add(item[1]["id"])
+    found = {}
+    for model, ids in missing.items():
+        pk = model.__mapper__.primary_key[0]
+        rows = session.connection().execute(select(pk, model.revision_id).where(pk.in_(ids)))
+        found[model] = dict(rows.all())
+    for item in pending:
+        if item[0] is None:
+            item[0] = found.get(REVISION_SOURCE[item[1]["entity"]], {}).get(item[1]["id"])
+
+
+def _stage(session):
+    pending = session.info.get("live_pending")
+    if not pending:
+        return
+    _resolve(session)
+    by_revision = {}
+    for revision_id, change in pending:
+        if revision_id is not None:
+            by_revision.setdefault(revision_id, []).append(change)
+    pending.clear()
+    if by_revision:
+        backend.stage(session, by_revision)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    if backend is None or not backend.collecting():
+        return
+    pending = session.info.setdefault("live_pending", [])
+    session.info["live_origin"] = origin.get()
+    for objects, op in ((session.new, "create"), (session.dirty, "update"), (session.deleted, "delete")):
+        for obj in objects:
+            if type(obj) in ENTITIES:
+                item = _change(obj, op)
+                if item is not None:
+                    pending.append(item)
+    _stage(session)
+
+
+@event.listens_for(Session, "before_commit")
+def _stage_recorded(session):
+    # změny z record() po posledním flushi
+    if backend is not None and session.info.get("live_pending"):
+        session.info.setdefault("live_origin", origin.get())
+        _stage(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    session.info.pop("live_pending", None)
+    client = session.info.pop("live_origin", None)
+    if backend is not None:
+        backend.committed(session, client)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    for name in ("live_pending", "live_ready", "live_origin"):
+        session.info.pop(name, None)
@@ -0,0 +1,45 @@
+"""
+Profily načítání vazeb (loader options) pro jednotlivé stránky.
+
+Async session neumí líné načítání, a i kdyby uměla, každá vazba dotčená
+v šabloně by znamenala další dotaz (N+1). Každý profil proto popisuje, co
+daná stránka vykreslí, a načte to pevným počtem dotazů bez ohledu na počet
+koncových zařízení, přístrojů nebo rozvaděčů:
+
+- vazby 1:1 a N:1 (měření, nadřazený přístroj/rozvaděč/revize) přes joinedload
+  – přidají jen JOIN do hlavního dotazu,
+- kolekce (rozvaděče revize, koncová zařízení obvodu) přes selectinload
+  – jeden dotaz IN (...) na celou kolekci.
+"""
+from sqlalchemy.orm import joinedload, selectinload, undefer_group
+
+from models import Revision, Switchboard, SwitchboardDevice, Circuit, TerminalDevice
+
+
+# Revize + seznam rozvaděčů: 2 dotazy.
+REVISION_DETAIL = (
+    undefer_group("texts"),
+    selectinload(Revision.switchboards),
+)
+
+# Formulář úpravy revize: 1 dotaz včetně textových polí.
+REVISION_FORM = (
+    undefer_group("texts"),
+)
+
+# Rozvaděč + revize + měření rozvaděče: 1 dotaz
+# (přístroje a obvody načítá route zvlášť kvůli řazení – další 2 dotazy).
+SWITCHBOARD_DETAIL = (
+    joinedload(Switchboard.revision),
+    joinedload(Switchboard.measurements),
+)
+
+# Obvod + měření + přístroj + rozvaděč + revize: 1 dotaz,
+# koncová zařízení i s jejich měřením: 1 dotaz.
+CIRCUIT_DETAIL = (
+    joinedload(Circuit.measurements),
+    joinedload(Circuit.device)
+    .joinedload(SwitchboardDevice.switchboard)
+    .joinedload(Switchboard.revision),
+    selectinload(Circuit.terminal_devices).joinedload(TerminalDevice.measurements),
+)
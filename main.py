@@ -1,16 +1,37 @@
 import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from typing import Optional
 
-from fastapi import FastAPI, Request, Depends, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import Body, FastAPI, File, Request, Depends, Form, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from markupsafe import Markup
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import delete, select
 from passlib.hash import bcrypt
 
-from database import engine, Base, get_db
+from database import SessionLocal, AsyncSessionLocal, async_engine, engine, get_async_db, pool_stats
+import autocomplete
+import delta_sync
+import fragment_cache
+import http_cache
+import importer
+import live
+import loaders
+import metrics
+from batch import BatchError, apply_batch
+from cloning import clone_revision
+from measurements import recompute_circuit_measurement, save_measurement_grid
+from form_schema import get_form_schema
+from migrations import migrate
+from pagination import REVISIONS_PAGE_SIZE, CursorError, revisions_page
+from schemas import MeasurementGridIn
+from search import search
 from models import (
     User,
     Revision,
@@ -23,61 +44,96 @@ from models import (
     TerminalMeasurement,
 )
 
-app = FastAPI(title="Revizní app – clean v2")
-
-Base.metadata.create_all(bind=engine)
-
-
-def auto_migrate():
-    """Simple idempotent migrations for new columns."""
-    from database import SessionLocal
+def bootstrap() -> User:
+    """
+    Jednorázová příprava databáze: migrace schématu a výchozí uživatel.
+    Pod gunicornem ji volá master proces jednou před spuštěním workerů
+    (gunicorn.conf.py), jinak lifespan při startu aplikace.
+    """
+    migrate()
     db = SessionLocal()
     try:
-        # Add cable columns to terminal_devices if they do not exist
-        db.execute(text(
-            "ALTER TABLE terminal_devices "
-            "ADD COLUMN IF NOT EXISTS terminal_device_cable VARCHAR(255);"
-        ))
-        db.execute(text(
-            "ALTER TABLE terminal_devices "
-            "ADD COLUMN IF NOT EXISTS terminal_device_cable_installation_method VARCHAR(255);"
-        ))
-        # Add quantity column to terminal_devices if it does not exist
-        db.execute(text(
-            "ALTER TABLE terminal_devices "
-            "ADD COLUMN IF NOT EXISTS terminal_device_quantity INTEGER;"
-        ))
-        db.commit()
-        print("Auto-migration completed.")
-    except Exception as e:
-        db.rollback()
-        print("Auto-migration error:", e)
+        return ensure_default_user(db)
     finally:
         db.close()
 
 
-auto_migrate()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schéma a výchozího uživatele připravujeme jednou při startu, ne při každém
+    # požadavku. Když už bootstrap proběhl v master procesu, workery ho přeskočí.
+    if os.getenv("APP_BOOTSTRAPPED") != "1":
+        user = bootstrap()
+        _user_cache[user.user_id] = user.user_id
+
+    # První spojení async engine inicializuje dialekt pod zámkem; při souběhu
+    # prvních požadavků ve workeru by se event loop zablokoval. Navážeme ho hned.
+    async with async_engine.connect():
+        pass
+    yield
+    live.hub.close()
+    # Spojení v poolu (u aiosqlite i jejich vlákna) zavřeme, jinak by držela proces.
+    await async_engine.dispose()
 
 
+app = FastAPI(title="Revizní app – clean v2", lifespan=lifespan)
 
 templates = Jinja2Templates(directory="templates")
+# Pole s našeptávačem – base.html k nim připojí datalist plněný z /api/autocomplete.
+templates.env.globals["autocomplete_fields"] = list(autocomplete.AUTOCOMPLETE_FIELDS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
     raise RuntimeError("SECRET_KEY environment variable must be set")
-app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+
+DEFAULT_USER_ID = 1
+
+# Cache ověřených uživatelů v rámci procesu: user_id ze session -> user_id.
+# Výchozí uživatel se vloží při startu, ostatní při prvním požadavku dané session,
+# takže běžný požadavek kvůli uživateli do databáze nesahá. Ukládají se jen
+# existující uživatelé; zápis uživatele volá invalidate_user_cache.
+_user_cache: dict = {}
+_current_user_id: ContextVar[int] = ContextVar("current_user_id", default=DEFAULT_USER_ID)
 
 
 def get_current_user_id() -> int:
-    return 1
+    return _current_user_id.get()
+
+
+def invalidate_user_cache(user_id: Optional[int] = None):
+    """
+    Zahodí záznam uživatele z cache (bez argumentu celou cache) – volat po
+    smazání nebo změně uživatele, aby se při dalším požadavku znovu ověřil.
+    """
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(user_id, None)
+
+
+async def resolve_user_id(request: Request) -> int:
+    session_user_id = request.session.get("user_id", DEFAULT_USER_ID)
+    cached = _user_cache.get(session_user_id)
+    if cached is not None:
+        return cached
+
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(
+            select(User.user_id).filter(User.user_id == session_user_id)
+        )
+    if user_id is None:
+        # neexistující uživatel se necachuje – po jeho založení se najde hned
+        return DEFAULT_USER_ID
+    _user_cache[session_user_id] = user_id
+    return user_id
 
 
 def ensure_default_user(db: Session) -> User:
-    user = db.query(User).filter(User.user_id == 1).first()
+    user = db.query(User).filter(User.user_id == DEFAULT_USER_ID).first()
     if not user:
         user = User(
-            user_id=1,
+            user_id=DEFAULT_USER_ID,
             username="demo",
             email="demo@example.com",
             password_hash=bcrypt.hash("demo"),
@@ -85,16 +141,41 @@ def ensure_default_user(db: Session) -> User:
         db.add(user)
         db.commit()
         db.refresh(user)
+        invalidate_user_cache(DEFAULT_USER_ID)
     return user
 
 
-@app.middleware("http")
-async def add_default_user(request: Request, call_next):
-    db = next(get_db())
-    ensure_default_user(db)
-    db.close()
-    response = await call_next(request)
-    return response
+class CurrentUserMiddleware:
+    """
+    Nastaví přihlášeného uživatele (a ID stránky pro live.py) pro celý požadavek.
+    Čistý ASGI middleware: BaseHTTPMiddleware by každé SSE spojení
+    (/revisions/{id}/events) obalil další úlohou a frontou pro každou zprávu.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Statické soubory uživatele nepotřebují.
+        if scope["type"] == "http" and not scope["path"].startswith("/static"):
+            request = Request(scope)
+            _current_user_id.set(await resolve_user_id(request))
+            # stránka, ze které zápis přišel – její vlastní změny jí live nepošle zpět
+            live.origin.set(request.headers.get("x-live-client"))
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(CurrentUserMiddleware)
+# SessionMiddleware musí obalovat CurrentUserMiddleware (čte request.session),
+# proto se registruje až po něm.
+app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+
+# Měření požadavků a SQL (METRICS_ENABLED=1) – jako poslední, tedy nejvnější
+# middleware, aby čas zahrnoval i session a ověření uživatele.
+if metrics.METRICS_ENABLED:
+    metrics.install(app, templates, (engine, async_engine.sync_engine))
+    metrics.collectors.append(fragment_cache.cache.exposition)
+    metrics.collectors.append(live.hub.exposition)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -102,29 +183,103 @@ async def index(request: Request):
     return RedirectResponse(url="/revisions", status_code=303)
 
 
+@app.get("/debug/pool")
+async def debug_pool():
+    # Statistiky poolu spojení tohoto workeru (pro nastavení DB_POOL_SIZE).
+    return pool_stats()
+
+
+@app.get("/debug/fragment-cache")
+async def debug_fragment_cache():
+    # Zásahy/minutí cache tabulek přístrojů tohoto workeru (pro FRAGMENT_CACHE_MAX_BYTES).
+    return fragment_cache.cache.stats()
+
+
+@app.get("/debug/live")
+async def debug_live():
+    # Otevřená SSE spojení a rozeslané zprávy tohoto workeru (viz live.py).
+    return live.hub.stats()
+
+
+@app.get("/api/form-schema/{entity_type}")
+async def api_form_schema(entity_type: str, db: AsyncSession = Depends(get_async_db)):
+    # Konfigurace polí formuláře (popisky, pořadí, viditelnost, hodnoty
+    # rozbalovacích seznamů) z cache workeru, viz form_schema.py.
+    return await get_form_schema(db, entity_type)
+
+
+@app.get("/api/autocomplete/{field}")
+async def api_autocomplete(
+    field: str, q: str = "", limit: int = autocomplete.AUTOCOMPLETE_LIMIT,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Našeptávač dříve zadaných hodnot pole seřazený podle četnosti (autocomplete.py).
+    try:
+        values = await autocomplete.complete(db, field, q, limit)
+    except KeyError:
+        return JSONResponse({"error": f"pole {field!r} nemá našeptávač"}, status_code=404)
+    return {"field": field, "q": q, "values": values}
+
+
 @app.get("/revisions", response_class=HTMLResponse)
-async def revisions_list(request: Request, db: Session = Depends(get_db)):
+async def revisions_list(
+    request: Request, cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_db)
+):
     user_id = get_current_user_id()
-    revisions = (
-        db.query(Revision)
-        .filter(Revision.user_id == user_id)
-        .order_by(Revision.revision_id.desc())
-        .all()
-    )
+    try:
+        revisions, next_cursor = await revisions_page(db, user_id, cursor)
+    except CursorError:
+        return RedirectResponse(url="/revisions", status_code=303)
     return templates.TemplateResponse(
         "revisions_list.html",
         {
             "request": request,
             "revisions": revisions,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+        },
+    )
+
+
+@app.get("/api/revisions")
+async def api_revisions(
+    cursor: Optional[str] = None,
+    limit: int = REVISIONS_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Stejná data jako seznam revizí; další stránka přes ?cursor=<next_cursor>.
+    user_id = get_current_user_id()
+    try:
+        rows, next_cursor = await revisions_page(db, user_id, cursor, limit)
+    except CursorError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=400)
+    return {
+        "items": [dict(row._mapping) for row in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+@app.get("/search", response_class=HTMLResponse)
+async def search_page(request: Request, q: str = "", db: AsyncSession = Depends(get_async_db)):
+    # Fulltext přes revize, rozvaděče, obvody a koncová zařízení (search.py).
+    user_id = get_current_user_id()
+    results = await search(db, user_id, q)
+    return templates.TemplateResponse(
+        "search.html",
+        {
+            "request": request,
+            "q": q,
+            "results": results,
         },
     )
 
 
 @app.get("/revisions/create", response_class=HTMLResponse)
-async def revision_create_form(request: Request):
+async def revision_create_form(request: Request, db: AsyncSession = Depends(get_async_db)):
+    form = await get_form_schema(db, "revision")
     return templates.TemplateResponse(
         "revision_form.html",
-        {"request": request, "revision": None},
+        {"request": request, "revision": None, "form_fields": form["fields"]},
     )
 
 
@@ -132,49 +287,30 @@ async def revision_create_form(request: Request):
 async def revision_create(
     request: Request,
     revision_name: str = Form(...),
-    client_name: str = Form(""),
-    client_address: str = Form(""),
-    client_ic: str = Form(""),
-    client_dic: str = Form(""),
-    building_name: str = Form(""),
-    building_address: str = Form(""),
-    building_parcel_number: str = Form(""),
-    building_description: str = Form(""),
-    db: Session = Depends(get_db),
+    revision_code: str = Form(""),
+    revision_address: str = Form(""),
+    revision_short_description: str = Form(""),
+    db: AsyncSession = Depends(get_async_db),
 ):
     user_id = get_current_user_id()
+    # Revize, výchozí rozvaděč i jeho měření vzniknou přes kaskády vazeb
+    # jedním flushem a jedním commitem.
     rev = Revision(
         user_id=user_id,
         revision_name=revision_name,
-        client_name=client_name or None,
-        client_address=client_address or None,
-        client_ic=client_ic or None,
-        client_dic=client_dic or None,
-        building_name=building_name or None,
-        building_address=building_address or None,
-        building_parcel_number=building_parcel_number or None,
-        building_description=building_description or None,
+        revision_code=revision_code or None,
+        revision_address=revision_address or None,
+        revision_short_description=revision_short_description or None,
+        switchboards=[
+            Switchboard(
+                switchboard_name="Rozvaděč 1",
+                switchboard_order=1,
+                measurements=SwitchboardMeasurement(),
+            )
+        ],
     )
     db.add(rev)
-    db.commit()
-    db.refresh(rev)
-
-    sb = Switchboard(
-        revision_id=rev.revision_id,
-        switchboard_name="Rozvaděč 1",
-        switchboard_location=None,
-        switchboard_description=None,
-        switchboard_order=1,
-    )
-    db.add(sb)
-    db.commit()
-    db.refresh(sb)
-
-    meas = SwitchboardMeasurement(
-        switchboard_id=sb.switchboard_id,
-    )
-    db.add(meas)
-    db.commit()
+    await db.commit()
 
     return RedirectResponse(
         url=f"/revisions/{rev.revision_id}", status_code=303
@@ -183,50 +319,76 @@ async def revision_create(
 
 @app.get("/revisions/{revision_id}", response_class=HTMLResponse)
 async def revision_detail(
-    revision_id: int, request: Request, db: Session = Depends(get_db)
+    revision_id: int, request: Request, db: AsyncSession = Depends(get_async_db)
 ):
     user_id = get_current_user_id()
-    rev = (
-        db.query(Revision)
+    # Verze stromu revize – při shodě s If-None-Match se nic dalšího nenačítá.
+    version = await db.scalar(http_cache.version_query(Revision, revision_id, user_id))
+    tag = http_cache.etag("revision", revision_id, version) if version is not None else None
+    if tag and http_cache.is_fresh(request, tag):
+        return http_cache.not_modified(tag)
+
+    rev = await db.scalar(
+        select(Revision)
         .filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
-        .first()
+        .options(*loaders.REVISION_DETAIL)
     )
     if not rev:
         return RedirectResponse(url="/revisions", status_code=303)
 
-    switchboards = (
-        db.query(Switchboard)
-        .filter(Switchboard.revision_id == revision_id)
-        .order_by(Switchboard.switchboard_order.asc())
-        .all()
-    )
-
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "revision_detail.html",
         {
             "request": request,
             "revision": rev,
-            "switchboards": switchboards,
+            "switchboards": rev.switchboards,
         },
     )
+    return http_cache.with_etag(response, tag) if tag else response
+
+
+@app.get("/revisions/{revision_id}/events")
+async def revision_events(
+    revision_id: int, request: Request, db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Server-Sent Events se změnami v revizi (live.py) pro otevřené stránky
+    revize, rozvaděče a obvodu.
+    """
+    user_id = get_current_user_id()
+    owned = await db.scalar(
+        select(Revision.revision_id).filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
+    )
+    # spojení z poolu se vrátí hned, stream ho po dobu odběru nedrží
+    await db.close()
+    if owned is None or live.backend is None:
+        return JSONResponse({"error": "revize neexistuje"}, status_code=404)
+
+    last_event_id = request.headers.get("last-event-id")
+    return StreamingResponse(
+        live.stream(revision_id, int(last_event_id) if last_event_id and last_event_id.isdigit() else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/revisions/{revision_id}/edit", response_class=HTMLResponse)
 async def revision_edit_form(
-    revision_id: int, request: Request, db: Session = Depends(get_db)
+    revision_id: int, request: Request, db: AsyncSession = Depends(get_async_db)
 ):
     user_id = get_current_user_id()
-    rev = (
-        db.query(Revision)
+    rev = await db.scalar(
+        select(Revision)
         .filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
-        .first()
+        .options(*loaders.REVISION_FORM)
     )
     if not rev:
         return RedirectResponse(url="/revisions", status_code=303)
 
+    form = await get_form_schema(db, "revision")
     return templates.TemplateResponse(
         "revision_form.html",
-        {"request": request, "revision": rev},
+        {"request": request, "revision": rev, "form_fields": form["fields"]},
     )
 
 
@@ -234,79 +396,154 @@ async def revision_edit_form(
 async def revision_edit(
     revision_id: int,
     revision_name: str = Form(...),
-    client_name: str = Form(""),
-    client_address: str = Form(""),
-    client_ic: str = Form(""),
-    client_dic: str = Form(""),
-    building_name: str = Form(""),
-    building_address: str = Form(""),
-    building_parcel_number: str = Form(""),
-    building_description: str = Form(""),
-    db: Session = Depends(get_db),
+    revision_code: str = Form(""),
+    revision_address: str = Form(""),
+    revision_short_description: str = Form(""),
+    db: AsyncSession = Depends(get_async_db),
 ):
     user_id = get_current_user_id()
-    rev = (
-        db.query(Revision)
+    rev = await db.scalar(
+        select(Revision)
         .filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
-        .first()
     )
     if not rev:
         return RedirectResponse(url="/revisions", status_code=303)
 
     rev.revision_name = revision_name
-    rev.client_name = client_name or None
-    rev.client_address = client_address or None
-    rev.client_ic = client_ic or None
-    rev.client_dic = client_dic or None
-    rev.building_name = building_name or None
-    rev.building_address = building_address or None
-    rev.building_parcel_number = building_parcel_number or None
-    rev.building_description = building_description or None
-
-    db.commit()
+    rev.revision_code = revision_code or None
+    rev.revision_address = revision_address or None
+    rev.revision_short_description = revision_short_description or None
+
+    await db.commit()
     return RedirectResponse(url=f"/revisions/{revision_id}", status_code=303)
 
 
 @app.post("/revisions/{revision_id}/delete")
 async def revision_delete(
-    revision_id: int, request: Request, db: Session = Depends(get_db)
+    revision_id: int, request: Request, db: AsyncSession = Depends(get_async_db)
 ):
     user_id = get_current_user_id()
-    rev = (
-        db.query(Revision)
+    rev = await db.scalar(
+        select(Revision)
         .filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
-        .first()
     )
     if rev:
-        db.delete(rev)
-        db.commit()
+        await db.delete(rev)
+        await db.commit()
     return RedirectResponse(url="/revisions", status_code=303)
 
 
+@app.post("/revisions/{revision_id}/clone")
+async def revision_clone(
+    revision_id: int,
+    revision_name: str = Form(""),
+    with_measurements: bool = Form(False),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Kopie celé revize jako základ další periodické revize (viz cloning.py).
+    user_id = get_current_user_id()
+    rev_id = await db.scalar(
+        select(Revision.revision_id)
+        .filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
+    )
+    if not rev_id:
+        return RedirectResponse(url="/revisions", status_code=303)
+
+    new_id = await clone_revision(db, revision_id, revision_name or None, with_measurements)
+    return RedirectResponse(url=f"/revisions/{new_id}", status_code=303)
+
+
+@app.post("/revisions/{revision_id}/batch")
+async def revision_batch(
+    revision_id: int,
+    payload: dict = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Dávka create/update/delete operací pro jednu revizi – vše v jedné transakci
+    # (formát viz batch.py). Při chybě se neuloží nic.
+    user_id = get_current_user_id()
+    rev_id = await db.scalar(
+        select(Revision.revision_id)
+        .filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
+    )
+    if not rev_id:
+        return JSONResponse({"error": "revize neexistuje"}, status_code=404)
+
+    try:
+        result = await apply_batch(db, revision_id, payload.get("operations"))
+    except BatchError as exc:
+        await db.rollback()
+        return JSONResponse({"error": exc.message, "operation": exc.index}, status_code=400)
+    return result
+
+
+@app.get("/revisions/{revision_id}/sync")
+async def revision_sync_pull(
+    revision_id: int,
+    cursor: int = 0,
+    limit: int = delta_sync.SYNC_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Změny revize od kurzoru pro offline tablet (formát viz delta_sync.py).
+    user_id = get_current_user_id()
+    rev_id = await db.scalar(
+        select(Revision.revision_id)
+        .filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
+    )
+    if not rev_id:
+        return JSONResponse({"error": "revize neexistuje"}, status_code=404)
+
+    limit = max(1, min(limit, delta_sync.SYNC_PAGE_SIZE))
+    return JSONResponse(await delta_sync.changes_since(db, revision_id, max(0, cursor), limit))
+
+
+@app.post("/revisions/{revision_id}/sync")
+async def revision_sync_push(
+    revision_id: int,
+    payload: dict = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Změny z tabletu s kontrolou konfliktů podle verzí; konfliktní operace
+    # se vrátí s aktuálním stavem záznamu, ostatní se uloží (viz delta_sync.py).
+    user_id = get_current_user_id()
+    rev_id = await db.scalar(
+        select(Revision.revision_id)
+        .filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
+    )
+    if not rev_id:
+        return JSONResponse({"error": "revize neexistuje"}, status_code=404)
+
+    try:
+        result = await delta_sync.push(db, revision_id, payload.get("changes"))
+    except BatchError as exc:
+        await db.rollback()
+        return JSONResponse({"error": exc.message, "operation": exc.index}, status_code=400)
+    return JSONResponse(result)
+
+
 @app.post("/revisions/{revision_id}/switchboards/create")
 async def switchboard_create(
     revision_id: int,
     switchboard_name: str = Form(""),
     switchboard_location: str = Form(""),
     switchboard_description: str = Form(""),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     user_id = get_current_user_id()
-    rev = (
-        db.query(Revision)
+    rev = await db.scalar(
+        select(Revision)
         .filter(Revision.revision_id == revision_id, Revision.user_id == user_id)
-        .first()
     )
     if not rev:
         return RedirectResponse(url="/revisions", status_code=303)
 
-    max_order = (
-        db.query(Switchboard.switchboard_order)
+    max_order = await db.scalar(
+        select(Switchboard.switchboard_order)
         .filter(Switchboard.revision_id == revision_id)
         .order_by(Switchboard.switchboard_order.desc())
-        .first()
+        .limit(1)
     )
-    next_order = (max_order[0] + 1) if max_order else 1
+    next_order = (max_order + 1) if max_order else 1
 
     sb = Switchboard(
         revision_id=revision_id,
@@ -314,14 +551,10 @@ async def switchboard_create(
         switchboard_location=switchboard_location or None,
         switchboard_description=switchboard_description or None,
         switchboard_order=next_order,
+        measurements=SwitchboardMeasurement(),
     )
     db.add(sb)
-    db.commit()
-    db.refresh(sb)
-
-    meas = SwitchboardMeasurement(switchboard_id=sb.switchboard_id)
-    db.add(meas)
-    db.commit()
+    await db.commit()
 
     return RedirectResponse(
         url=f"/revisions/{revision_id}", status_code=303
@@ -330,77 +563,180 @@ async def switchboard_create(
 
 @app.post("/switchboards/{switchboard_id}/delete")
 async def switchboard_delete(
-    switchboard_id: int, request: Request, db: Session = Depends(get_db)
+    switchboard_id: int, request: Request, db: AsyncSession = Depends(get_async_db)
 ):
     user_id = get_current_user_id()
-    sb = (
-        db.query(Switchboard)
+    sb = await db.scalar(
+        select(Switchboard)
         .join(Revision)
         .filter(
             Switchboard.switchboard_id == switchboard_id,
             Revision.user_id == user_id,
         )
-        .first()
     )
     if sb:
         revision_id = sb.revision_id
-        db.delete(sb)
-        db.commit()
+        await db.delete(sb)
+        await db.commit()
         return RedirectResponse(
             url=f"/revisions/{revision_id}", status_code=303
         )
     return RedirectResponse(url="/revisions", status_code=303)
 
 
+def is_rcd_device(dev: SwitchboardDevice) -> bool:
+    return dev.switchboard_device_residual_current_ma is not None or bool(
+        dev.switchboard_device_type and "RCD" in dev.switchboard_device_type
+    )
+
+
+def build_switchboard_tree(devices, circuits) -> dict:
+    """
+    Předpočítaný pohled na přístroje rozvaděče pro šablonu – jedním průchodem
+    seskupí obvody podle přístroje, rozdělí přístroje na chrániče a ostatní
+    a sestaví strom podřízených přístrojů podle parent_device_id.
+    Šablona pak nemusí pro každý přístroj procházet všechny obvody a přístroje.
+    """
+    circuits_by_device = {}
+    for circ in circuits:
+        circuits_by_device.setdefault(circ.device_id, []).append(circ)
+
+    device_ids = {dev.device_id for dev in devices}
+    children_by_parent = {}
+    rcd_devices = []
+    other_devices = []
+    for dev in devices:
+        if dev.parent_device_id in device_ids:
+            children_by_parent.setdefault(dev.parent_device_id, []).append(dev)
+        if is_rcd_device(dev):
+            rcd_devices.append(dev)
+        else:
+            other_devices.append(dev)
+
+    return {
+        "circuits_by_device": circuits_by_device,
+        "children_by_parent": children_by_parent,
+        "rcd_devices": rcd_devices,
+        "other_devices": other_devices,
+    }
+
+
+def wants_fragment(request: Request) -> bool:
+    """
+    Požadavek z formuláře s data-fragment (base.html): místo přesměrování na
+    celou stránku se vrátí jen změněné prvky, které skript vymění na místě.
+    """
+    return request.headers.get("x-fragment") == "1"
+
+
+def fragment_response(*parts) -> HTMLResponse:
+    return HTMLResponse("".join(parts), headers={"X-Fragment": "1"})
+
+
+async def render_device_rows(db: AsyncSession, switchboard_id: int, device_ids) -> str:
+    """
+    Řádky tabulek přístrojů (switchboard_fragments.html) pro vybrané přístroje
+    rozvaděče. Přístroje se načtou všechny (výběr nadřazeného chrániče, podřízené
+    přístroje chrániče), obvody jen vybraných.
+    """
+    device_ids = {device_id for device_id in device_ids if device_id is not None}
+    devices = (
+        await db.scalars(
+            select(SwitchboardDevice)
+            .filter(SwitchboardDevice.switchboard_id == switchboard_id)
+            .order_by(SwitchboardDevice.switchboard_device_position.asc().nullslast())
+        )
+    ).all()
+    circuits = (
+        await db.scalars(
+            select(Circuit)
+            .filter(Circuit.device_id.in_(device_ids))
+            .order_by(Circuit.circuit_number.asc().nullslast())
+        )
+    ).all()
+
+    tree = build_switchboard_tree(devices, circuits)
+    rows = templates.get_template("switchboard_fragments.html").module
+    parts = []
+    for dev in devices:
+        if dev.device_id not in device_ids:
+            continue
+        if is_rcd_device(dev):
+            parts.append(rows.rcd_row(dev, tree["children_by_parent"].get(dev.device_id, [])))
+        else:
+            parts.append(rows.device_row(
+                dev, tree["circuits_by_device"].get(dev.device_id, []), tree["rcd_devices"]
+            ))
+    return "".join(parts)
+
+
 @app.get("/switchboards/{switchboard_id}", response_class=HTMLResponse)
 async def switchboard_detail(
-    switchboard_id: int, request: Request, db: Session = Depends(get_db)
+    switchboard_id: int, request: Request, db: AsyncSession = Depends(get_async_db)
 ):
     user_id = get_current_user_id()
-    sb = (
-        db.query(Switchboard)
+    versions = (await db.execute(fragment_cache.versions_query(switchboard_id, user_id))).first()
+    version, devices_version = versions if versions else (None, None)
+    tag = http_cache.etag("switchboard", switchboard_id, version) if version is not None else None
+    if tag and http_cache.is_fresh(request, tag):
+        return http_cache.not_modified(tag)
+
+    sb = await db.scalar(
+        select(Switchboard)
         .join(Revision)
         .filter(
             Switchboard.switchboard_id == switchboard_id,
             Revision.user_id == user_id,
         )
-        .first()
+        .options(*loaders.SWITCHBOARD_DETAIL)
     )
     if not sb:
         return RedirectResponse(url="/revisions", status_code=303)
 
-    meas = (
-        db.query(SwitchboardMeasurement)
-        .filter(SwitchboardMeasurement.switchboard_id == switchboard_id)
-        .first()
-    )
-
-    devices = (
-        db.query(SwitchboardDevice)
-        .filter(SwitchboardDevice.switchboard_id == switchboard_id)
-        .order_by(SwitchboardDevice.switchboard_device_position.asc().nullslast())
-        .all()
-    )
-
-    circuits = (
-        db.query(Circuit)
-        .join(SwitchboardDevice, Circuit.device_id == SwitchboardDevice.device_id)
-        .filter(SwitchboardDevice.switchboard_id == switchboard_id)
-        .order_by(Circuit.circuit_number.asc().nullslast())
-        .all()
-    )
+    # Tabulky přístrojů a obvodů z cache, pokud se od vykreslení nezměnily.
+    devices_html = None
+    if devices_version is not None:
+        devices_html = fragment_cache.cache.get(switchboard_id, devices_version)
+    if devices_html is None:
+        devices_html = Markup(await render_switchboard_devices(db, switchboard_id))
+        if devices_version is not None:
+            fragment_cache.cache.put(switchboard_id, devices_version, devices_html)
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "switchboard_detail.html",
         {
             "request": request,
             "switchboard": sb,
-            "measurement": meas,
-            "devices": devices,
-            "circuits": circuits,
+            "measurement": sb.measurements,
             "revision": sb.revision,
+            "devices_html": devices_html,
         },
     )
+    return http_cache.with_etag(response, tag) if tag else response
+
+
+async def render_switchboard_devices(db: AsyncSession, switchboard_id: int) -> str:
+    """Vykreslí tabulky chráničů a přístrojů s obvody rozvaděče (switchboard_devices.html)."""
+    devices = (
+        await db.scalars(
+            select(SwitchboardDevice)
+            .filter(SwitchboardDevice.switchboard_id == switchboard_id)
+            .order_by(SwitchboardDevice.switchboard_device_position.asc().nullslast())
+        )
+    ).all()
+
+    circuits = (
+        await db.scalars(
+            select(Circuit)
+            .join(SwitchboardDevice, Circuit.device_id == SwitchboardDevice.device_id)
+            .filter(SwitchboardDevice.switchboard_id == switchboard_id)
+            .order_by(Circuit.circuit_number.asc().nullslast())
+        )
+    ).all()
+
+    return templates.get_template("switchboard_devices.html").render(
+        devices=devices, circuits=circuits, **build_switchboard_tree(devices, circuits)
+    )
 
 
 @app.post("/switchboards/{switchboard_id}/measurements/save")
@@ -421,25 +757,23 @@ async def switchboard_measurements_save(
     measurements_switchboard_rcd_trip_time_ms: Optional[float] = Form(None),
     measurements_switchboard_rcd_test_current_ma: Optional[float] = Form(None),
     measurements_switchboard_earth_resistance: Optional[float] = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     user_id = get_current_user_id()
-    sb = (
-        db.query(Switchboard)
+    sb = await db.scalar(
+        select(Switchboard)
         .join(Revision)
         .filter(
             Switchboard.switchboard_id == switchboard_id,
             Revision.user_id == user_id,
         )
-        .first()
     )
     if not sb:
         return RedirectResponse(url="/revisions", status_code=303)
 
-    meas = (
-        db.query(SwitchboardMeasurement)
+    meas = await db.scalar(
+        select(SwitchboardMeasurement)
         .filter(SwitchboardMeasurement.switchboard_id == switchboard_id)
-        .first()
     )
     if not meas:
         meas = SwitchboardMeasurement(switchboard_id=switchboard_id)
@@ -491,13 +825,100 @@ async def switchboard_measurements_save(
         measurements_switchboard_earth_resistance
     )
 
-    db.commit()
+    await db.commit()
     return RedirectResponse(url=f"/switchboards/{switchboard_id}", status_code=303)
 
 
+@app.post("/switchboards/{switchboard_id}/measurements/bulk")
+async def switchboard_measurements_bulk(
+    switchboard_id: int,
+    grid: MeasurementGridIn,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Měření všech obvodů a koncových zařízení rozvaděče jedním požadavkem:
+    # jedna kontrola vlastnictví, hromadné upserty, jeden přepočet souhrnů.
+    user_id = get_current_user_id()
+    owned = (
+        await db.execute(
+            select(Circuit.circuit_id, TerminalDevice.terminal_device_id)
+            .select_from(Circuit)
+            .join(SwitchboardDevice)
+            .join(Revision, Revision.revision_id == Circuit.revision_id)
+            .outerjoin(TerminalDevice, TerminalDevice.circuit_id == Circuit.circuit_id)
+            .filter(
+                SwitchboardDevice.switchboard_id == switchboard_id,
+                Revision.user_id == user_id,
+            )
+        )
+    ).all()
+    circuit_ids = {circuit_id for circuit_id, _ in owned}
+    terminal_circuits = {td_id: circuit_id for circuit_id, td_id in owned if td_id is not None}
+
+    # Stejné ID víckrát v požadavku: pozdější hodnoty přepíší dřívější.
+    circuit_rows, terminal_rows = {}, {}
+    for item in grid.circuits:
+        circuit_rows.setdefault(item.circuit_id, {}).update(item.model_dump(exclude_unset=True))
+    for item in grid.terminal_devices:
+        terminal_rows.setdefault(item.terminal_device_id, {}).update(item.model_dump(exclude_unset=True))
+
+    unknown_circuits = sorted(set(circuit_rows) - circuit_ids)
+    unknown_terminals = sorted(set(terminal_rows) - set(terminal_circuits))
+    if unknown_circuits or unknown_terminals:
+        return JSONResponse(
+            {
+                "error": "položky nepatří k rozvaděči",
+                "circuits": unknown_circuits,
+                "terminal_devices": unknown_terminals,
+            },
+            status_code=400,
+        )
+
+    recomputed = await save_measurement_grid(
+        db, list(circuit_rows.values()), list(terminal_rows.values()), terminal_circuits
+    )
+    await db.commit()
+
+    return {
+        "circuits": len(circuit_rows),
+        "terminal_devices": len(terminal_rows),
+        "recomputed_circuits": len(recomputed),
+    }
+
+
+@app.post("/switchboards/{switchboard_id}/import")
+async def switchboard_import(
+    switchboard_id: int,
+    file: UploadFile = File(...),
+    dry_run: bool = Form(True),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Import exportu z měřicího přístroje (CSV/XML, viz importer.py). Výchozí
+    # je dry run – vrátí jen diff proti uloženým hodnotám; dry_run=false uloží.
+    user_id = get_current_user_id()
+    sb_id = await db.scalar(
+        select(Switchboard.switchboard_id)
+        .join(Revision)
+        .filter(
+            Switchboard.switchboard_id == switchboard_id,
+            Revision.user_id == user_id,
+        )
+    )
+    if not sb_id:
+        return JSONResponse({"error": "rozvaděč neexistuje"}, status_code=404)
+
+    try:
+        # Parsování je CPU práce – mimo event loop.
+        targets, stats = await run_in_threadpool(importer.parse_export, file.file, file.filename)
+    except importer.ExportFormatError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=400)
+
+    return await importer.import_measurements(db, switchboard_id, targets, stats, dry_run=dry_run)
+
+
 @app.post("/switchboards/{switchboard_id}/devices/create")
 async def device_create(
     switchboard_id: int,
+    request: Request,
     switchboard_device_position: str = Form(""),
     switchboard_device_type: str = Form(""),
     switchboard_device_manufacturer: str = Form(""),
@@ -507,23 +928,34 @@ async def device_create(
     switchboard_device_residual_current_ma: Optional[float] = Form(None),
     switchboard_device_poles: Optional[int] = Form(None),
     switchboard_device_module_width: Optional[float] = Form(None),
-    db: Session = Depends(get_db),
+    parent_device_id: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
     user_id = get_current_user_id()
-    sb = (
-        db.query(Switchboard)
+    sb = await db.scalar(
+        select(Switchboard)
         .join(Revision)
         .filter(
             Switchboard.switchboard_id == switchboard_id,
             Revision.user_id == user_id,
         )
-        .first()
     )
     if not sb:
         return RedirectResponse(url="/revisions", status_code=303)
 
+    # "+" u přístroje v tabulce zakládá podřízený přístroj – jen ze stejného rozvaděče
+    if parent_device_id is not None:
+        parent_device_id = await db.scalar(
+            select(SwitchboardDevice.device_id).filter(
+                SwitchboardDevice.device_id == parent_device_id,
+                SwitchboardDevice.switchboard_id == switchboard_id,
+            )
+        )
+
     dev = SwitchboardDevice(
         switchboard_id=switchboard_id,
+        revision_id=sb.revision_id,
+        parent_device_id=parent_device_id,
         switchboard_device_position=switchboard_device_position or None,
         switchboard_device_type=switchboard_device_type or None,
         switchboard_device_manufacturer=switchboard_device_manufacturer or None,
@@ -534,104 +966,219 @@ async def device_create(
         switchboard_device_residual_current_ma=switchboard_device_residual_current_ma,
         switchboard_device_poles=switchboard_device_poles,
         switchboard_device_module_width=switchboard_device_module_width,
+        circuits=[Circuit(revision_id=sb.revision_id)],
     )
     db.add(dev)
-    db.commit()
-    db.refresh(dev)
-
-    circ = Circuit(
-        device_id=dev.device_id,
-    )
-    db.add(circ)
-    db.commit()
+    await db.commit()
+    fragment_cache.cache.invalidate(switchboard_id)
 
+    if wants_fragment(request):
+        return fragment_response(
+            await render_device_rows(db, switchboard_id, {dev.device_id, parent_device_id})
+        )
     return RedirectResponse(url=f"/switchboards/{switchboard_id}", status_code=303)
 
 
 @app.post("/devices/{device_id}/delete")
-async def device_delete(device_id: int, db: Session = Depends(get_db)):
+async def device_delete(device_id: int, db: AsyncSession = Depends(get_async_db)):
     user_id = get_current_user_id()
-    dev = (
-        db.query(SwitchboardDevice)
-        .join(Switchboard)
-        .join(Revision)
+    dev = await db.scalar(
+        select(SwitchboardDevice)
+        .join(Revision, Revision.revision_id == SwitchboardDevice.revision_id)
         .filter(
             SwitchboardDevice.device_id == device_id,
             Revision.user_id == user_id,
         )
-        .first()
     )
     if not dev:
         return RedirectResponse(url="/revisions", status_code=303)
 
     switchboard_id = dev.switchboard_id
 
-    db.query(Circuit).filter(Circuit.device_id == device_id).delete()
-    db.delete(dev)
-    db.commit()
+    await db.execute(delete(Circuit).where(Circuit.device_id == device_id))
+    await db.delete(dev)
+    await db.commit()
+    fragment_cache.cache.invalidate(switchboard_id)
     return RedirectResponse(url=f"/switchboards/{switchboard_id}", status_code=303)
 
 
+@app.post("/devices/{device_id}/set-parent")
+async def device_set_parent(
+    device_id: int,
+    request: Request,
+    parent_device_id: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Přiřazení přístroje pod nadřazený přístroj (chránič) stejného rozvaděče,
+    prázdná hodnota vazbu zruší. Vazba nesmí vytvořit cyklus.
+    """
+    user_id = get_current_user_id()
+    dev = await db.scalar(
+        select(SwitchboardDevice)
+        .join(Revision, Revision.revision_id == SwitchboardDevice.revision_id)
+        .filter(
+            SwitchboardDevice.device_id == device_id,
+            Revision.user_id == user_id,
+        )
+    )
+    if not dev:
+        return RedirectResponse(url="/revisions", status_code=303)
+
+    if parent_device_id is not None:
+        parents = dict(
+            (
+                await db.execute(
+                    select(SwitchboardDevice.device_id, SwitchboardDevice.parent_device_id)
+                    .filter(SwitchboardDevice.switchboard_id == dev.switchboard_id)
+                )
+            ).all()
+        )
+        ancestor = parent_device_id
+        while ancestor is not None and ancestor != device_id:
+            ancestor = parents.get(ancestor)
+        if parent_device_id not in parents or ancestor == device_id:
+            return RedirectResponse(url=f"/switchboards/{dev.switchboard_id}", status_code=303)
+
+    previous_parent_id = dev.parent_device_id
+    if previous_parent_id != parent_device_id:
+        dev.parent_device_id = parent_device_id
+        await db.commit()
+        fragment_cache.cache.invalidate(dev.switchboard_id)
+
+    if wants_fragment(request):
+        return fragment_response(
+            await render_device_rows(db, dev.switchboard_id, {device_id, previous_parent_id, parent_device_id})
+        )
+    return RedirectResponse(url=f"/switchboards/{dev.switchboard_id}", status_code=303)
+
+
+@app.post("/devices/{device_id}/circuits/create")
+async def circuit_create(
+    device_id: int,
+    request: Request,
+    circuit_number: str = Form(""),
+    circuit_room: str = Form(""),
+    circuit_description: str = Form(""),
+    circuit_number_of_outlets: Optional[int] = Form(None),
+    circuit_cable: str = Form(""),
+    circuit_cable_installation_method: str = Form(""),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Nový obvod přístroje (drawer na detailu rozvaděče).
+    """
+    user_id = get_current_user_id()
+    dev = await db.scalar(
+        select(SwitchboardDevice)
+        .join(Revision, Revision.revision_id == SwitchboardDevice.revision_id)
+        .filter(
+            SwitchboardDevice.device_id == device_id,
+            Revision.user_id == user_id,
+        )
+    )
+    if not dev:
+        return RedirectResponse(url="/revisions", status_code=303)
+
+    db.add(
+        Circuit(
+            device_id=device_id,
+            revision_id=dev.revision_id,
+            circuit_number=circuit_number or None,
+            circuit_room=circuit_room or None,
+            circuit_description=circuit_description or None,
+            circuit_number_of_outlets=circuit_number_of_outlets,
+            circuit_cable=circuit_cable or None,
+            circuit_cable_installation_method=circuit_cable_installation_method or None,
+        )
+    )
+    await db.commit()
+    fragment_cache.cache.invalidate(dev.switchboard_id)
+
+    if wants_fragment(request):
+        return fragment_response(await render_device_rows(db, dev.switchboard_id, {device_id}))
+    return RedirectResponse(url=f"/switchboards/{dev.switchboard_id}", status_code=303)
+
+
+def summarize_cables(cables) -> list:
+    """Souhrn kabelů obvodu: (kabel, uložení) koncových zařízení -> skupiny s počtem."""
+    agg = {}
+    for cable, installation in cables:
+        if not cable and not installation:
+            continue
+        key = (cable or "", installation or "")
+        agg[key] = agg.get(key, 0) + 1
+    return [
+        {"cable": k[0], "installation": k[1], "count": v}
+        for k, v in agg.items()
+    ]
+
+
+async def render_circuit_rollup(db: AsyncSession, circuit_id: int) -> list:
+    """
+    Karta měření obvodu a počet zásuvek po přepočtu z koncových zařízení
+    (recompute_circuit_measurement zapisuje mimo ORM, proto populate_existing).
+    """
+    row = (
+        await db.execute(
+            select(Circuit.circuit_number_of_outlets, CircuitMeasurement)
+            .outerjoin(CircuitMeasurement, CircuitMeasurement.circuit_id == Circuit.circuit_id)
+            .filter(Circuit.circuit_id == circuit_id)
+            .execution_options(populate_existing=True)
+        )
+    ).one()
+    parts = templates.get_template("circuit_fragments.html").module
+    return [parts.measurement_card(circuit_id, row[1]), parts.outlets_input(row)]
+
+
 @app.get("/circuits/{circuit_id}", response_class=HTMLResponse)
-async def circuit_detail(circuit_id: int, request: Request, db: Session = Depends(get_db)):
+async def circuit_detail(circuit_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Detail obvodu – základní údaje, měření a koncová zařízení.
     """
     user_id = get_current_user_id()
-    circ = (
-        db.query(Circuit)
-        .join(SwitchboardDevice)
-        .join(Switchboard)
-        .join(Revision)
+    version = await db.scalar(http_cache.version_query(Circuit, circuit_id, user_id))
+    tag = http_cache.etag("circuit", circuit_id, version) if version is not None else None
+    if tag and http_cache.is_fresh(request, tag):
+        return http_cache.not_modified(tag)
+
+    circ = await db.scalar(
+        select(Circuit)
+        .join(Revision, Revision.revision_id == Circuit.revision_id)
         .filter(
             Circuit.circuit_id == circuit_id,
             Revision.user_id == user_id,
         )
-        .first()
+        .options(*loaders.CIRCUIT_DETAIL)
     )
 
     if not circ:
         return RedirectResponse(url="/revisions", status_code=303)
 
-    # nacteme merici radek, pokud existuje
-    meas = (
-        db.query(CircuitMeasurement)
-        .filter(CircuitMeasurement.circuit_id == circuit_id)
-        .first()
-    )
-
     # souhrn kabelu podle koncovych zarizeni
-    cable_summary = []
-    if circ and circ.terminal_devices:
-        agg = {}
-        for td in circ.terminal_devices:
-            cable = getattr(td, "terminal_device_cable", None)
-            installation = getattr(td, "terminal_device_cable_installation_method", None)
-            if not cable and not installation:
-                continue
-            key = (cable or "", installation or "")
-            agg[key] = agg.get(key, 0) + 1
-        cable_summary = [
-            {"cable": k[0], "installation": k[1], "count": v}
-            for k, v in agg.items()
-        ]
+    cable_summary = summarize_cables(
+        (td.terminal_device_cable, td.terminal_device_cable_installation_method)
+        for td in circ.terminal_devices
+    )
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "circuit_detail.html",
         {
             "request": request,
             "circuit": circ,
-            "measurement": meas,
+            "measurement": circ.measurements,
             "switchboard": circ.device.switchboard,
             "revision": circ.device.switchboard.revision,
             "cable_summary": cable_summary,
         },
     )
+    return http_cache.with_etag(response, tag) if tag else response
 
 
 @app.post("/circuits/{circuit_id}/edit")
 async def circuit_edit(
     circuit_id: int,
+    request: Request,
     circuit_number: str = Form(""),
     circuit_room: str = Form(""),
     circuit_description: str = Form(""),
@@ -639,25 +1186,26 @@ async def circuit_edit(
     circuit_cable: str = Form(""),
     circuit_cable_termination: str = Form(""),
     circuit_cable_installation_method: str = Form(""),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Uložení základních údajů obvodu.
     """
     user_id = get_current_user_id()
-    circ = (
-        db.query(Circuit)
-        .join(SwitchboardDevice)
-        .join(Switchboard)
-        .join(Revision)
-        .filter(
-            Circuit.circuit_id == circuit_id,
-            Revision.user_id == user_id,
+    row = (
+        await db.execute(
+            select(Circuit, SwitchboardDevice.switchboard_id)
+            .join(Revision, Revision.revision_id == Circuit.revision_id)
+            .join(SwitchboardDevice, SwitchboardDevice.device_id == Circuit.device_id)
+            .filter(
+                Circuit.circuit_id == circuit_id,
+                Revision.user_id == user_id,
+            )
         )
-        .first()
-    )
-    if not circ:
+    ).first()
+    if not row:
         return RedirectResponse(url="/revisions", status_code=303)
+    circ, switchboard_id = row
 
     circ.circuit_number = circuit_number or None
     circ.circuit_room = circuit_room or None
@@ -667,28 +1215,31 @@ async def circuit_edit(
     circ.circuit_cable_termination = circuit_cable_termination or None
     circ.circuit_cable_installation_method = circuit_cable_installation_method or None
 
-    db.commit()
+    await db.commit()
+    fragment_cache.cache.invalidate(switchboard_id)
+
+    # drawer na detailu rozvaděče – obnoví se řádek přístroje s obvodem
+    if wants_fragment(request):
+        return fragment_response(await render_device_rows(db, switchboard_id, {circ.device_id}))
     return RedirectResponse(url=f"/circuits/{circ.circuit_id}", status_code=303)
 
 
 @app.post("/circuits/{circuit_id}/delete")
-async def circuit_delete(circuit_id: int, db: Session = Depends(get_db)):
+async def circuit_delete(circuit_id: int, db: AsyncSession = Depends(get_async_db)):
     user_id = get_current_user_id()
-    circ = (
-        db.query(Circuit)
-        .join(SwitchboardDevice)
-        .join(Switchboard)
-        .join(Revision)
+    circ = await db.scalar(
+        select(Circuit)
+        .join(Revision, Revision.revision_id == Circuit.revision_id)
         .filter(
             Circuit.circuit_id == circuit_id,
             Revision.user_id == user_id,
         )
-        .first()
     )
     if circ:
-        sb_id = circ.device.switchboard_id
-        db.delete(circ)
-        db.commit()
+        sb_id = (await db.get(SwitchboardDevice, circ.device_id)).switchboard_id
+        await db.delete(circ)
+        await db.commit()
+        fragment_cache.cache.invalidate(sb_id)
         return RedirectResponse(url=f"/switchboards/{sb_id}", status_code=303)
     return RedirectResponse(url="/revisions", status_code=303)
 
@@ -696,6 +1247,7 @@ async def circuit_delete(circuit_id: int, db: Session = Depends(get_db)):
 @app.post("/circuits/{circuit_id}/measurements/save")
 async def circuit_measurements_save(
     circuit_id: int,
+    request: Request,
     measurements_circuit_insulation_resistance: Optional[float] = Form(None),
     measurements_circuit_loop_impedance_min: Optional[float] = Form(None),
     measurements_circuit_loop_impedance_max: Optional[float] = Form(None),
@@ -704,27 +1256,23 @@ async def circuit_measurements_save(
     measurements_circuit_earth_resistance: Optional[float] = Form(None),
     measurements_circuit_continuity: Optional[float] = Form(None),
     measurements_circuit_order_of_phases: str = Form(""),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     user_id = get_current_user_id()
-    circ = (
-        db.query(Circuit)
-        .join(SwitchboardDevice)
-        .join(Switchboard)
-        .join(Revision)
+    circ = await db.scalar(
+        select(Circuit)
+        .join(Revision, Revision.revision_id == Circuit.revision_id)
         .filter(
             Circuit.circuit_id == circuit_id,
             Revision.user_id == user_id,
         )
-        .first()
     )
     if not circ:
         return RedirectResponse(url="/revisions", status_code=303)
 
-    meas = (
-        db.query(CircuitMeasurement)
+    meas = await db.scalar(
+        select(CircuitMeasurement)
         .filter(CircuitMeasurement.circuit_id == circuit_id)
-        .first()
     )
     if not meas:
         meas = CircuitMeasurement(circuit_id=circuit_id)
@@ -751,84 +1299,18 @@ async def circuit_measurements_save(
         measurements_circuit_order_of_phases or None
     )
 
-    db.commit()
-    return RedirectResponse(url=f"/circuits/{circuit_id}", status_code=303)
+    await db.commit()
 
-
-
-def recompute_circuit_measurement(db: Session, circuit_id: int):
-    """
-    Přepočet souhrnných hodnot měření obvodu na základě měření koncových zařízení (TerminalMeasurement)
-    a aktualizace počtu zásuvek / ks podle koncových zařízení.
-    """
-    circ = db.query(Circuit).filter(Circuit.circuit_id == circuit_id).first()
-    if not circ:
-        return
-
-    # Přepočet počtu zásuvek / ks z koncových zařízení
-    terminal_devices = (
-        db.query(TerminalDevice)
-        .filter(TerminalDevice.circuit_id == circuit_id)
-        .all()
-    )
-    total_qty = 0
-    for td in terminal_devices:
-        if getattr(td, "terminal_device_quantity", None) is not None:
-            total_qty += td.terminal_device_quantity or 0
-    circ.circuit_number_of_outlets = total_qty or None
-
-    # Přepočet měření z TerminalMeasurement
-    terminal_measurements = (
-        db.query(TerminalMeasurement)
-        .join(TerminalDevice)
-        .filter(TerminalDevice.circuit_id == circuit_id)
-        .all()
-    )
-
-    zs_min_vals = []
-    zs_max_vals = []
-    t_vals = []
-    ir_vals = []
-    riso_vals = []
-
-    for tm in terminal_measurements:
-        if tm.measurements_circuit_loop_impedance_min is not None:
-            zs_min_vals.append(tm.measurements_circuit_loop_impedance_min)
-        if tm.measurements_circuit_loop_impedance_max is not None:
-            zs_max_vals.append(tm.measurements_circuit_loop_impedance_max)
-        if tm.measurements_circuit_rcd_trip_time_ms is not None:
-            t_vals.append(tm.measurements_circuit_rcd_trip_time_ms)
-        if tm.measurements_circuit_rcd_test_current_ma is not None:
-            ir_vals.append(tm.measurements_circuit_rcd_test_current_ma)
-        if tm.measurements_circuit_insulation_resistance is not None:
-            riso_vals.append(tm.measurements_circuit_insulation_resistance)
-
-    meas = (
-        db.query(CircuitMeasurement)
-        .filter(CircuitMeasurement.circuit_id == circuit_id)
-        .first()
-    )
-    if not meas:
-        meas = CircuitMeasurement(circuit_id=circuit_id)
-        db.add(meas)
-
-    if zs_min_vals:
-        meas.measurements_circuit_loop_impedance_min = min(zs_min_vals)
-    if zs_max_vals:
-        meas.measurements_circuit_loop_impedance_max = max(zs_max_vals)
-    if t_vals:
-        meas.measurements_circuit_rcd_trip_time_ms = max(t_vals)
-    if ir_vals:
-        meas.measurements_circuit_rcd_test_current_ma = max(ir_vals)
-    if riso_vals:
-        meas.measurements_circuit_insulation_resistance = min(riso_vals)
-
-    db.commit()
+    if wants_fragment(request):
+        parts = templates.get_template("circuit_fragments.html").module
+        return fragment_response(parts.measurement_card(circuit_id, meas))
+    return RedirectResponse(url=f"/circuits/{circuit_id}", status_code=303)
 
 
 @app.post("/circuits/{circuit_id}/terminal-devices/create")
 async def terminal_device_create(
     circuit_id: int,
+    request: Request,
     terminal_device_type: str = Form(""),
     terminal_device_manufacturer: str = Form(""),
     terminal_device_model: str = Form(""),
@@ -842,28 +1324,26 @@ async def terminal_device_create(
     terminal_device_installation_method: str = Form(""),
     terminal_device_cable: str = Form(""),
     terminal_device_cable_installation_method: str = Form(""),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Vytvoření koncového zařízení pro daný obvod.
     """
     user_id = get_current_user_id()
-    circ = (
-        db.query(Circuit)
-        .join(SwitchboardDevice)
-        .join(Switchboard)
-        .join(Revision)
+    circ = await db.scalar(
+        select(Circuit)
+        .join(Revision, Revision.revision_id == Circuit.revision_id)
         .filter(
             Circuit.circuit_id == circuit_id,
             Revision.user_id == user_id,
         )
-        .first()
     )
     if not circ:
         return RedirectResponse(url="/revisions", status_code=303)
 
     td = TerminalDevice(
         circuit_id=circuit_id,
+        revision_id=circ.revision_id,
         terminal_device_type=terminal_device_type or None,
         terminal_device_manufacturer=terminal_device_manufacturer or None,
         terminal_device_model=terminal_device_model or None,
@@ -879,39 +1359,49 @@ async def terminal_device_create(
         terminal_device_cable_installation_method=terminal_device_cable_installation_method or None,
     )
     db.add(td)
-    db.commit()
-
-    recompute_circuit_measurement(db, circuit_id)
-
+    await recompute_circuit_measurement(db, circuit_id)
+    await db.commit()
+
+    if wants_fragment(request):
+        parts = templates.get_template("circuit_fragments.html").module
+        cables = (
+            await db.execute(
+                select(
+                    TerminalDevice.terminal_device_cable,
+                    TerminalDevice.terminal_device_cable_installation_method,
+                ).filter(TerminalDevice.circuit_id == circuit_id)
+            )
+        ).all()
+        return fragment_response(
+            parts.terminal_row(td, None),
+            parts.terminal_devices_empty(True),
+            parts.cable_summary(summarize_cables(cables)),
+            *await render_circuit_rollup(db, circuit_id),
+        )
     return RedirectResponse(url=f"/circuits/{circuit_id}", status_code=303)
 
 
 @app.post("/terminal-devices/{terminal_device_id}/delete")
 async def terminal_device_delete(
-    terminal_device_id: int, db: Session = Depends(get_db)
+    terminal_device_id: int, db: AsyncSession = Depends(get_async_db)
 ):
     user_id = get_current_user_id()
-    td = (
-        db.query(TerminalDevice)
-        .join(Circuit)
-        .join(SwitchboardDevice)
-        .join(Switchboard)
-        .join(Revision)
+    td = await db.scalar(
+        select(TerminalDevice)
+        .join(Revision, Revision.revision_id == TerminalDevice.revision_id)
         .filter(
             TerminalDevice.terminal_device_id == terminal_device_id,
             Revision.user_id == user_id,
         )
-        .first()
     )
     if not td:
         return RedirectResponse(url="/revisions", status_code=303)
 
     circuit_id = td.circuit_id
 
-    db.delete(td)
-    db.commit()
-
-    recompute_circuit_measurement(db, circuit_id)
+    await db.delete(td)
+    await recompute_circuit_measurement(db, circuit_id)
+    await db.commit()
 
     return RedirectResponse(url=f"/circuits/{circuit_id}", status_code=303)
 
@@ -919,33 +1409,29 @@ async def terminal_device_delete(
 @app.post("/terminal-devices/{terminal_device_id}/measurements/save")
 async def terminal_device_measurements_save(
     terminal_device_id: int,
+    request: Request,
     measurements_circuit_insulation_resistance: Optional[float] = Form(None),
     measurements_circuit_loop_impedance_min: Optional[float] = Form(None),
     measurements_circuit_loop_impedance_max: Optional[float] = Form(None),
     measurements_circuit_rcd_trip_time_ms: Optional[float] = Form(None),
     measurements_circuit_rcd_test_current_ma: Optional[float] = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     user_id = get_current_user_id()
-    td = (
-        db.query(TerminalDevice)
-        .join(Circuit)
-        .join(SwitchboardDevice)
-        .join(Switchboard)
-        .join(Revision)
+    td = await db.scalar(
+        select(TerminalDevice)
+        .join(Revision, Revision.revision_id == TerminalDevice.revision_id)
         .filter(
             TerminalDevice.terminal_device_id == terminal_device_id,
             Revision.user_id == user_id,
         )
-        .first()
     )
     if not td:
         return RedirectResponse(url="/revisions", status_code=303)
 
-    meas = (
-        db.query(TerminalMeasurement)
+    meas = await db.scalar(
+        select(TerminalMeasurement)
         .filter(TerminalMeasurement.terminal_device_id == terminal_device_id)
-        .first()
     )
     if not meas:
         meas = TerminalMeasurement(terminal_device_id=terminal_device_id)
@@ -967,8 +1453,13 @@ async def terminal_device_measurements_save(
         measurements_circuit_rcd_test_current_ma
     )
 
-    db.commit()
-
-    recompute_circuit_measurement(db, td.circuit_id)
+    await recompute_circuit_measurement(db, td.circuit_id)
+    await db.commit()
 
+    if wants_fragment(request):
+        parts = templates.get_template("circuit_fragments.html").module
+        return fragment_response(
+            parts.terminal_row(td, meas),
+            *await render_circuit_rollup(db, td.circuit_id),
+        )
     return RedirectResponse(url=f"/circuits/{td.circuit_id}", status_code=303)
@@ -0,0 +1,153 @@
+"""
+Přepočet souhrnných měření obvodů z měření koncových zařízení.
+
+Souhrn obvodu (CircuitMeasurement + počet zásuvek / ks na Circuit) se počítá
+jedním agregačním dotazem MIN/MAX/SUM seskupeným podle obvodu – nenačítají se
+žádné ORM objekty koncových zařízení ani jejich měření. Přepočet běží ve stejné
+transakci jako zápis, který ho vyvolal; commit je na volajícím.
+"""
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import live
+from models import Circuit, CircuitMeasurement, TerminalDevice, TerminalMeasurement
+
+
+# Sloupec souhrnu obvodu -> agregace přes měření jeho koncových zařízení.
+# Impedance smyčky a izolační odpor bereme nejhorší hodnotu, u RCD nejdelší čas / nejvyšší proud.
+CIRCUIT_ROLLUP = {
+    "measurements_circuit_loop_impedance_min": func.min(
+        TerminalMeasurement.measurements_circuit_loop_impedance_min
+    ),
+    "measurements_circuit_loop_impedance_max": func.max(
+        TerminalMeasurement.measurements_circuit_loop_impedance_max
+    ),
+    "measurements_circuit_rcd_trip_time_ms": func.max(
+        TerminalMeasurement.measurements_circuit_rcd_trip_time_ms
+    ),
+    "measurements_circuit_rcd_test_current_ma": func.max(
+        TerminalMeasurement.measurements_circuit_rcd_test_current_ma
+    ),
+    "measurements_circuit_insulation_resistance": func.min(
+        TerminalMeasurement.measurements_circuit_insulation_resistance
+    ),
+}
+
+# Kolik řádků posílat v jednom INSERT ... VALUES (limit parametrů SQLite).
+UPSERT_CHUNK = 500
+
+
+def chunks(items, size):
+    """Po sobě jdoucí části seznamu o nejvýše `size` prvcích (dávky IN / VALUES)."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def dialect_insert(db: AsyncSession, model):
+    """INSERT s podporou ON CONFLICT pro dialekt aktuální databáze (Postgres / SQLite)."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+async def upsert_rows(db: AsyncSession, model, rows, key: str, keep_existing_on_null: bool = False):
+    """
+    Hromadný INSERT ... ON CONFLICT (key) DO UPDATE pro seznam slovníků.
+
+    Aktualizují se sloupce uvedené v řádku kromě klíče; řádky s různými sadami
+    sloupců (částečné úpravy) se posílají po skupinách. S
+    keep_existing_on_null=True NULL v novém řádku stávající hodnotu nepřepíše.
+    ORM objekty téhož modelu už načtené v session se neobnoví.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    table = model.__table__
+    for columns, group in groups.items():
+        columns = [c for c in columns if c != key]
+        for chunk in chunks(group, UPSERT_CHUNK):
+            stmt = dialect_insert(db, model).values(chunk)
+            if not columns:
+                await db.execute(stmt.on_conflict_do_nothing(index_elements=[table.c[key]]))
+                continue
+            if keep_existing_on_null:
+                set_ = {c: func.coalesce(stmt.excluded[c], table.c[c]) for c in columns}
+            else:
+                set_ = {c: stmt.excluded[c] for c in columns}
+            await db.execute(stmt.on_conflict_do_update(index_elements=[table.c[key]], set_=set_))
+
+
+async def recompute_circuit_measurements(db: AsyncSession, circuit_ids):
+    """
+    Dávkový přepočet souhrnu pro více obvodů najednou (importy, opravy dat).
+
+    Jeden agregační dotaz pro všechny obvody, jeden hromadný UPDATE počtu
+    zásuvek a jeden hromadný upsert CircuitMeasurement. Hodnota měření obvodu
+    se přepíše jen tehdy, když ji má aspoň jedno koncové zařízení.
+    """
+    circuit_ids = sorted(set(circuit_ids))
+    if not circuit_ids:
+        return
+
+    # session má autoflush vypnutý – agregace musí vidět právě provedený zápis
+    await db.flush()
+
+    aggregates = {circuit_id: None for circuit_id in circuit_ids}
+    for chunk in chunks(circuit_ids, UPSERT_CHUNK):
+        rows = await db.execute(
+            select(
+                TerminalDevice.circuit_id,
+                func.sum(TerminalDevice.terminal_device_quantity),
+                *CIRCUIT_ROLLUP.values(),
+            )
+            .outerjoin(
+                TerminalMeasurement,
+                TerminalMeasurement.terminal_device_id == TerminalDevice.terminal_device_id,
+            )
+            .filter(TerminalDevice.circuit_id.in_(chunk))
+            .group_by(TerminalDevice.circuit_id)
+        )
+        for row in rows:
+            aggregates[row[0]] = row[1:]
+
+    outlets = []
+    measurement_rows = []
+    for circuit_id, agg in aggregates.items():
+        total_qty, values = (agg[0], agg[1:]) if agg else (None, [None] * len(CIRCUIT_ROLLUP))
+        outlets.append({"circuit_id": circuit_id, "circuit_number_of_outlets": total_qty or None})
+        measurement_rows.append({"circuit_id": circuit_id, **dict(zip(CIRCUIT_ROLLUP, values))})
+
+    await db.execute(update(Circuit), outlets)
+    await upsert_rows(db, CircuitMeasurement, measurement_rows, key="circuit_id", keep_existing_on_null=True)
+    live.record(db, "circuit", outlets, key="circuit_id")
+    live.record(db, "circuit_measurement", measurement_rows, key="circuit_id", skip_none=True)
+
+
+async def save_measurement_grid(db: AsyncSession, circuit_rows, terminal_rows, terminal_circuits):
+    """
+    Uloží měření více obvodů a koncových zařízení najednou (hromadný formulář,
+    import z měřicího přístroje). Řádky jsou slovníky s klíčem circuit_id /
+    terminal_device_id a jen těmi poli, která se mají zapsat.
+
+    Nejdřív koncová zařízení a jeden přepočet souhrnů jejich obvodů
+    (terminal_circuits: terminal_device_id -> circuit_id), pak ruční hodnoty
+    obvodů – explicitně zadané měření obvodu má přednost. Necommituje; vrací
+    množinu přepočtených obvodů.
+    """
+    await upsert_rows(db, TerminalMeasurement, terminal_rows, key="terminal_device_id")
+    live.record(db, "terminal_measurement", terminal_rows, key="terminal_device_id")
+    recomputed = {terminal_circuits[row["terminal_device_id"]] for row in terminal_rows}
+    await recompute_circuit_measurements(db, recomputed)
+    await upsert_rows(db, CircuitMeasurement, circuit_rows, key="circuit_id")
+    live.record(db, "circuit_measurement", circuit_rows, key="circuit_id")
+    return recomputed
+
+
+async def recompute_circuit_measurement(db: AsyncSession, circuit_id: int):
+    """
+    Přepočet souhrnných hodnot měření obvodu na základě měření koncových zařízení (TerminalMeasurement)
+    a aktualizace počtu zásuvek / ks podle koncových zařízení.
+    """
+    await recompute_circuit_measurements(db, [circuit_id])
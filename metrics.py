@@ -0,0 +1,328 @@
+"""
+Měření požadavků: čas, vykreslení šablony, SQL příkazy, export pro Prometheus.
+
+Zapíná se proměnnou METRICS_ENABLED=1; vypnuté se vůbec neinstaluje (žádný
+middleware, žádné posluchače SQL událostí, žádná route), takže nic nestojí.
+
+Zapnuté:
+- ASGI middleware pro každý požadavek založí RequestMetrics v ContextVar,
+  po odeslání odpovědi ho podle šablony route (/switchboards/{switchboard_id})
+  zapíše do histogramů,
+- posluchače before/after_cursor_execute na engine přičítají počet příkazů
+  a čas v databázi aktuálního požadavku (i v aiosqlite/psycopg vláknech –
+  ContextVar se do nich propíše),
+- podtřída Template měří vykreslení šablony (render i makra fragmentů
+  volaná přes template.module),
+- GET /metrics vrací text ve formátu Prometheus: kumulativní histogramy
+  a souhrn (kvantily) za posledních METRICS_WINDOW_SECONDS,
+- moduly s vlastními počítadly se přidají do `collectors`,
+- požadavek delší než METRICS_SLOW_MS zaloguje nejdražší SQL příkazy.
+
+Metriky jsou za proces; s více workery gunicornu vrací každý worker své.
+"""
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from starlette.responses import Response
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on")
+METRICS_SLOW_MS = float(os.getenv("METRICS_SLOW_MS", "500"))
+METRICS_WINDOW_SECONDS = float(os.getenv("METRICS_WINDOW_SECONDS", "300"))
+
+# Horní meze košů histogramů (s, resp. počet příkazů).
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+QUANTILES = (0.5, 0.9, 0.99)
+# Nejvýše tolik posledních hodnot drží okno jedné route.
+WINDOW_MAX_SAMPLES = 4096
+SLOW_TOP_QUERIES = 5
+
+# Další zdroje metrik (funkce vracející řádky ve formátu Prometheus), např. cache.
+collectors = []
+
+logger = logging.getLogger("revize.metrics")
+
+
+class RequestMetrics:
+    __slots__ = ("statements", "db_seconds", "render_seconds", "queries")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.queries = {}  # SQL -> [počet, čas]
+
+
+_current: ContextVar = ContextVar("request_metrics", default=None)
+
+
+class Histogram:
+    """Kumulativní histogram ve smyslu Prometheus (koše jsou <= mez)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Window:
+    """Hodnoty za posledních METRICS_WINDOW_SECONDS pro kvantily."""
+
+    def __init__(self):
+        self.samples = deque(maxlen=WINDOW_MAX_SAMPLES)
+
+    def observe(self, value, now):
+        self.samples.append((now, value))
+
+    def quantiles(self, now):
+        while self.samples and self.samples[0][0] < now - METRICS_WINDOW_SECONDS:
+            self.samples.popleft()
+        values = sorted(value for _, value in self.samples)
+        if not values:
+            return None
+        return [(q, values[min(len(values) - 1, int(q * len(values)))]) for q in QUANTILES], sum(values), len(values)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}  # (route, method, status) -> počet
+        self.duration = {}  # (route, method) -> Histogram
+        self.window = {}  # (route, method) -> Window
+        self.render = {}  # route -> Histogram
+        self.db_time = {}  # route -> Histogram
+        self.statements = {}  # route -> Histogram
+
+    def observe(self, route, method, status, seconds, metrics: RequestMetrics):
+        now = time.monotonic()
+        with self.lock:
+            key = (route, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if (route, method) not in self.duration:
+                self.duration[(route, method)] = Histogram(SECONDS_BUCKETS)
+                self.window[(route, method)] = Window()
+                self.render[route] = self.render.get(route) or Histogram(SECONDS_BUCKETS)
+                self.db_time[route] = self.db_time.get(route) or Histogram(SECONDS_BUCKETS)
+                self.statements[route] = self.statements.get(route) or Histogram(STATEMENT_BUCKETS)
+            self.duration[(route, method)].observe(seconds)
+            self.window[(route, method)].observe(seconds, now)
+            self.render[route].observe(metrics.render_seconds)
+            self.db_time[route].observe(metrics.db_seconds)
+            self.statements[route].observe(metrics.statements)
+
+    def exposition(self) -> str:
+        lines = []
+        now = time.monotonic()
+        with self.lock:
+            lines += [
+                "# HELP revize_http_requests_total Počet požadavků podle route, metody a stavu.",
+                "# TYPE revize_http_requests_total counter",
+            ]
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f"revize_http_requests_total{_labels(route=route, method=method, status=status)} {count}")
+
+            _histogram(lines, "revize_http_request_duration_seconds", "Doba požadavku (s).",
+                       {_labels(route=r, method=m): h for (r, m), h in self.duration.items()})
+
+            lines += [
+                "# HELP revize_http_request_duration_window_seconds Kvantily doby požadavku za klouzavé okno.",
+                "# TYPE revize_http_request_duration_window_seconds summary",
+            ]
+            for (route, method), window in sorted(self.window.items()):
+                result = window.quantiles(now)
+                if result is None:
+                    continue
+                quantiles, total, count = result
+                for q, value in quantiles:
+                    labels = _labels(route=route, method=method, quantile=str(q))
+                    lines.append(f"revize_http_request_duration_window_seconds{labels} {value:.6f}")
+                labels = _labels(route=route, method=method)
+                lines.append(f"revize_http_request_duration_window_seconds_sum{labels} {total:.6f}")
+                lines.append(f"revize_http_request_duration_window_seconds_count{labels} {count}")
+
+            _histogram(lines, "revize_template_render_seconds", "Vykreslení šablony během požadavku (s).",
+                       {_labels(route=r): h for r, h in self.render.items()})
+            _histogram(lines, "revize_db_seconds", "Čas SQL příkazů během požadavku (s).",
+                       {_labels(route=r): h for r, h in self.db_time.items()})
+            _histogram(lines, "revize_db_statements", "Počet SQL příkazů na požadavek.",
+                       {_labels(route=r): h for r, h in self.statements.items()})
+        for collect in collectors:
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _histogram(lines, name, help_text, histograms):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in sorted(histograms.items()):
+        cumulative = 0
+        inner = labels[1:-1]
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{inner},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{inner},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{labels} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{labels} {histogram.count}")
+
+
+registry = Registry()
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    # Neznámé cesty pod jedním štítkem – jinak by každé URL založilo novou řadu.
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Čistý ASGI middleware (bez BaseHTTPMiddleware – neblokuje streamování)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            route = _route_template(scope)
+            registry.observe(route, scope["method"], status, elapsed, metrics)
+            if elapsed * 1000 >= METRICS_SLOW_MS:
+                _log_slow(route, scope, elapsed, metrics)
+
+
+def _log_slow(route, scope, elapsed, metrics: RequestMetrics):
+    top = sorted(metrics.queries.items(), key=lambda item: item[1][1], reverse=True)[:SLOW_TOP_QUERIES]
+    logger.warning(
+        "slow request %s %s (%s): %.1f ms, render %.1f ms, %d SQL in %.1f ms%s",
+        scope["method"], scope["path"], route, elapsed * 1000, metrics.render_seconds * 1000,
+        metrics.statements, metrics.db_seconds * 1000,
+        "".join(
+            f"\n  {count}x {seconds * 1000:.1f} ms  {' '.join(sql.split())[:200]}"
+            for sql, (count, seconds) in top
+        ),
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = _current.get()
+    if metrics is None:
+        return
+    started = conn.info.get("metrics_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    metrics.statements += 1
+    metrics.db_seconds += elapsed
+    entry = metrics.queries.get(statement)
+    if entry is None:
+        metrics.queries[statement] = [1, elapsed]
+    else:
+        entry[0] += 1
+        entry[1] += elapsed
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute se po chybě nevolá – zahodíme rozpracovaný čas
+    started = exception_context.connection.info.get("metrics_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.render_seconds += time.perf_counter() - started
+    return result
+
+
+class _TimedModule:
+    """Šablona jako modul (template.module) s měřenými makry."""
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        value = getattr(self._module, name)
+        return functools.partial(_timed, value) if callable(value) else value
+
+    def __str__(self):
+        return str(self._module)
+
+
+def _instrument_templates(templates):
+    # Měří se Template.render (TemplateResponse i get_template().render())
+    # a makra volaná z Pythonu přes template.module (fragmenty). Include
+    # a import uvnitř šablon tyto cesty nepoužívají, čas se nepočítá dvakrát.
+    base = templates.env.template_class
+
+    class TimedTemplate(base):
+        def render(self, *args, **kwargs):
+            return _timed(super().render, *args, **kwargs)
+
+        @property
+        def module(self):
+            return _TimedModule(super().module)
+
+    templates.env.template_class = TimedTemplate
+    if templates.env.cache is not None:
+        templates.env.cache.clear()
+
+
+async def metrics_endpoint(request):
+    return Response(registry.exposition(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def install(app, templates, engines):
+    """Zapne měření pro aplikaci (volá main.py, jen když METRICS_ENABLED)."""
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+    _instrument_templates(templates)
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+    app.add_middleware(MetricsMiddleware)
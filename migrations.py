@@ -0,0 +1,185 @@
+"""
+Verzované migrace schématu databáze.
+
+Verze schématu je uložená v tabulce schema_version (jeden řádek). Migrace se
+spouští jednou – z lifespan hooku aplikace nebo samostatně před nasazením:
+
+    python migrations.py
+
+Při teplém startu (databáze je aktuální) stojí kontrola jediný SELECT.
+Nová migrace se přidá na konec seznamu MIGRATIONS; pořadí ani obsah již
+vydaných migrací se nemění. Migrace 1 zakládá tabulky podle zmrazeného
+snímku (baseline_schema.py), ne podle aktuálních models.py – čerstvá
+i starší databáze tak projdou stejnými kroky. Databáze z doby před
+migracemi (bez schema_version) už tabulky má, migrace proto DDL zakládají
+podmíněně (checkfirst, IF NOT EXISTS, add_column_if_missing). Obě cesty
+ověřuje benchmarks/schema_upgrade.py.
+"""
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, select, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from database import engine
+import baseline_schema
+import models
+import delta_sync
+import form_schema
+import fragment_cache
+import http_cache
+import ownership
+import search
+
+
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", Integer, nullable=False),
+)
+
+# Libovolné, ale pevné číslo advisory zámku v Postgresu – brání souběžné migraci
+# z více procesů najednou.
+MIGRATION_LOCK_ID = 7301
+
+
+def add_column_if_missing(conn, table: str, column: str, ddl_type: str):
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _initial_schema(conn):
+    baseline_schema.metadata.create_all(bind=conn)
+
+
+def _terminal_device_cable_and_quantity(conn):
+    # dříve auto_migrate(): ADD COLUMN IF NOT EXISTS, které SQLite neumí
+    add_column_if_missing(conn, "terminal_devices", "terminal_device_cable", "VARCHAR(255)")
+    add_column_if_missing(conn, "terminal_devices", "terminal_device_cable_installation_method", "VARCHAR(255)")
+    add_column_if_missing(conn, "terminal_devices", "terminal_device_quantity", "INTEGER")
+
+
+def create_index(conn, name: str, table: str, columns: str):
+    # pevné DDL – migrace nesmí záviset na tom, jaké indexy má zrovna models.py
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _ownership_indexes(conn):
+    create_index(conn, "ix_revisions_user_id_revision_id", "revisions", "user_id, revision_id")
+    create_index(conn, "ix_switchboards_revision_id_order", "switchboards", "revision_id, switchboard_order")
+    create_index(conn, "ix_switchboard_devices_switchboard_id_position", "switchboard_devices",
+                 "switchboard_id, switchboard_device_position")
+    create_index(conn, "ix_switchboard_devices_parent_device_id", "switchboard_devices", "parent_device_id")
+    create_index(conn, "ix_circuits_device_id", "circuits", "device_id")
+    create_index(conn, "ix_terminal_devices_circuit_id", "terminal_devices", "circuit_id")
+
+
+def _search_index(conn):
+    # FTS5 / tsvector index a triggery, které ho drží v souladu (viz search.py)
+    search.install(conn, initial=True)
+
+
+def _form_metadata_version(conn):
+    # verze metadat formulářů a triggery, které ji zvyšují (viz form_schema.py)
+    form_schema.install(conn)
+
+
+def _denormalized_revision_id(conn):
+    # revision_id na přístrojích, obvodech a koncových zařízeních (viz ownership.py)
+    for table, *_ in ownership.HIERARCHY:
+        add_column_if_missing(conn, table, "revision_id", "INTEGER REFERENCES revisions(revision_id)")
+    # doplnění hodnot a triggery; index až nad naplněným sloupcem
+    ownership.install(conn)
+    for table, *_ in ownership.HIERARCHY:
+        create_index(conn, f"ix_{table}_revision_id", table, "revision_id")
+
+
+def _revision_versions(conn):
+    # verze stromu revize pro ETag detailních stránek (viz http_cache.py)
+    http_cache.install(conn)
+
+
+def _switchboard_versions(conn):
+    # verze tabulek přístrojů rozvaděče pro cache fragmentů (viz fragment_cache.py)
+    fragment_cache.install(conn)
+
+
+def _live_events(conn):
+    # zprávy o změnách pro živé stránky s LIVE_BACKEND=database (viz live.py)
+    models.LiveEvent.__table__.create(bind=conn, checkfirst=True)
+
+
+def _sync_log(conn):
+    # poslední změny a tombstony záznamů pro synchronizaci tabletů (viz delta_sync.py)
+    delta_sync.install(conn)
+
+
+def _sync_log_pause(conn):
+    # triggery sync_log lze v transakci vypnout – klon zapisuje sync_log hromadně
+    delta_sync.install_triggers(conn)
+
+
+def _search_index_rebuild(conn):
+    # index z denormalizovaného revision_id, v Postgresu bez diakritiky (viz search.py)
+    search.rebuild(conn)
+
+
+# (verze, popis, funkce) – verze jdou souvisle od 1
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "terminal device cable and quantity columns", _terminal_device_cable_and_quantity),
+    (3, "foreign-key and ownership indexes", _ownership_indexes),
+    (4, "full-text search index", _search_index),
+    (5, "form metadata version", _form_metadata_version),
+    (6, "denormalized revision_id on devices, circuits and terminal devices", _denormalized_revision_id),
+    (7, "revision versions for HTTP caching", _revision_versions),
+    (8, "switchboard versions for the fragment cache", _switchboard_versions),
+    (9, "live events table", _live_events),
+    (10, "sync log for offline tablets", _sync_log),
+    (11, "sync log pause for bulk clones", _sync_log_pause),
+    (12, "search index on denormalized revision_id, unaccented on Postgres", _search_index_rebuild),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn) -> int:
+    try:
+        return conn.execute(select(schema_version.c.version)).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        # tabulka schema_version ještě neexistuje
+        return 0
+
+
+def migrate(bind=None) -> int:
+    """
+    Doběhne chybějící migrace a vrátí výslednou verzi schématu.
+    Všechny kroky běží v jedné transakci spolu se zápisem nové verze.
+    """
+    bind = bind or engine
+
+    with bind.connect() as conn:
+        if current_version(conn) >= LATEST_VERSION:
+            return LATEST_VERSION
+
+    with bind.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+
+        _version_metadata.create_all(bind=conn)
+        version = current_version(conn)
+        for number, description, step in MIGRATIONS:
+            if number <= version:
+                continue
+            step(conn)
+            print(f"Migration {number}: {description}")
+
+        if version == 0:
+            conn.execute(schema_version.insert().values(version=LATEST_VERSION))
+        elif version < LATEST_VERSION:
+            conn.execute(schema_version.update().values(version=LATEST_VERSION))
+
+    return LATEST_VERSION
+
+
+if __name__ == "__main__":
+    print(f"Schema version: {migrate()}")
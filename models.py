@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, Float, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, Float, Index, UniqueConstraint
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from database import Base
 
@@ -21,6 +21,13 @@ class User(Base):
 # 2. REVISIONS
 class Revision(Base):
     __tablename__ = "revisions"
+    __table_args__ = (
+        # Seznam revizí uživatele řazený podle ID
+        Index("ix_revisions_user_id_revision_id", "user_id", "revision_id"),
+    )
+    # Dlouhé textové sloupce (skupina "texts") se nenačítají s revizí; stránka,
+    # která je zobrazuje, si je vyžádá přes undefer_group (loaders.py).
+    # raiseload: nechtěný přístup skončí chybou, ne skrytým dotazem navíc.
 
     revision_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
@@ -30,7 +37,7 @@ class Revision(Base):
     revision_owner = Column(String(255))
     revision_client = Column(String(255))
     revision_address = Column(Text)
-    revision_description = Column(Text)
+    revision_description = deferred(Column(Text), group="texts", raiseload=True)
     revision_type = Column(String(100))
     revision_date_of_previous_revision = Column(Date)
     revision_start_date = Column(Date)
@@ -48,23 +55,32 @@ class Revision(Base):
     revision_technician = Column(String(255))
     revision_certificate_number = Column(String(100))
     revision_authorization_number = Column(String(100))
-    revision_project_documentation = Column(Text)
+    revision_project_documentation = deferred(Column(Text), group="texts", raiseload=True)
     revision_contractor = Column(String(255))
-    revision_short_description = Column(Text)
+    revision_short_description = deferred(Column(Text), group="texts", raiseload=True)
     revision_measuring_instrument_manufacturer_type = Column(String(255))
     revision_measuring_instrument_serial_number = Column(String(100))
     revision_measuring_instrument_calibration = Column(String(255))
     revision_measuring_instrument_calibration_validity = Column(Date)
-    revision_overall_assessment = Column(Text)
+    revision_overall_assessment = deferred(Column(Text), group="texts", raiseload=True)
 
     # Relationships
     user = relationship("User", back_populates="revisions")
-    switchboards = relationship("Switchboard", back_populates="revision", cascade="all, delete-orphan")
+    switchboards = relationship(
+        "Switchboard",
+        back_populates="revision",
+        cascade="all, delete-orphan",
+        order_by="Switchboard.switchboard_order",
+    )
 
 
 # 3. SWITCHBOARDS
 class Switchboard(Base):
     __tablename__ = "switchboards"
+    __table_args__ = (
+        # Rozvaděče revize řazené podle pořadí
+        Index("ix_switchboards_revision_id_order", "revision_id", "switchboard_order"),
+    )
 
     switchboard_id = Column(Integer, primary_key=True, index=True)
     revision_id = Column(Integer, ForeignKey("revisions.revision_id"), nullable=False)
@@ -124,10 +140,16 @@ class SwitchboardMeasurement(Base):
 # 5. SWITCHBOARD_DEVICES
 class SwitchboardDevice(Base):
     __tablename__ = "switchboard_devices"
+    __table_args__ = (
+        # Přístroje rozvaděče řazené podle pozice
+        Index("ix_switchboard_devices_switchboard_id_position", "switchboard_id", "switchboard_device_position"),
+    )
 
     device_id = Column(Integer, primary_key=True, index=True)
     switchboard_id = Column(Integer, ForeignKey("switchboards.switchboard_id"), nullable=False)
-    parent_device_id = Column(Integer, ForeignKey("switchboard_devices.device_id"), nullable=True)
+    parent_device_id = Column(Integer, ForeignKey("switchboard_devices.device_id"), nullable=True, index=True)
+    # denormalizováno z rozvaděče pro kontrolu vlastnictví jedním spojem (viz ownership.py)
+    revision_id = Column(Integer, ForeignKey("revisions.revision_id"), index=True)
 
     switchboard_device_position = Column(String(100))
     switchboard_device_type = Column(String(100))
@@ -151,7 +173,9 @@ class Circuit(Base):
     __tablename__ = "circuits"
 
     circuit_id = Column(Integer, primary_key=True, index=True)
-    device_id = Column(Integer, ForeignKey("switchboard_devices.device_id"), nullable=False)
+    device_id = Column(Integer, ForeignKey("switchboard_devices.device_id"), nullable=False, index=True)
+    # denormalizováno z rozvaděče pro kontrolu vlastnictví jedním spojem (viz ownership.py)
+    revision_id = Column(Integer, ForeignKey("revisions.revision_id"), index=True)
 
     circuit_number = Column(String(100))
     circuit_room = Column(String(255))
@@ -193,7 +217,9 @@ class TerminalDevice(Base):
     __tablename__ = "terminal_devices"
 
     terminal_device_id = Column(Integer, primary_key=True, index=True)
-    circuit_id = Column(Integer, ForeignKey("circuits.circuit_id"), nullable=False)
+    circuit_id = Column(Integer, ForeignKey("circuits.circuit_id"), nullable=False, index=True)
+    # denormalizováno z rozvaděče pro kontrolu vlastnictví jedním spojem (viz ownership.py)
+    revision_id = Column(Integer, ForeignKey("revisions.revision_id"), index=True)
 
     terminal_device_type = Column(String(100))
     terminal_device_manufacturer = Column(String(255))
@@ -291,3 +317,87 @@ class FieldCategory(Base):
     display_order = Column(Integer, default=0)
     icon = Column(String(50), default='📋')
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# 12. FORM_METADATA_VERSION
+class FormMetadataVersion(Base):
+    """Jediný řádek s verzí metadat formulářů; zvyšují ho triggery (form_schema.py)."""
+    __tablename__ = "form_metadata_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+
+
+# 13. REVISION_VERSIONS
+class RevisionVersion(Base):
+    """
+    Verze stromu revize pro ETag detailních stránek; zvyšují ji triggery
+    (http_cache.py). Bez cizího klíče – řádek smazané revize zůstává, aby
+    znovu přidělené ID nezačalo na staré verzi.
+    """
+    __tablename__ = "revision_versions"
+
+    revision_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, default=1)
+
+
+# 14. SWITCHBOARD_VERSIONS
+class SwitchboardVersion(Base):
+    """
+    Verze přístrojů a obvodů rozvaděče pro cache vykreslených tabulek;
+    zvyšují ji triggery (fragment_cache.py). Bez cizího klíče jako RevisionVersion.
+    """
+    __tablename__ = "switchboard_versions"
+
+    switchboard_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, default=1)
+
+
+# 15. LIVE_EVENTS
+class LiveEvent(Base):
+    """
+    Zprávy o změnách revizí pro živé stránky při LIVE_BACKEND=database
+    (live.py); workery je čtou podle seq. Staré řádky se průběžně mažou.
+    """
+    __tablename__ = "live_events"
+
+    seq = Column(Integer, primary_key=True)
+    revision_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)
+
+
+# 16. SYNC_LOG
+class SyncLog(Base):
+    """
+    Poslední změna každého záznamu stromu revizí pro synchronizaci tabletů
+    (delta_sync.py): seq z jediné rostoucí řady, čas změny a příznak smazání
+    (tombstone). Řádky zakládají a přepisují triggery; bez cizích klíčů,
+    záznam smazaného řádku zůstává.
+    """
+    __tablename__ = "sync_log"
+    __table_args__ = (
+        UniqueConstraint("entity", "entity_id", name="uix_sync_log_entity"),
+        # Změny revize od kurzoru
+        Index("ix_sync_log_revision_id_seq", "revision_id", "seq"),
+        # seq se nesmí po smazání posledního řádku přidělit znovu
+        {"sqlite_autoincrement": True},
+    )
+
+    seq = Column(Integer, primary_key=True)
+    revision_id = Column(Integer)
+    entity = Column(String(50), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# 17. SYNC_LOG_PAUSE
+class SyncLogPause(Base):
+    """
+    Vypnutí triggerů sync_log pro hromadný zápis (klonování revize). Řádek
+    vidí jen transakce, která ho vložila; ta pak zapíše sync_log sama
+    a řádek před commitem smaže (delta_sync.py).
+    """
+    __tablename__ = "sync_log_pause"
+
+    pause_id = Column(Integer, primary_key=True)
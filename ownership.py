@@ -0,0 +1,75 @@
+"""
+Denormalizované revision_id na přístrojích, obvodech a koncových zařízeních.
+
+Vlastnictví obvodu se dřív ověřovalo přes Circuit -> SwitchboardDevice ->
+Switchboard -> Revision (u koncového zařízení o spoj víc). Se sloupcem
+revision_id přímo na switchboard_devices, circuits a terminal_devices je
+to jeden spoj na revisions přes indexovaný sloupec; stejně se filtrují
+dotazy přes celou revizi (klonování, souhrny).
+
+Aplikace revision_id při zakládání vyplňuje sama (zná nadřazený záznam).
+Správnost drží triggery v databázi bez ohledu na to, kdo zapisuje:
+- po vložení/změně vazby (nebo revision_id) se hodnota srovná s rodičem,
+- změna revision_id rodiče se propíše na potomky (rozvaděč -> přístroje ->
+  obvody -> koncová zařízení).
+"""
+
+# (tabulka, primární klíč, vazba na rodiče, tabulka rodiče, klíč rodiče) – shora dolů
+HIERARCHY = (
+    ("switchboard_devices", "device_id", "switchboard_id", "switchboards", "switchboard_id"),
+    ("circuits", "circuit_id", "device_id", "switchboard_devices", "device_id"),
+    ("terminal_devices", "terminal_device_id", "circuit_id", "circuits", "circuit_id"),
+)
+
+
+def _parent_revision(fk, parent, parent_pk, row="NEW"):
+    return f"(SELECT revision_id FROM {parent} WHERE {parent_pk} = {row}.{fk})"
+
+
+def install(conn):
+    """Doplní revision_id existujícím řádkům a založí triggery (volá migrace)."""
+    for table, _pk, fk, parent, parent_pk in HIERARCHY:
+        conn.exec_driver_sql(
+            f"UPDATE {table} SET revision_id = {_parent_revision(fk, parent, parent_pk, table)}"
+        )
+
+    if conn.dialect.name == "postgresql":
+        for table, _pk, fk, parent, parent_pk in HIERARCHY:
+            conn.exec_driver_sql(
+                f"CREATE FUNCTION {table}_set_revision_id() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+                f"NEW.revision_id := {_parent_revision(fk, parent, parent_pk)}; RETURN NEW; END $$"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {table}_set_revision_id BEFORE INSERT OR UPDATE OF {fk}, revision_id "
+                f"ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_set_revision_id()"
+            )
+            conn.exec_driver_sql(
+                f"CREATE FUNCTION {parent}_cascade_revision_id() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+                f"UPDATE {table} SET revision_id = NEW.revision_id WHERE {fk} = NEW.{parent_pk}; "
+                "RETURN NULL; END $$"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {parent}_cascade_revision_id AFTER UPDATE OF revision_id ON {parent} "
+                "FOR EACH ROW WHEN (NEW.revision_id IS DISTINCT FROM OLD.revision_id) "
+                f"EXECUTE FUNCTION {parent}_cascade_revision_id()"
+            )
+        return
+
+    # SQLite neumí v BEFORE triggeru měnit NEW – opraví se až vložený řádek,
+    # a jen když hodnota od rodiče nesedí (aplikace ji vyplňuje správně).
+    for table, pk, fk, parent, parent_pk in HIERARCHY:
+        expected = _parent_revision(fk, parent, parent_pk)
+        fix = f"UPDATE {table} SET revision_id = {expected} WHERE {pk} = NEW.{pk};"
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_revision_id_insert AFTER INSERT ON {table} "
+            f"WHEN NEW.revision_id IS NOT {expected} BEGIN {fix} END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_revision_id_update AFTER UPDATE OF {fk}, revision_id ON {table} "
+            f"WHEN NEW.revision_id IS NOT {expected} BEGIN {fix} END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {parent}_revision_id_cascade AFTER UPDATE OF revision_id ON {parent} "
+            f"WHEN NEW.revision_id IS NOT OLD.revision_id BEGIN "
+            f"UPDATE {table} SET revision_id = NEW.revision_id WHERE {fk} = NEW.{parent_pk}; END"
+        )
@@ -0,0 +1,71 @@
+"""
+Stránkovaný seznam revizí – keyset (seek) stránkování podle revision_id.
+
+Stránka je WHERE user_id = ? AND revision_id < poslední_ID ORDER BY
+revision_id DESC LIMIT n+1 nad indexem ix_revisions_user_id_revision_id:
+cena dotazu nezávisí na tom, jak hluboko v seznamu stránka je (na rozdíl
+od OFFSET), a nové revize mezi načtením stránek neposunou položky.
+Načítají se jen sloupce, které seznam zobrazuje.
+
+Kurzor je neprůhledný token (base64url), klient ho jen vrací zpět.
+"""
+import base64
+import binascii
+import json
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Revision
+
+
+REVISIONS_PAGE_SIZE = 50
+REVISIONS_MAX_PAGE_SIZE = 200
+
+# Sloupce položky seznamu revizí (HTML i JSON).
+REVISION_LIST_COLUMNS = (
+    Revision.revision_id,
+    Revision.revision_name,
+    Revision.revision_code,
+    Revision.revision_address,
+)
+
+
+class CursorError(ValueError):
+    """Neplatný token kurzoru."""
+
+
+def encode_cursor(revision_id: int) -> str:
+    raw = json.dumps({"before": revision_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(token: str | None) -> int | None:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        before = json.loads(raw)["before"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise CursorError("neplatný kurzor")
+    if not isinstance(before, int) or isinstance(before, bool):
+        raise CursorError("neplatný kurzor")
+    return before
+
+
+async def revisions_page(db: AsyncSession, user_id: int, cursor: str | None = None,
+                         limit: int = REVISIONS_PAGE_SIZE):
+    """
+    Vrací (řádky, kurzor další stránky nebo None). Řádky mají jen sloupce
+    REVISION_LIST_COLUMNS; CursorError při neplatném kurzoru.
+    """
+    before = decode_cursor(cursor)
+    limit = max(1, min(limit, REVISIONS_MAX_PAGE_SIZE))
+    stmt = select(*REVISION_LIST_COLUMNS).where(Revision.user_id == user_id)
+    if before is not None:
+        stmt = stmt.where(Revision.revision_id < before)
+    rows = (await db.execute(stmt.order_by(Revision.revision_id.desc()).limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1].revision_id)
+    return rows, None
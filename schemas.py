@@ -0,0 +1,44 @@
+"""
+Pydantic modely pro JSON API (formuláře HTML stránek jdou přes Form parametry).
+"""
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class CircuitMeasurementIn(BaseModel):
+    """Měření obvodu; uloží se jen pole uvedená v požadavku (null hodnotu smaže)."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    circuit_id: int
+    measurements_circuit_insulation_resistance: Optional[float] = None
+    measurements_circuit_loop_impedance_min: Optional[float] = None
+    measurements_circuit_loop_impedance_max: Optional[float] = None
+    measurements_circuit_rcd_trip_time_ms: Optional[float] = None
+    measurements_circuit_rcd_test_current_ma: Optional[float] = None
+    measurements_circuit_earth_resistance: Optional[float] = None
+    measurements_circuit_continuity: Optional[float] = None
+    measurements_circuit_order_of_phases: Optional[str] = None
+
+
+class TerminalMeasurementIn(BaseModel):
+    """Měření koncového zařízení; uloží se jen pole uvedená v požadavku."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    terminal_device_id: int
+    measurements_circuit_insulation_resistance: Optional[float] = None
+    measurements_circuit_loop_impedance_min: Optional[float] = None
+    measurements_circuit_loop_impedance_max: Optional[float] = None
+    measurements_circuit_rcd_trip_time_ms: Optional[float] = None
+    measurements_circuit_rcd_test_current_ma: Optional[float] = None
+
+
+class MeasurementGridIn(BaseModel):
+    """Mřížka měření celého rozvaděče – obvody i koncová zařízení najednou."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    circuits: List[CircuitMeasurementIn] = []
+    terminal_devices: List[TerminalMeasurementIn] = []
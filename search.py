@@ -0,0 +1,252 @@
+"""
+Fulltextové vyhledávání v revizích, rozvaděčích, obvodech a koncových zařízeních.
+
+Všechny hledatelné entity sdílí jednu indexovou tabulku search_index:
+v SQLite virtuální tabulka FTS5 (tokenizer unicode61 bez diakritiky), v Postgresu
+běžná tabulka se sloupcem tsvector (GENERATED ALWAYS) a GIN indexem. Postgres
+hledá v konfiguraci SEARCH_CONFIG (simple + slovník unaccent), takže
+„jistic“ najde „jistič“ stejně jako v SQLite. Index
+udržují triggery na zdrojových tabulkách – platí tedy pro každý zápis
+(formuláře, dávka, hromadné INSERTy kopie revize, import), ne jen pro ORM.
+Triggery UPDATE reagují jen na sloupce, které se indexují, takže přepočet
+souhrnů obvodů index nepřepisuje.
+
+Klíč řádku v indexu je entity_id * len(SEARCH_ENTITIES) + kód entity; mazání
+a přepis jednoho záznamu jde přes primární klíč (rowid), ne přes sken.
+Revize řádku je denormalizované revision_id (ownership.py); jeho změna
+(i dopočtená triggerem) záznam přeindexuje.
+"""
+import re
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# entita -> kód, zdrojová tabulka a SQL výrazy nad řádkem {row}
+# (NEW/OLD v triggeru, název tabulky při prvotním naplnění).
+SEARCH_ENTITIES = {
+    "revision": {
+        "code": 0,
+        "table": "revisions",
+        "pk": "revision_id",
+        "columns": ["revision_name", "revision_address", "revision_client", "revision_code"],
+        "title": "coalesce({row}.revision_name, '')",
+        "body": "coalesce({row}.revision_address, '') || ' ' || coalesce({row}.revision_client, '')"
+                " || ' ' || coalesce({row}.revision_code, '')",
+        "revision_id": "{row}.revision_id",
+        "url": "'/revisions/' || {row}.revision_id",
+    },
+    "switchboard": {
+        "code": 1,
+        "table": "switchboards",
+        "pk": "switchboard_id",
+        "columns": ["revision_id", "switchboard_name", "switchboard_location"],
+        "title": "coalesce({row}.switchboard_name, '')",
+        "body": "coalesce({row}.switchboard_location, '')",
+        "revision_id": "{row}.revision_id",
+        "url": "'/switchboards/' || {row}.switchboard_id",
+    },
+    "circuit": {
+        "code": 2,
+        "table": "circuits",
+        "pk": "circuit_id",
+        "columns": ["revision_id", "circuit_number", "circuit_room", "circuit_description"],
+        "title": "coalesce({row}.circuit_number, '') || ' ' || coalesce({row}.circuit_room, '')",
+        "body": "coalesce({row}.circuit_description, '')",
+        "revision_id": "{row}.revision_id",
+        "url": "'/circuits/' || {row}.circuit_id",
+    },
+    "terminal_device": {
+        "code": 3,
+        "table": "terminal_devices",
+        "pk": "terminal_device_id",
+        "columns": ["revision_id", "terminal_device_manufacturer", "terminal_device_model",
+                    "terminal_device_type", "terminal_device_marking"],
+        "title": "coalesce({row}.terminal_device_manufacturer, '') || ' ' || coalesce({row}.terminal_device_model, '')",
+        "body": "coalesce({row}.terminal_device_type, '') || ' ' || coalesce({row}.terminal_device_marking, '')",
+        "revision_id": "{row}.revision_id",
+        "url": "'/circuits/' || {row}.circuit_id || '#terminal-device-' || {row}.terminal_device_id",
+    },
+}
+
+# Index v podobě z migrace 4: obvody a koncová zařízení tehdy ještě neměly
+# revision_id (migrace 6), revize se dohledávala spoji a triggery sledovaly
+# vazbu na rodiče; Postgres bez unaccent. Migrace 12 index přestaví (rebuild).
+INITIAL_ENTITIES = dict(
+    SEARCH_ENTITIES,
+    switchboard=dict(SEARCH_ENTITIES["switchboard"], columns=["switchboard_name", "switchboard_location"]),
+    circuit=dict(
+        SEARCH_ENTITIES["circuit"],
+        columns=["device_id", "circuit_number", "circuit_room", "circuit_description"],
+        revision_id="(SELECT s.revision_id FROM switchboard_devices d"
+                    " JOIN switchboards s ON s.switchboard_id = d.switchboard_id"
+                    " WHERE d.device_id = {row}.device_id)",
+    ),
+    terminal_device=dict(
+        SEARCH_ENTITIES["terminal_device"],
+        columns=["circuit_id", "terminal_device_manufacturer", "terminal_device_model",
+                 "terminal_device_type", "terminal_device_marking"],
+        revision_id="(SELECT s.revision_id FROM circuits c"
+                    " JOIN switchboard_devices d ON d.device_id = c.device_id"
+                    " JOIN switchboards s ON s.switchboard_id = d.switchboard_id"
+                    " WHERE c.circuit_id = {row}.circuit_id)",
+    ),
+)
+
+# Konfigurace fulltextu v Postgresu: slova bez diakritiky, jinak jako 'simple'.
+SEARCH_CONFIG = "revize_search"
+
+ENTITY_BY_CODE = {spec["code"]: entity for entity, spec in SEARCH_ENTITIES.items()}
+
+# Nejvýše tolik slov dotazu se předá indexu (zbytek se ignoruje).
+MAX_QUERY_TERMS = 8
+
+
+def _key(spec, row):
+    return f"{row}.{spec['pk']} * {len(SEARCH_ENTITIES)} + {spec['code']}"
+
+
+def _select_document(spec, row):
+    return (
+        f"{_key(spec, row)}, '{ENTITY_BY_CODE[spec['code']]}', {spec['revision_id'].format(row=row)}, "
+        f"{spec['url'].format(row=row)}, {spec['title'].format(row=row)}, {spec['body'].format(row=row)}"
+    )
+
+
+def _sqlite_ddl(entities):
+    yield (
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "title, body, entity UNINDEXED, revision_id UNINDEXED, url UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    insert = "INSERT INTO search_index (rowid, entity, revision_id, url, title, body) SELECT {doc};"
+    delete = "DELETE FROM search_index WHERE rowid = {key};"
+    for entity, spec in entities.items():
+        table = spec["table"]
+        columns = ", ".join(spec["columns"])
+        yield (
+            f"CREATE TRIGGER search_{entity}_ai AFTER INSERT ON {table} BEGIN "
+            f"{insert.format(doc=_select_document(spec, 'NEW'))} END"
+        )
+        yield (
+            f"CREATE TRIGGER search_{entity}_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+            f"{delete.format(key=_key(spec, 'OLD'))} "
+            f"{insert.format(doc=_select_document(spec, 'NEW'))} END"
+        )
+        yield (
+            f"CREATE TRIGGER search_{entity}_ad AFTER DELETE ON {table} BEGIN "
+            f"{delete.format(key=_key(spec, 'OLD'))} END"
+        )
+
+
+def _postgres_ddl(entities, config):
+    if config == SEARCH_CONFIG:
+        yield "CREATE EXTENSION IF NOT EXISTS unaccent"
+        yield f"CREATE TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} (COPY = simple)"
+        yield (
+            f"ALTER TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} "
+            "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple"
+        )
+    yield (
+        "CREATE TABLE search_index ("
+        "id BIGINT PRIMARY KEY, entity VARCHAR(20) NOT NULL, revision_id INTEGER, url TEXT NOT NULL, "
+        "title TEXT NOT NULL, body TEXT NOT NULL, "
+        f"document tsvector GENERATED ALWAYS AS (setweight(to_tsvector('{config}', title), 'A') "
+        f"|| setweight(to_tsvector('{config}', body), 'B')) STORED)"
+    )
+    yield "CREATE INDEX ix_search_index_document ON search_index USING GIN (document)"
+    for entity, spec in entities.items():
+        table = spec["table"]
+        columns = ", ".join(spec["columns"])
+        yield (
+            f"CREATE FUNCTION search_{entity}_sync() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+            f"IF TG_OP <> 'INSERT' THEN DELETE FROM search_index WHERE id = {_key(spec, 'OLD')}; END IF; "
+            f"IF TG_OP <> 'DELETE' THEN "
+            f"INSERT INTO search_index (id, entity, revision_id, url, title, body) "
+            f"SELECT {_select_document(spec, 'NEW')}; END IF; "
+            f"RETURN NULL; END $$"
+        )
+        yield (
+            f"CREATE TRIGGER search_{entity}_sync AFTER INSERT OR DELETE OR UPDATE OF {columns} "
+            f"ON {table} FOR EACH ROW EXECUTE FUNCTION search_{entity}_sync()"
+        )
+
+
+def install(conn, initial=False):
+    """
+    Založí index a triggery a naplní index stávajícími daty (volá migrace).
+    initial=True založí index v podobě z migrace 4 (INITIAL_ENTITIES).
+    """
+    entities = INITIAL_ENTITIES if initial else SEARCH_ENTITIES
+    if conn.dialect.name == "postgresql":
+        ddl = _postgres_ddl(entities, "simple" if initial else SEARCH_CONFIG)
+    else:
+        ddl = _sqlite_ddl(entities)
+    for statement in ddl:
+        conn.exec_driver_sql(statement)
+    key_column = "id" if conn.dialect.name == "postgresql" else "rowid"
+    for spec in entities.values():
+        conn.exec_driver_sql(
+            f"INSERT INTO search_index ({key_column}, entity, revision_id, url, title, body) "
+            f"SELECT {_select_document(spec, spec['table'])} FROM {spec['table']}"
+        )
+
+
+def rebuild(conn):
+    """Zahodí index z migrace 4 i s triggery a založí ho znovu (volá migrace)."""
+    if conn.dialect.name == "postgresql":
+        for entity in SEARCH_ENTITIES:
+            conn.exec_driver_sql(f"DROP FUNCTION IF EXISTS search_{entity}_sync() CASCADE")
+        conn.exec_driver_sql("DROP TABLE IF EXISTS search_index")
+        conn.exec_driver_sql(f"DROP TEXT SEARCH CONFIGURATION IF EXISTS {SEARCH_CONFIG}")
+    else:
+        for entity in SEARCH_ENTITIES:
+            for suffix in ("ai", "au", "ad"):
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS search_{entity}_{suffix}")
+        conn.exec_driver_sql("DROP TABLE IF EXISTS search_index")
+    install(conn)
+
+
+def query_terms(query: str) -> list:
+    """Slova dotazu (písmena a číslice), nejvýše MAX_QUERY_TERMS."""
+    return re.findall(r"\w+", query or "")[:MAX_QUERY_TERMS]
+
+
+async def search(db: AsyncSession, user_id: int, query: str, limit: int = 50) -> list:
+    """
+    Výsledky seřazené podle relevance (shoda v názvu váží víc než v popisu).
+    Každé slovo dotazu se hledá jako prefix, všechna musí sedět. Vrací
+    slovníky entity, id, url, title, body, revision_id, revision_name.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = text(
+            "SELECT si.id AS key, si.entity, si.url, si.title, si.body, si.revision_id, r.revision_name "
+            "FROM search_index si JOIN revisions r ON r.revision_id = si.revision_id "
+            f"WHERE si.document @@ to_tsquery('{SEARCH_CONFIG}', :q) AND r.user_id = :user_id "
+            f"ORDER BY ts_rank(si.document, to_tsquery('{SEARCH_CONFIG}', :q)) DESC, si.id LIMIT :limit"
+        )
+        q = " & ".join(f"{term}:*" for term in terms)
+    else:
+        stmt = text(
+            "SELECT search_index.rowid AS key, entity, url, title, body, search_index.revision_id, r.revision_name "
+            "FROM search_index JOIN revisions r ON r.revision_id = search_index.revision_id "
+            "WHERE search_index MATCH :q AND r.user_id = :user_id "
+            "ORDER BY bm25(search_index, 10.0, 1.0), search_index.rowid LIMIT :limit"
+        )
+        q = " ".join(f'"{term}"*' for term in terms)
+    rows = (await db.execute(stmt, {"q": q, "user_id": user_id, "limit": limit})).mappings()
+    return [
+        {
+            "entity": row["entity"],
+            "id": row["key"] // len(SEARCH_ENTITIES),
+            "url": row["url"],
+            "title": row["title"].strip(),
+            "body": row["body"].strip(),
+            "revision_id": row["revision_id"],
+            "revision_name": row["revision_name"],
+        }
+        for row in rows
+    ]
@@ -1,2 +1,4 @@
 #!/bin/sh
-uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000}
+# Produkce: gunicorn s uvicorn workery (počet přes WEB_CONCURRENCY).
+# Jeden proces pro vývoj: uvicorn main:app --reload
+exec gunicorn -c gunicorn.conf.py main:app